@@ -0,0 +1,479 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+# this program benchmarks scans of many nodes against simulated nodes
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+"""
+Simulates a crowbar cloud of a configurable number of nodes on the local
+machine and scans it with the regular SshDumper code paths, to measure the
+throughput and memory use of scanning many nodes.
+
+Each simulated node is a local python process started via an execnet popen
+gateway, nodes are reached through the simulated crowbar entry node like
+real ones. The probe on each node scans a synthetic system in a directory,
+see SyntheticSystem, via the host_root option of squinnie.probe.Scanner.
+The network layout is obtained from a fake `crowbar machines list` command
+via squinnie.crowbar.Crowbar.
+"""
+
+# Standard library modules.
+from __future__ import print_function
+from __future__ import with_statement
+import argparse
+import resource
+import tempfile
+import logging
+import shutil
+import time
+import sys
+import os
+
+try:
+    # allow importing the squinnie modules from '..' to run from the git
+    # checkout directly
+    import module_helper
+except ImportError:
+    pass
+
+# local modules
+import squinnie.helper
+import squinnie.gateway
+from squinnie.crowbar import Crowbar
+from squinnie.dumper import SshDumper
+from squinnie.history import ScanHistory
+from squinnie.dio import DumpIO
+
+
+class SyntheticSystem(object):
+    """Creates the directory tree of a running system that the probe can
+    scan via its host_root option: a procfs with processes, sockets and
+    namespaces, a sysfs with a network interface and a root file system.
+
+    All processes share the namespaces of init, their file descriptors
+    refer to regular files, as sockets or pipes can't be represented in a
+    plain directory tree. The sockets only appear in the protocol tables.
+    """
+
+    # namespace type -> inode of the namespace
+    NAMESPACES = {
+        "cgroup": 4026531835, "ipc": 4026531839, "mnt": 4026531840,
+        "net": 4026531992, "pid": 4026531836, "pid_for_children": 4026531836,
+        "user": 4026531837, "uts": 4026531838
+    }
+
+    # users the daemons run as, uid -> name
+    USERS = {0: "root", 1: "bin", 2: "daemon", 81: "messagebus", 473: "nobody"}
+
+    # number of kernel threads besides kthreadd
+    KTHREADS = 20
+
+    # number of file system objects per directory
+    FILES_PER_DIR = 100
+
+    # number of distinct memory mapping templates of the processes
+    MAPS_TEMPLATES = 10
+
+    def __init__(self, path, processes, files, sockets, fds):
+        """
+        :param str path: the directory to create the system in.
+        :param int processes: the number of userspace processes.
+        :param int files: the number of files in the root file system.
+        :param int sockets: the number of sockets in the protocol tables.
+        :param int fds: the number of open files per process.
+        """
+        self.m_path = path
+        self.m_processes = processes
+        self.m_files = files
+        self.m_sockets = sockets
+        self.m_fds = fds
+
+    def getPath(self, *parts):
+        return os.path.join(self.m_path, *parts)
+
+    def writeFile(self, content, *parts):
+        path = self.getPath(*parts)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def create(self):
+        os.makedirs(self.m_path)
+        self.createRootFs()
+        self.createSysfs()
+        self.createProcfs()
+
+    def createRootFs(self):
+        self.writeFile("".join([
+            "{name}:x:{uid}:{uid}:{name}:/:/sbin/nologin\n".format(name=name, uid=uid)
+            for uid, name in sorted(self.USERS.items())
+        ]), "etc", "passwd")
+        self.writeFile("".join([
+            "{name}:x:{gid}:\n".format(name=name, gid=gid)
+            for gid, name in sorted(self.USERS.items())
+        ]), "etc", "group")
+        os.makedirs(self.getPath("dev", "shm"))
+
+        for nr in range(self.m_files):
+            path = self.writeFile(
+                "data {}\n".format(nr),
+                "srv", "data", "dir{:05}".format(nr // self.FILES_PER_DIR), "file{:07}".format(nr)
+            )
+            if nr % 100 == 0:
+                # a share of interesting files for the --interesting-files
+                # mode
+                os.chmod(path, 0o4755)
+            else:
+                os.chmod(path, 0o644)
+
+    def createSysfs(self):
+        settings = {
+            "ifindex": "1", "address": "00:00:00:00:00:00", "type": "772",
+            "operstate": "unknown", "carrier": "1", "dormant": "0",
+            "flags": "0x9", "mtu": "65536", "uevent": "INTERFACE=lo\nIFINDEX=1"
+        }
+        for name, value in settings.items():
+            self.writeFile(value + "\n", "sys", "class", "net", "lo", name)
+
+    def createProcfs(self):
+        self.writeFile("12345.67 45678.90\n", "proc", "uptime")
+        self.writeFile("00000000000000000000000000000001 01 80 10 80       lo\n", "proc", "net", "if_inet6")
+        for name in ("msg", "sem", "shm"):
+            self.writeFile("       key      id perms   uid   gid  cuid  cgid\n", "proc", "sysvipc", name)
+        self.createSocketTables()
+
+        # kthreadd, the kernel threads, init and the daemons
+        self.createProcess(2, 0, "kthreadd", kthread=True)
+        pid = 3
+        for nr in range(self.KTHREADS):
+            self.createProcess(pid, 2, "kworker/{}".format(nr), kthread=True)
+            pid += 1
+
+        self.createProcess(1, 0, "systemd")
+        self.writeFile("22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw\n", "proc", "1", "mountinfo")
+        os.symlink("1", self.getPath("proc", "self"))
+
+        uids = sorted(self.USERS)
+        for nr in range(self.m_processes):
+            self.createProcess(pid, 1, "daemon{}".format(nr), uid=uids[nr % len(uids)])
+            pid += 1
+
+    def createSocketTables(self):
+        inet_header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+        tables = {
+            "tcp": [inet_header], "tcp6": [inet_header], "udp": [inet_header], "udp6": [inet_header],
+            "unix": ["Num       RefCount Protocol Flags    Type St Inode Path\n"],
+            "netlink": ["sk               Eth Pid        Groups   Rmem     Wmem     Dump  Locks    Drops    Inode\n"],
+            "packet": ["sk       RefCnt Type Proto  Iface R Rmem   User   Inode\n"]
+        }
+        kinds = ("tcp", "udp", "unix", "tcp6")
+
+        for nr in range(self.m_sockets):
+            kind = kinds[nr % len(kinds)]
+            inode = 100000 + nr
+            port = 1024 + nr % 60000
+            if kind == "unix":
+                line = "0000000000000000: 00000002 00000000 00010000 0001 01 {} /run/sock{}\n".format(inode, nr)
+            else:
+                host = "0100007F" if kind != "tcp6" else "00000000000000000000000001000000"
+                remote = "0" * len(host)
+                line = "{:4}: {}:{:04X} {}:0000 0A 00000000:00000000 00:00000000 00000000     0        0 {} 1\n".format(
+                    nr, host, port, remote, inode
+                )
+            tables[kind].append(line)
+
+        for kind, lines in tables.items():
+            self.writeFile("".join(lines), "proc", "net", kind)
+
+    def createProcess(self, pid, ppid, name, uid=0, kthread=False):
+        base = ("proc", str(pid))
+        caps = "000001ffffffffff" if uid == 0 else "0000000000000000"
+        status = "\n".join([
+            "Name:\t{}".format(name),
+            "Umask:\t0022",
+            "State:\tS (sleeping)",
+            "Tgid:\t{}".format(pid),
+            "Pid:\t{}".format(pid),
+            "PPid:\t{}".format(ppid),
+            "Uid:\t{0}\t{0}\t{0}\t{0}".format(uid),
+            "Gid:\t{0}\t{0}\t{0}\t{0}".format(uid),
+            "Groups:\t",
+            "NSpid:\t{}".format(pid),
+            "CapInh:\t0000000000000000",
+            "CapPrm:\t" + caps,
+            "CapEff:\t" + caps,
+            "CapBnd:\t000001ffffffffff",
+            "CapAmb:\t0000000000000000",
+            "Seccomp:\t0",
+        ]) + "\n"
+        flags = 0x00208040 if kthread else 0x00400100
+        # the fields following the command name, see man 5 proc
+        fields = ["S", ppid, pid, pid, 0, -1, flags] + [0] * 12 + [100 + pid] + [0] * 30
+        stat = "{} ({}) {}\n".format(pid, name, " ".join([str(field) for field in fields]))
+        cmdline = "" if kthread else "/usr/sbin/{}\0--foreground\0".format(name)
+
+        self.writeFile(status, *(base + ("status",)))
+        self.writeFile(stat, *(base + ("stat",)))
+        self.writeFile(cmdline, *(base + ("cmdline",)))
+        self.writeFile(status, *(base + ("task", str(pid), "status")))
+        self.writeFile(cmdline, *(base + ("task", str(pid), "cmdline")))
+        self.writeFile("0 0 4294967295\n", *(base + ("uid_map",)))
+        self.writeFile("0 0 4294967295\n", *(base + ("gid_map",)))
+
+        os.makedirs(self.getPath(*(base + ("ns",))))
+        for ns_type, inode in self.NAMESPACES.items():
+            os.symlink("{}:[{}]".format(ns_type, inode), self.getPath(*(base + ("ns", ns_type))))
+
+        os.makedirs(self.getPath(*(base + ("fd",))))
+        os.makedirs(self.getPath(*(base + ("fdinfo",))))
+        if kthread:
+            return
+
+        os.symlink("/", self.getPath(*(base + ("root",))))
+        template = pid % self.MAPS_TEMPLATES
+        self.writeFile("".join([
+            "55d0{:02}000000-55d0{:02}001000 r-xp 00000000 08:01 {} /usr/lib64/lib{}.so\n".format(
+                template, template, 2000 + nr, nr
+            )
+            for nr in range(template + 1)
+        ]), *(base + ("maps",)))
+
+        for fd in range(self.m_fds):
+            target = self.getPath("srv", "data", "dir00000", "file{:07}".format(fd % max(self.m_files, 1)))
+            if not os.path.exists(target):
+                target = self.getPath("etc", "passwd")
+            os.symlink(target, self.getPath(*(base + ("fd", str(fd)))))
+            self.writeFile(
+                "pos:\t0\nflags:\t02100002\nmnt_id:\t22\n", *(base + ("fdinfo", str(fd)))
+            )
+
+
+class SimulatedGatewayPool(squinnie.gateway.GatewayPool):
+    """A GatewayPool that starts a local python process via an execnet
+    popen gateway for each node instead of connecting to it via ssh. The
+    processes of nodes behind a jump host are started by the jump host's
+    process."""
+
+    def __init__(self, python=None, latency=0.0):
+        """
+        :param str python: the python interpreter to run the nodes with,
+        by default the one running this program.
+        :param float latency: seconds to wait before each connection, to
+        simulate the ssh handshake with a distant node.
+        """
+        super(SimulatedGatewayPool, self).__init__(keepalive=None)
+        self.m_python = python
+        self.m_latency = latency
+
+    def _connect(self, node, via, gw_id):
+        if self.m_latency:
+            time.sleep(self.m_latency)
+
+        parts = ["popen", "id=" + gw_id]
+        if via:
+            parts.append("via=" + via)
+        if self.m_python:
+            parts.append("python=" + self.m_python)
+
+        return squinnie.gateway.openGateway(self.m_group, "//".join(parts), node)
+
+
+class FleetSimulation(object):
+
+    ENTRY_NODE = "crowbar.sim"
+
+    def __init__(self):
+        self._setupArgparse()
+        self.m_params = None
+        self.m_pool = None
+
+    def _setupArgparse(self):
+        description = "Benchmarks Squinnie against a simulated crowbar cloud of local processes. Reports the " \
+                      "throughput and peak memory use of the scan."
+        parser = argparse.ArgumentParser(description=description)
+
+        description = "The number of nodes behind the crowbar entry node."
+        parser.add_argument("-n", "--nodes", type=int, help=description, default=10)
+
+        description = "The number of nodes to scan in parallel."
+        parser.add_argument("-j", "--jobs", type=int, help=description, default=SshDumper.DEFAULT_JOBS)
+
+        description = "The number of processes on each node."
+        parser.add_argument("--processes", type=int, help=description, default=200)
+
+        description = "The number of files on each node."
+        parser.add_argument("--files", type=int, help=description, default=10000)
+
+        description = "The number of sockets on each node."
+        parser.add_argument("--sockets", type=int, help=description, default=400)
+
+        description = "The number of open files of each process."
+        parser.add_argument("--fds", type=int, help=description, default=8)
+
+        description = "Seconds to wait before connecting to each node, to simulate distant nodes."
+        parser.add_argument("--latency", type=float, help=description, default=0.0)
+
+        description = "The python interpreter to run the nodes with, by default the one running this program."
+        parser.add_argument("--python", type=str, help=description, default=None)
+
+        description = "The directory for the synthetic system and the dumps. An existing synthetic system in it " \
+                      "is reused. Defaults to a temporary directory that is removed afterwards."
+        parser.add_argument("-d", "--directory", type=str, help=description, default=None)
+
+        self.m_parser = parser
+
+    def run(self, args=None):
+        self.m_params = self.m_parser.parse_args(args=args)
+        logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+        directory = self.m_params.directory
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='squinnie-fleet')
+
+        try:
+            self.simulate(directory)
+        finally:
+            if self.m_params.directory is None:
+                shutil.rmtree(directory)
+
+    def simulate(self, directory):
+        params = self.m_params
+        system_dir = os.path.join(directory, "system")
+        dump_dir = os.path.join(directory, "dumps")
+
+        if not os.path.isdir(system_dir):
+            print("Creating the synthetic system in", system_dir)
+            SyntheticSystem(system_dir, params.processes, params.files, params.sockets, params.fds).create()
+        if os.path.isdir(dump_dir):
+            shutil.rmtree(dump_dir)
+
+        self.createCrowbarCommand(os.path.join(directory, "bin"))
+
+        self.m_pool = SimulatedGatewayPool(python=params.python, latency=params.latency)
+        try:
+            start = time.time()
+            crowbar = Crowbar()
+            crowbar.setGatewayPool(self.m_pool)
+            crowbar.setEntryNode(self.ENTRY_NODE)
+            network = crowbar.getCrowbarConfig()
+            listed = time.time()
+
+            dumper = SshDumper()
+            dumper.setGatewayPool(self.m_pool)
+            dumper.setNetworkConfig(network)
+            dumper.setOutputDir(dump_dir)
+            dumper.setUseCache(False)
+            dumper.setUseTimeouts(False)
+            dumper.setJobs(params.jobs)
+            dumper.setHostRoot(system_dir)
+            dumper.collect(load_cached=False)
+            dumper.save()
+            finished = time.time()
+
+            node_memory = self.getNodeMemory()
+        finally:
+            self.m_pool.terminate()
+
+        self.printResults(dumper, dump_dir, listed - start, finished - listed, node_memory)
+
+    def createCrowbarCommand(self, bin_dir):
+        """Creates a crowbar command in ``bin_dir`` that lists the simulated
+        nodes and makes it available to the nodes, which inherit our
+        environment."""
+        nodes = [self.ENTRY_NODE] + [
+            "d52-54-00-{:02x}-{:02x}-{:02x}.sim".format(nr >> 16 & 0xff, nr >> 8 & 0xff, nr & 0xff)
+            for nr in range(self.m_params.nodes)
+        ]
+
+        if not os.path.isdir(bin_dir):
+            os.makedirs(bin_dir)
+        path = os.path.join(bin_dir, "crowbar")
+        with open(path, 'w') as f:
+            f.write("#!/bin/sh\nprintf '%s\\n' {}\n".format(" ".join(nodes)))
+        os.chmod(path, 0o755)
+
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+    @staticmethod
+    def getNodeMemory():
+        """Returns the peak resident memory of each process started by us
+        in KiB. These are the processes of the simulated nodes, which are
+        started by the gateway of the entry node."""
+        parents = {}
+        peaks = {}
+
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(os.path.join("/proc", entry, "status"), "r") as f:
+                    fields = dict([line.split(':', 1) for line in f if ':' in line])
+            except EnvironmentError:
+                continue
+            pid = int(entry)
+            parents[pid] = int(fields["PPid"])
+            if "VmHWM" in fields:
+                peaks[pid] = int(fields["VmHWM"].split()[0])
+
+        def isDescendant(pid):
+            while pid in parents:
+                pid = parents[pid]
+                if pid == os.getpid():
+                    return True
+            return False
+
+        return [peak for pid, peak in peaks.items() if isDescendant(pid)]
+
+    def printResults(self, dumper, dump_dir, list_time, scan_time, node_memory):
+        nodes = dumper.getNodeData()
+        failed = [config['node'] for config in nodes if config.get('failed', False)]
+        size = sum([
+            ScanHistory.getDumpSize(DumpIO(config['node'], path=dump_dir).getDumpDir())
+            for config in nodes if config.get('saved', False)
+        ])
+        mib = 1024.0 * 1024.0
+        own_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        print("""
+ Results
+=========
+Nodes: {nodes} ({failed} failed), {jobs} in parallel
+Crowbar listing: {list_time:.1f} s
+Scan: {scan_time:.1f} s, {node_rate:.2f} nodes/s
+Dumps: {size:.1f} MiB, {byte_rate:.2f} MiB/s
+Peak memory of squinnie: {own:.1f} MiB
+Peak memory per node: {node_max:.1f} MiB maximum, {node_sum:.1f} MiB in total
+""".format(
+            nodes=len(nodes), failed=len(failed), jobs=self.m_params.jobs,
+            list_time=list_time, scan_time=scan_time,
+            node_rate=len(nodes) / scan_time if scan_time else 0,
+            size=size / mib, byte_rate=size / mib / scan_time if scan_time else 0,
+            own=own_memory / 1024.0,
+            node_max=max(node_memory or [0]) / 1024.0, node_sum=sum(node_memory) / 1024.0
+        ))
+
+        if failed:
+            print("Failed nodes:", ", ".join(failed))
+
+
+if __name__ == '__main__':
+    squinnie.helper.executeMain(FleetSimulation().run)
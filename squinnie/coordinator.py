@@ -0,0 +1,233 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+"""
+This script is sent to a jump host via execnet to scan the nodes behind it
+in parallel, see SshDumper.setFanOut().
+
+Each node is scanned by running probe.py on it via plain ssh from the jump
+host. The compressed probe output of all nodes is streamed upstream over the
+single execnet channel, instead of passing each node's data through its own
+nested ssh tunnel.
+
+Like probe.py this module needs to be self-contained and to work with
+python2 and python3.
+"""
+
+# Standard library modules.
+from __future__ import print_function
+from __future__ import with_statement
+import json
+import time
+import subprocess
+import threading
+
+try:
+    from shlex import quote
+except ImportError:
+    # python2
+    from pipes import quote
+
+# size of the data frames sent upstream
+CHUNK_SIZE = 256 * 1024
+
+# number of trailing stderr lines of a failed probe to report
+ERROR_LINES = 5
+
+
+class TokenBucket(object):
+    """Limits the rate of sent data to ``rate`` bytes per second on average,
+    like the class of the same name in probe.py."""
+
+    def __init__(self, rate):
+        self.m_rate = float(rate)
+        self.m_tokens = self.m_rate
+        self.m_last = time.time()
+        self.m_lock = threading.Lock()
+
+    def consume(self, amount):
+        """Blocks until ``amount`` bytes may be sent."""
+        with self.m_lock:
+            now = time.time()
+            self.m_tokens = min(self.m_rate, self.m_tokens + (now - self.m_last) * self.m_rate)
+            self.m_last = now
+            self.m_tokens -= amount
+            wait = -self.m_tokens / self.m_rate if self.m_tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class Coordinator(object):
+    """Runs the probe on a number of nodes in parallel and passes its
+    output on as frames to the ``send`` callable:
+
+    - ("start", node): the probe has been started on ``node``.
+    - ("progress", node, info): a progress report of the probe.
+    - ("stderr", node, line): any other diagnostic output of the probe.
+    - ("data", node, chunk): the next chunk of the gzip compressed pickle
+      written by the probe.
+    - ("done", node, error): the probe has finished, ``error`` is None on
+      success or a string describing the failure.
+    """
+
+    def __init__(self, send, probe, probe_args, python="python", progress_prefix=None, jobs=4, bandwidth=None):
+        """
+        :param send: a callable for sending frames upstream. It may be
+        called from multiple threads.
+        :param str probe: the source code of probe.py.
+        :param list probe_args: the command line arguments for probe.py.
+        :param str python: the shell expression selecting the python
+        interpreter on the nodes.
+        :param str progress_prefix: the prefix of the progress lines the
+        probe writes to stderr, if any.
+        :param int jobs: the maximum number of nodes to scan in parallel.
+        :param int bandwidth: the maximum bytes per second to send for all
+        nodes together, if set.
+        """
+        self.m_send = send
+        self.m_probe = probe
+        self.m_probe_args = probe_args
+        self.m_python = python
+        self.m_progress_prefix = progress_prefix
+        self.m_jobs = jobs
+        self.m_bucket = TokenBucket(bandwidth) if bandwidth else None
+
+    def run(self, nodes):
+        """Scans the given list of (node, ssh target, timeout) tuples. The
+        probe is terminated if it runs longer than timeout seconds, unless
+        timeout is None."""
+        lock = threading.Lock()
+        pending = list(nodes)
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    node, target, timeout = pending.pop(0)
+
+                try:
+                    error = self.runProbe(node, target, timeout)
+                except Exception as e:
+                    error = str(e)
+                self.m_send(("done", node, error))
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(min(self.m_jobs, len(pending)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def getCommand(self, target):
+        """Returns the ssh command line for running the probe on
+        ``target``. The probe's source is read from stdin."""
+        remote_cmd = " ".join(
+            [self.m_python, "-"] + [quote(arg) for arg in self.m_probe_args]
+        )
+        return ["ssh", "-o", "BatchMode=yes", target, remote_cmd]
+
+    def runProbe(self, node, target, timeout=None):
+        """Runs the probe on a single node and forwards its output.
+        Returns None on success or an error string."""
+        proc = subprocess.Popen(
+            self.getCommand(target),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True
+        )
+        self.m_send(("start", node))
+
+        errors = []
+        stderr_thread = threading.Thread(
+            target=self.readStderr, args=(proc.stderr, node, errors)
+        )
+        stderr_thread.start()
+
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            proc.terminate()
+
+        if timeout:
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+
+        try:
+            # the interpreter only starts running the probe once it read
+            # all of stdin
+            try:
+                proc.stdin.write(self.m_probe.encode('utf8'))
+                proc.stdin.close()
+            except EnvironmentError:
+                # the remote side already exited, its exit code tells why
+                pass
+
+            for chunk in iter(lambda: proc.stdout.read(CHUNK_SIZE), b''):
+                if self.m_bucket:
+                    self.m_bucket.consume(len(chunk))
+                self.m_send(("data", node, chunk))
+        finally:
+            code = proc.wait()
+            stderr_thread.join()
+            if timeout:
+                timer.cancel()
+
+        if timed_out.is_set():
+            return "timed out after {} seconds".format(int(timeout))
+        elif code != 0:
+            return "probe exited with {}: {}".format(code, " / ".join(errors[-ERROR_LINES:]))
+
+        return None
+
+    def readStderr(self, pipe, node, errors):
+        """Forwards the progress reports and other lines the probe writes to
+        ``pipe``. The other lines are also collected in ``errors``."""
+        for line in iter(pipe.readline, b''):
+            line = line.decode('utf8', 'replace').rstrip('\n')
+            prefix = self.m_progress_prefix
+            if prefix and line.startswith(prefix):
+                self.m_send(("progress", node, json.loads(line[len(prefix):])))
+            else:
+                errors.append(line)
+                self.m_send(("stderr", node, line))
+
+        pipe.close()
+
+
+if __name__ == '__channelexec__':
+    # the host sends a dictionary of Coordinator keyword arguments and the
+    # nodes to scan
+    options = channel.receive()
+    nodes = options.pop("nodes")
+    send_lock = threading.Lock()
+
+    def send(frame):
+        with send_lock:
+            channel.send(frame)
+
+    Coordinator(send, **options).run(nodes)
+    send(("finished",))
@@ -35,6 +35,7 @@ import termcolor
 import squinnie.helper
 import squinnie.network_config
 import squinnie.errors
+import squinnie.gateway
 import logging
 
 # PyPy modules
@@ -55,6 +56,8 @@ class Crowbar(object):
         self.m_entry_node = None
         self.m_net_config = squinnie.network_config.NetworkConfig()
         self.m_info = {}
+        # a squinnie.gateway.GatewayPool shared with other remote helpers
+        self.m_pool = None
 
     def setUseCache(self, cache):
 
@@ -63,6 +66,11 @@ class Crowbar(object):
     def setConfigPath(self, path):
         self.m_config_path = path
 
+    def setGatewayPool(self, pool):
+        """Use the gateways of the given squinnie.gateway.GatewayPool, so
+        that the connection to the entry node can be reused later on."""
+        self.m_pool = pool
+
     def setEntryNode(self, node):
         """Set the hostname or IP of the crowbar entry node for scanning the
         network configuration.
@@ -87,22 +95,24 @@ class Crowbar(object):
         if not self.m_entry_node:
             raise squinnie.errors.ScannerError("entry node for scanning crowbar network is required")
 
-        group = execnet.Group()
-        master = group.makegateway(
-            "id=master//python=python{}//ssh=root@{}".format(2, self.m_entry_node)
-        )
-
-        cmd = "crowbar machines list"
-        exec_cmd = """
-            import subprocess
-            channel.send(subprocess.check_output('{}'))
-        """.format(cmd)
+        pool = self.m_pool if self.m_pool else squinnie.gateway.GatewayPool()
         try:
-            crowbar_output = master.remote_exec(exec_cmd).receive()
-        except execnet.RemoteError as e:
-            raise squinnie.errors.ScannerError("Failed to run crowbar on {}:\n\n{}".format(
-                self.m_entry_node, e
-            ))
+            master = pool.get(self.m_entry_node)
+
+            cmd = ["crowbar", "machines", "list"]
+            exec_cmd = """
+                import subprocess
+                channel.send(subprocess.check_output({!r}))
+            """.format(cmd)
+            try:
+                crowbar_output = master.remote_exec(exec_cmd).receive()
+            except execnet.RemoteError as e:
+                raise squinnie.errors.ScannerError("Failed to run crowbar on {}:\n\n{}".format(
+                    self.m_entry_node, e
+                ))
+        finally:
+            if pool is not self.m_pool:
+                pool.terminate()
 
         node_lines = crowbar_output.splitlines()
 
@@ -25,4 +25,5 @@ from accounts import AccountWrapper
 from networking import NetworkingWrapper
 from networkInterfaces import NetworkInterfaceWrapper
 from namespaces import NamespaceWrapper
+from cgroups import CgroupWrapper
 from factory import Factory
@@ -0,0 +1,93 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+from squinnie.daw.helper import CategoryLoader
+
+
+class CgroupWrapper(object):
+    """
+    This class abstracts the cgroup hierarchies and the cgroup membership of
+    processes.
+    """
+
+    def __init__(self, dumpIO):
+        """
+        :param dumpIO: An instance of squinnie.dio.DumpIO
+        """
+        self.m_dumpIO = dumpIO
+        self.m_data = CategoryLoader("cgroups", self.m_dumpIO)
+        # pid -> {hierarchy: cgroup path}, built on first use
+        self.m_pid_index = None
+
+    def getAllCgroupData(self):
+        """Returns the raw cgroup data or an empty dict for dumps without it."""
+        try:
+            return self.m_data.getData()
+        except LookupError:
+            # dump created by an older version
+            return {}
+
+    def getHierarchies(self):
+        """Returns the names of all collected cgroup hierarchies."""
+        return list(self.getAllCgroupData().keys())
+
+    def getPrimaryHierarchy(self):
+        """
+        Returns the name of the hierarchy that best reflects service
+        membership: the unified hierarchy on pure cgroup v2 systems, the
+        named systemd hierarchy on v1 systems.
+        """
+        hierarchies = self.getAllCgroupData()
+
+        for name in ("systemd", "unified"):
+            if name in hierarchies and hierarchies[name]['cgroups']:
+                return name
+
+        return sorted(hierarchies.keys())[0] if hierarchies else None
+
+    def _buildPidIndex(self):
+        """Creates the pid -> cgroup mapping for all hierarchies."""
+        self.m_pid_index = {}
+
+        for name, hierarchy in self.getAllCgroupData().items():
+            for cgroup, info in hierarchy['cgroups'].items():
+                for pid in info['pids']:
+                    self.m_pid_index.setdefault(pid, {})[name] = cgroup
+
+    def getCgroupsForPid(self, pid):
+        """Returns a dict of hierarchy -> cgroup path for the given pid."""
+        if self.m_pid_index is None:
+            self._buildPidIndex()
+
+        return self.m_pid_index.get(pid, {})
+
+    def getPrimaryCgroupForPid(self, pid):
+        """Returns the cgroup path of the pid in the primary hierarchy or None."""
+        return self.getCgroupsForPid(pid).get(self.getPrimaryHierarchy(), None)
+
+    def getPidsForCgroup(self, cgroup, hierarchy=None):
+        """Returns the pids that are members of ``cgroup`` in the given or the primary hierarchy."""
+        hierarchy = hierarchy or self.getPrimaryHierarchy()
+        cgroups = self.getAllCgroupData().get(hierarchy, {}).get('cgroups', {})
+        return cgroups.get(cgroup, {}).get('pids', [])
+
+    def getSettingsForCgroup(self, cgroup, hierarchy=None):
+        """Returns the recorded controller settings of ``cgroup``."""
+        hierarchy = hierarchy or self.getPrimaryHierarchy()
+        cgroups = self.getAllCgroupData().get(hierarchy, {}).get('cgroups', {})
+        return cgroups.get(cgroup, {}).get('settings', {})
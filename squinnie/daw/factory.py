@@ -26,6 +26,7 @@ from squinnie.daw import NetworkingWrapper
 from squinnie.daw.systemdata import SystemData
 from squinnie.daw import NamespaceWrapper
 from squinnie.daw import NetworkInterfaceWrapper
+from squinnie.daw import CgroupWrapper
 
 class Factory(object):
     """
@@ -45,6 +46,7 @@ class Factory(object):
         self.m_systemdata = SystemData(self.m_dumpIO)
         self.m_nwdeviceiface = NetworkInterfaceWrapper(self.m_dumpIO)
         self.m_namespaces = NamespaceWrapper(self.m_dumpIO)
+        self.m_cgroups = CgroupWrapper(self.m_dumpIO)
 
     def getProcWrapper(self):
         return self.m_proc_data
@@ -71,3 +73,6 @@ class Factory(object):
 
     def getNamespacesWrapper(self):
         return self.m_namespaces
+
+    def getCgroupWrapper(self):
+        return self.m_cgroups
@@ -46,6 +46,11 @@ class Filesystem(object):
         """Returns the result of a query on the filesystem database with the given parameters."""
         return self.m_accessor.executeFsQuery(fsquery)
 
+    def getOmittedCount(self):
+        """Returns the number of host file system objects that were not
+        recorded, because the probe only collected interesting files."""
+        return self.m_accessor.getOmittedCount()
+
     def getFileProperties(self, path):
         """Returns the properties of a specific file on the filesystem."""
         path = self.resolvePath(path)
@@ -75,6 +80,13 @@ class FsDatabase(object):
     """This class manages the filesystem database"""
     DB_NAME = 'filesystem.db'
 
+    # the columns of each table created by createTables()
+    TABLE_COLUMNS = {
+        "inodes": ["id", "parent", "uid", "gid", "caps", "mode", "type", "name", "path", "mntns"],
+        "links": ["id", "name", "target", "mntns"],
+        "omitted": ["inode", "count"]
+    }
+
     def __init__(self, path):
         self.m_path = path
         self.m_db = sqlite3.connect(self.getDbPath())
@@ -82,6 +94,7 @@ class FsDatabase(object):
         # usually, python2 uses non-unicode strings, but sqlite does. The probe supplies "normal" strings as well, so we
         # need to setup sqlite to use the built-in string type to avoid errors.
         self.m_db.text_factory = str
+        self._upgradeTables()
 
     def getDbPath(self):
         """Returns the path of the database."""
@@ -97,6 +110,10 @@ class FsDatabase(object):
         cursor = self.m_db.execute("SELECT * FROM inodes WHERE %s" % where)
         return cursor.fetchall()
 
+    def findHostData(self, where="1=1"):
+        """Like findData() but only returns entries from the host's mount namespace."""
+        return self.findData("mntns IS NULL AND ({})".format(where))
+
     def executeFsQuery(self, fsquery):
         """Returns all files matching a given FsQuery instance."""
         sql = "SELECT * FROM inodes %s" % fsquery.getSqlClause()
@@ -104,13 +121,52 @@ class FsDatabase(object):
         return FilesystemIterator(cursor)
 
     def getFileProperties(self, path, name):
-        data = self.m_db.execute('SELECT * FROM inodes WHERE name=? AND path=?', (name, path))
+        data = self.m_db.execute('SELECT * FROM inodes WHERE name=? AND path=? AND mntns IS NULL', (name, path))
         return data.fetchone()
 
+    def getOmittedCount(self, mntns=None):
+        """Returns the number of file system objects that were not recorded
+        because only interesting files were collected, see
+        squinnie.probe.Scanner.isInteresting()."""
+        if not self._haveTable("omitted"):
+            # created by an older version
+            return 0
+        data = self.m_db.execute(
+            'SELECT SUM(omitted.count) FROM omitted JOIN inodes ON omitted.inode = inodes.id WHERE inodes.mntns IS ?',
+            (mntns,)
+        )
+        return data.fetchone()[0] or 0
+
+    @classmethod
+    def verifyDatabase(cls, db_path):
+        """
+        Checks that the database file ``db_path`` is intact and has the
+        tables created by createTables(), like the databases built by
+        squinnie.probe.FsDatabaseBuilder.
+        :return: A description of the problem or None if the database is fine.
+        """
+        db = sqlite3.connect(db_path)
+
+        try:
+            if db.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                return "the integrity check failed"
+
+            for table, columns in sorted(cls.TABLE_COLUMNS.items()):
+                found = [row[1] for row in db.execute('PRAGMA table_info("{}")'.format(table))]
+                if found != columns:
+                    return "table {} has the columns {} instead of {}".format(table, found, columns)
+        except sqlite3.DatabaseError as e:
+            return str(e)
+        finally:
+            db.close()
+
+        return None
+
     def createTables(self):
         """Creates the database table, dropping it beforehand if it exists."""
         self.createInodeTable()
         self.createLinkTable()
+        self.createOmittedTable()
 
     def createInodeTable(self):
         """Creates the inode table, dropping it beforehand if it exists."""
@@ -124,7 +180,8 @@ class FsDatabase(object):
             "mode" INTEGER,
             "type" TEXT,
             "name" TEXT,
-            "path" TEXT
+            "path" TEXT,
+            "mntns" TEXT
         )
         """
 
@@ -137,18 +194,46 @@ class FsDatabase(object):
         CREATE TABLE "links" (
             "id" INTEGER PRIMARY KEY AUTOINCREMENT,
             "name" TEXT,
-            "target" TEXT
+            "target" TEXT,
+            "mntns" TEXT
         )
         """
 
         self.m_db.execute('DROP TABLE IF EXISTS "links"')
         self.m_db.execute(sql)
 
-    def insertLink(self, path, target):
+    def createOmittedTable(self):
+        """Creates the table of per directory counts of file system objects
+        that were not recorded, dropping it beforehand if it exists."""
+        sql = """
+        CREATE TABLE "omitted" (
+            "inode" INTEGER PRIMARY KEY,
+            "count" INTEGER
+        )
+        """
+
+        self.m_db.execute('DROP TABLE IF EXISTS "omitted"')
+        self.m_db.execute(sql)
+
+    def _haveTable(self, table):
+        """Returns whether the given table exists in the database."""
+        data = self.m_db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        return data.fetchone() is not None
+
+    def _upgradeTables(self):
+        """Adds the mntns column to databases created by older versions."""
+        for table in ("inodes", "links"):
+            if not self._haveTable(table):
+                continue
+            columns = [row[1] for row in self.m_db.execute('PRAGMA table_info("{}")'.format(table))]
+            if "mntns" not in columns:
+                self.m_db.execute('ALTER TABLE "{}" ADD COLUMN "mntns" TEXT'.format(table))
+
+    def insertLink(self, path, target, mntns=None):
         """Creates a new link entry in the database."""
-        sql = "INSERT INTO links (name, target) VALUES (?, ?)"
+        sql = "INSERT INTO links (name, target, mntns) VALUES (?, ?, ?)"
         cursor = self.m_db.cursor()
-        cursor.execute(sql, (path, target))
+        cursor.execute(sql, (path, target, mntns))
 
     def resolveLinkSingle(self, path):
         """
@@ -157,7 +242,7 @@ class FsDatabase(object):
         :param path: The path to check for
         :return: A tuple of (link, replacement) if a symlink is found, None otherwise.
         """
-        data = self.m_db.execute('SELECT name,target FROM links WHERE ? LIKE name||\'%\';', (path,))
+        data = self.m_db.execute('SELECT name,target FROM links WHERE ? LIKE name||\'%\' AND mntns IS NULL;', (path,))
         return data.fetchone()
 
     def insertRawData(self, fsdata):
@@ -168,36 +253,186 @@ class FsDatabase(object):
         self._processDirectory('/', '/', fsdata, 1, cursor)
         self.m_db.commit()
 
-    def _processDirectory(self, name, path, data, parentId, cursor):
+    def insertContainerData(self, mntns, fsdata):
+        """Inserts the raw data of a container root file system, tagged with
+        its mount namespace, into the existing database. Rows of the same
+        mount namespace from an earlier, interrupted insert are replaced."""
+        if not self._haveTable("inodes"):
+            self.createTables()
+        elif not self._haveTable("omitted"):
+            self.createOmittedTable()
+
+        cursor = self.m_db.cursor()
+        cursor.execute('DELETE FROM omitted WHERE inode IN (SELECT id FROM inodes WHERE mntns IS ?)', (mntns,))
+        cursor.execute('DELETE FROM links WHERE mntns IS ?', (mntns,))
+        cursor.execute('DELETE FROM inodes WHERE mntns IS ?', (mntns,))
+        self._processDirectory('/', '/', fsdata, None, cursor, mntns)
+        self.m_db.commit()
+
+    def loadTree(self, path, mntns=None):
+        """
+        Returns the subtree of the directory ``path`` in the raw format delivered by the probe, i.e. the inverse of
+        insertRawData() and insertContainerData().
+        :param path: The directory to start at, relative to the root of the file system.
+        :param mntns: The mount namespace of a container file system, None for the host.
+        :return: The nested dictionary or None if the directory is missing.
+        """
+        if path == '/':
+            location = ('/', '/')
+        else:
+            location = (os.path.basename(path), os.path.dirname(path))
+        root = self.m_db.execute(
+            'SELECT * FROM inodes WHERE name=? AND path=? AND mntns IS ?', location + (mntns,)
+        ).fetchone()
+        if root is None:
+            return None
+
+        # everything below the directory, substr() avoids the wildcards of LIKE
+        prefix = path.rstrip('/') + '/'
+        rows = self.m_db.execute(
+            'SELECT * FROM inodes WHERE mntns IS ? AND (path=? OR substr(path, 1, ?)=?)',
+            (mntns, path, len(prefix), prefix)
+        ).fetchall()
+        links = dict(self.m_db.execute(
+            'SELECT name,target FROM links WHERE mntns IS ? AND substr(name, 1, ?)=?', (mntns, len(prefix), prefix)
+        ).fetchall())
+        omitted = {}
+        if self._haveTable("omitted"):
+            omitted = dict(self.m_db.execute(
+                'SELECT omitted.inode, omitted.count FROM omitted JOIN inodes ON omitted.inode = inodes.id '
+                'WHERE inodes.mntns IS ?', (mntns,)
+            ).fetchall())
+
+        items = {root[0]: self._rowToRawItem(root, links, omitted)}
+        children = [row for row in rows if row[0] != root[0]]
+        for row in children:
+            items[row[0]] = self._rowToRawItem(row, links, omitted)
+        for row in children:
+            items[row[1]]['subitems'][row[7]] = items[row[0]]
+
+        return items[root[0]]
+
+    def loadRows(self):
+        """
+        Returns all file system objects of the host and of the containers, keyed independently of the row ids, which
+        differ between dumps.
+        :return: A dict of (mntns, path, name) -> (uid, gid, caps, mode, type, link target, omitted count).
+        """
+        links = {}
+        for name, target, mntns in self.m_db.execute('SELECT name,target,mntns FROM links'):
+            links[(mntns, name)] = target
+        omitted = {}
+        if self._haveTable("omitted"):
+            omitted = dict(self.m_db.execute('SELECT inode, count FROM omitted').fetchall())
+
+        rows = {}
+        for row in self.m_db.execute('SELECT * FROM inodes'):
+            rows[(row[9], row[8], row[7])] = (
+                row[2], row[3], row[4], row[5], row[6],
+                links.get((row[9], os.path.join(row[8], row[7]))), omitted.get(row[0])
+            )
+
+        return rows
+
+    def insertRows(self, rows):
+        """Inserts the rows returned by loadRows() into a new database."""
+        self.createTables()
+
+        def depth(key):
+            mntns, path, name = key
+            if path == '/' and name == '/':
+                # the root directory
+                return (mntns or '', 0)
+            return (mntns or '', len([part for part in path.split('/') if part]) + 1)
+
+        cursor = self.m_db.cursor()
+        # (mntns, directory path) -> row id, parents are inserted first
+        dir_ids = {}
+        for key in sorted(rows, key=lambda key: depth(key) + key[1:]):
+            mntns, path, name = key
+            uid, gid, caps, mode, type_char, target, omitted = rows[key]
+
+            if path == '/' and name == '/':
+                # like insertRawData() and insertContainerData()
+                parent = 1 if mntns is None else None
+            else:
+                parent = dir_ids.get((mntns, path))
+
+            cursor.execute(self._getInsertSql(), (parent, uid, gid, caps, mode, type_char, name, path, mntns))
+            row_id = cursor.lastrowid
+            full_path = os.path.join(path, name)
+            if type_char == 'd':
+                dir_ids[(mntns, full_path)] = row_id
+            if target is not None:
+                self.insertLink(full_path, target, mntns)
+            if omitted:
+                cursor.execute("INSERT INTO omitted (inode, count) VALUES (?, ?)", (row_id, omitted))
+
+        self.m_db.commit()
+
+    @staticmethod
+    def _rowToRawItem(row, links, omitted):
+        """Returns the raw dump entry for an inodes row, see loadTree()."""
+        target = links.get(os.path.join(row[8], row[7]))
+        if row[6] == 'd':
+            raw_type = 'd'
+        else:
+            # only symlinks to directories are recorded with their target
+            raw_type = 'l' if target is not None else 'f'
+
+        item = {
+            'properties': {
+                'caps': row[4],
+                'st_mode': row[5],
+                'st_uid': row[2],
+                'st_gid': row[3],
+                'type': raw_type
+            }
+        }
+        if raw_type == 'd':
+            item['subitems'] = {}
+            if row[0] in omitted:
+                item['omitted'] = omitted[row[0]]
+        elif target is not None:
+            item['target'] = target
+
+        return item
+
+    def _processDirectory(self, name, path, data, parentId, cursor, mntns=None):
         """Inserts a directory from the raw dump in the db."""
-        dir_sql_data = self._createDataArrayFromProperties(data['properties'], name, path, parentId)
+        dir_sql_data = self._createDataArrayFromProperties(data['properties'], name, path, parentId, mntns)
         cursor.execute(self._getInsertSql(), dir_sql_data)
         dir_id = cursor.lastrowid
         dir_path = os.path.join(path, name)
 
+        if data.get('omitted'):
+            cursor.execute("INSERT INTO omitted (inode, count) VALUES (?, ?)", (dir_id, data['omitted']))
+
         file_data = []
 
         for name, item in data['subitems'].iteritems():
             if item['properties']['type'] == 'd':
-                self._processDirectory(name, dir_path, item, dir_id, cursor)
+                self._processDirectory(name, dir_path, item, dir_id, cursor, mntns)
             else:
-                file_data.append(self._createDataArrayFromProperties(item['properties'], name, dir_path, dir_id))
+                file_data.append(self._createDataArrayFromProperties(item['properties'], name, dir_path, dir_id, mntns))
 
                 if 'target' in item:  # symlink
-                    self.insertLink(os.path.join(dir_path, name), item['target'])
+                    self.insertLink(os.path.join(dir_path, name), item['target'], mntns)
 
         cursor.executemany(self._getInsertSql(), tuple(file_data))
 
     @staticmethod
-    def _createDataArrayFromProperties(props, name, path, parent):
+    def _createDataArrayFromProperties(props, name, path, parent, mntns=None):
         """Creates a tuple use with insert from a properties dict as delivered by the probe and additional info."""
         mode = props['st_mode']
-        return parent, props['st_uid'], props['st_gid'], props['caps'], mode, file_mode.getTypeChar(mode), name, path
+        return (parent, props['st_uid'], props['st_gid'], props['caps'], mode, file_mode.getTypeChar(mode), name, path,
+                mntns)
 
     @staticmethod
     def _getInsertSql():
         """Returns the SQL statement for inserting into the db."""
-        return "INSERT INTO inodes (parent, uid, gid, caps, mode, type, name, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        return "INSERT INTO inodes (parent, uid, gid, caps, mode, type, name, path, mntns) " \
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
 
     def close(self):
         self.m_db.close()
@@ -275,6 +510,13 @@ class FsQuery(object):
         self.m_or_list = []
         self.m_and_list = []
 
+    def filterForMountNamespace(self, mntns):
+        """Only shows files from the given container mount namespace. None selects the host."""
+        if mntns is None:
+            self.addAndClause("mntns IS NULL")
+        else:
+            self.addAndClause("mntns = %s" % self.escapeStr(mntns))
+
     def filterForCapabilities(self):
         """Filter for files which have specific capabilities."""
         self.addOrClause("caps != 0")
@@ -336,6 +578,7 @@ class FilesystemIterator(object):
 
         self.name = item[7]
         self.basepath = item[8]
+        self.mntns = item[9]
 
         # caps = self.m_cap_translator.getCapStrings(item[4])
         # cap_str = "|".join(caps)
@@ -367,7 +610,7 @@ class SocketCache(object):
 
     def _buildCache(self):
         """This method saves a list of all file properties of sockets in RAM."""
-        data = self.m_fs_database.findData('type = "s"')
+        data = self.m_fs_database.findHostData('type = "s"')
         for row in data:
             fullname = os.path.join(row[8], row[7])
             self.m_cache[fullname] = FsDatabase.dbTupleToArray(row)
@@ -34,6 +34,7 @@ class ProcessData(object):
         self.m_ll_proc = CategoryLoader("proc_data", self.m_dumpIO)
         # self.m_ll_children = CategoryLoader("children", self.m_dumpIO)
         self.m_ll_parents = CategoryLoader("parents", self.m_dumpIO)
+        self.m_ll_maps_templates = CategoryLoader("maps_templates", self.m_dumpIO)
         self.m_daw_factory = factory
         self.m_socket_connection_cache = SocketCache()
         self.m_shm_cache = ShmCache()
@@ -50,6 +51,15 @@ class ProcessData(object):
     #     """Return the children of each process"""
     #     return self.m_ll_children.getData()
 
+    def getMapsTemplates(self):
+        """Returns the distinct memory mappings of all processes as a dict of
+        template id -> list of mappings, or None for dumps created by older
+        versions, which store the mappings in each process."""
+        try:
+            return self.m_ll_maps_templates.getData()
+        except LookupError:
+            return None
+
     def getProcessCount(self):
         """Returns the number of recorded processes for the scanned host"""
         return len(self.getProcData())
@@ -62,6 +72,26 @@ class ProcessData(object):
         """Get the data for a specific process"""
         return self.getProcData()[pid]
 
+    def isKernelThread(self, pid):
+        """Returns whether the given process is a kernel thread."""
+        info = self.getProcessInfo(pid)
+        if 'kthread' in info:
+            return info['kthread']
+
+        # dump created by an older version, kthreadd (PID 2) is the parent
+        # of all kernel threads
+        return pid == 2 or info['parent'] == 2
+
+    def getKernelThreadRoots(self):
+        """Returns the PIDs of kernel threads whose parent is no kernel
+        thread, i.e. usually only kthreadd."""
+        parents = self.getParents()
+        return [
+            pid for pid in self.getAllPids()
+            if self.isKernelThread(pid) and
+               not (parents[pid] in parents and self.isKernelThread(parents[pid]))
+        ]
+
     def processHasUid(self, pid, uid):
         """This method checks whether a process contains the given UID."""
         return uid in self.getProcData()[pid]["Uid"]
@@ -112,7 +142,8 @@ class ProcessData(object):
         :return:
         """
         self.m_shm_cache.buildIfNecessary(self.getProcData,
-                                          lambda: self.m_daw_factory.getSystemDataWrapper().getShmData())
+                                          lambda: self.m_daw_factory.getSystemDataWrapper().getShmData(),
+                                          self.getMapsTemplates)
         return self.m_shm_cache.getShmsForPid(pid)
 
 
@@ -244,13 +275,14 @@ class ShmCache:
     def isBuilt(self):
         return self.m_shm is not None
 
-    def buildIfNecessary(self, proc_source, shm_source):
+    def buildIfNecessary(self, proc_source, shm_source, templates_source=lambda: None):
         """Build the cache if necessary. data_source must be a lambda that supplies the data."""
         if not self.isBuilt():
-            self.build(proc_source(), shm_source())
+            self.build(proc_source(), shm_source(), templates_source())
 
-    def build(self, procdata, shmdata):
-        """Build the cache. The data should be the proc data."""
+    def build(self, procdata, shmdata, templates=None):
+        """Build the cache. The data should be the proc data, the shm data
+        and the maps templates, if the dump has them."""
         self.m_shm = dict([(int(data['inode']), {
             'name': data['name'],
             'inode': data['inode'],
@@ -258,13 +290,28 @@ class ShmCache:
         }) for data in shmdata])
         logging.debug('Building shm cache.')
 
+        def getShmInodes(maps):
+            return set([int(map['inode']) for map in maps]) & shm_inodes
+
+        shm_inodes = set(self.m_shm.keys())
+        # evaluate each distinct list of mappings only once
+        template_inodes = {}
+        if templates is not None:
+            for template, maps in templates.items():
+                template_inodes[template] = getShmInodes(maps)
+
         for pid, process_data in procdata.items():
-            for map in process_data['maps']:
-                if int(map['inode']) in self.m_shm:
-                    self.m_shm[int(map['inode'])]['pids'][pid] = {
-                        'pid': pid,
-                        'name': '{} {}'.format(process_data['executable'], process_data['parameters']),
-                    }
+            if 'maps' in process_data:
+                # dump created by an older version
+                inodes = getShmInodes(process_data['maps'])
+            else:
+                inodes = template_inodes.get(process_data.get('maps_template'), ())
+
+            for inode in inodes:
+                self.m_shm[inode]['pids'][pid] = {
+                    'pid': pid,
+                    'name': '{} {}'.format(process_data['executable'], process_data['parameters']),
+                }
 
     def getShmsForPid(self, pid):
         """
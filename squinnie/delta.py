@@ -0,0 +1,114 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+import os.path
+
+# local modules
+from squinnie.daw.fs import FsDatabase
+from squinnie.errors import ScannerError
+
+
+class DeltaMerger(object):
+    """Reconstructs the full categories of a dump received in delta mode
+    from the previous dump of the node and saves them. See
+    squinnie.probe.DeltaEncoder for the encoding of the categories.
+    """
+
+    def __init__(self, dio, previous=None):
+        """
+        :param DumpIO dio: receives the reconstructed categories.
+        :param DumpIO previous: the previous dump the delta refers to, see
+        DumpIO.keepAsPrevious(), or None if there is none.
+        """
+        self.m_dio = dio
+        self.m_previous = previous
+        self.m_previous_fs = None
+
+    def getPreviousFingerprints(self):
+        """Returns the fingerprints to send to the probe, an empty
+        dictionary if there is no previous dump to refer to."""
+        fingerprints = self.m_previous.loadFingerprints() if self.m_previous else None
+        return fingerprints if fingerprints else {}
+
+    def saveCategory(self, category, data):
+        """Saves a delta encoded category, suitable as sink for the probe."""
+        if category == "fingerprints":
+            self.m_dio.saveFingerprints(data)
+        else:
+            self.m_dio.saveCategory(category, self.resolve(category, data))
+
+    def resolve(self, category, data):
+        """Returns the full data of a delta encoded category."""
+        kind = data["delta"]
+
+        if kind == "full":
+            return data["data"]
+        elif kind == "unchanged":
+            return self._loadPrevious(category)
+        elif kind == "records":
+            ret = data["changed"]
+            if data["unchanged"]:
+                records = self._loadPrevious(category)
+                for key in data["unchanged"]:
+                    ret[key] = records[key]
+            return ret
+        elif kind == "tree":
+            return self._resolveTree(data["tree"], "/", None)
+        elif kind == "containers":
+            for mntns, info in data["containers"].items():
+                info["tree"] = self._resolveTree(info["tree"], "/", mntns)
+            return data["containers"]
+
+        raise ScannerError("Unknown delta encoding {} of category {}".format(kind, category))
+
+    def _loadPrevious(self, category):
+        if not self.m_previous:
+            raise ScannerError("Received a delta for {} without a previous dump".format(category))
+
+        try:
+            return self.m_previous.loadCategory(category)
+        except LookupError as e:
+            raise ScannerError("The previous dump lacks the data for a delta: {}".format(e))
+
+    def _resolveTree(self, tree, path, mntns):
+        """Replaces the unchanged markers in the file system ``tree`` of the
+        directory ``path`` by the subtrees from the previous dump."""
+        if "unchanged" not in tree:
+            for name, item in tree["subitems"].items():
+                if "subitems" in item or "unchanged" in item:
+                    tree["subitems"][name] = self._resolveTree(item, os.path.join(path, name), mntns)
+            return tree
+
+        if not self.m_previous_fs:
+            if not self.m_previous:
+                raise ScannerError("Received a file system delta without a previous dump")
+            self.m_previous_fs = FsDatabase(self.m_previous.getDumpDir())
+
+        ret = self.m_previous_fs.loadTree(path, mntns)
+        if ret is None:
+            raise ScannerError("The previous dump lacks the directory {} for a delta".format(path))
+        return ret
+
+    def close(self):
+        if self.m_previous_fs:
+            self.m_previous_fs.close()
+            self.m_previous_fs = None
@@ -22,11 +22,15 @@
 # MA 02110-1301 USA.
 
 import os
+import json
+import errno
 import pprint
 import threading
 import shutil
+import zlib
 from squinnie import helper
 from squinnie.daw.fs import FsDatabase
+from squinnie.errors import ScannerError
 import logging
 
 
@@ -37,6 +41,20 @@ class DumpIO(object):
 
     FILE_EXTENSION = ".p.gz"
     LOCK_FILE_NAME = '.squinnie.data'
+    # exists while a dump is still being received, contains the PID of the
+    # receiving process
+    PARTIAL_FILE_NAME = '.squinnie.partial'
+    # records the categories of the dump that have been saved completely,
+    # so that an interrupted dump can be resumed
+    MANIFEST_FILE_NAME = '.squinnie.manifest.json'
+    # the fingerprints of a dump received in delta mode, see
+    # squinnie.delta.DeltaMerger
+    FINGERPRINT_FILE_NAME = '.squinnie.fingerprints'
+    # appended to the target name of a dump that is set aside while a new
+    # dump is received as delta against it
+    PREVIOUS_SUFFIX = '.previous'
+    # size of the blocks a file system database is decompressed in
+    CHUNK_SIZE = 1024 * 1024
 
     def __init__(self, target, path="/tmp/squinnie"):
         """
@@ -68,12 +86,217 @@ class DumpIO(object):
         """
         self._createDumpDirIfItDoesNotExist()
 
-        # the filesystem needs to be handled in a special way as it's a database instead of a regular dump
-        if 'filesystem' in data:
-            self.writeOutFilesystem(data.pop('filesystem'))
+        for category in ('filesystem', 'container_filesystems', 'filesystem_db'):
+            if category in data:
+                self.saveCategory(category, data.pop(category))
 
         for category in data:
-            self.writeCategory(category, data[category])
+            self.saveCategory(category, data[category])
+
+    def saveCategory(self, category, data):
+        """
+        Saves the data of a single category.
+        :param category: The name of the category.
+        :param data: The dumped data of the category.
+        """
+        self._createDumpDirIfItDoesNotExist()
+
+        # the filesystem needs to be handled in a special way as it's a database instead of a regular dump
+        if category == 'filesystem':
+            self.writeOutFilesystem(data)
+        elif category == 'container_filesystems':
+            self.writeOutContainerFilesystems(data)
+        elif category == 'filesystem_db':
+            self.writeOutFilesystemDatabase(data)
+        elif category == 'filesystem_rows':
+            self.writeOutFilesystemRows(data)
+        else:
+            self.writeCategory(category, data)
+
+        self._addToManifest(category)
+
+    def loadManifest(self):
+        """Returns the manifest of the dump, a dict with the list of
+        completely saved "categories" and whether the dump is "complete".
+        Dumps of older versions have no manifest, for them None is
+        returned."""
+        try:
+            with open(os.path.join(self.getDumpDir(), self.MANIFEST_FILE_NAME), 'r') as f:
+                return json.load(f)
+        except (EnvironmentError, ValueError):
+            return None
+
+    def _saveManifest(self, manifest):
+        # replace the file atomically, so an interruption never leaves a
+        # broken manifest behind
+        path = os.path.join(self.getDumpDir(), self.MANIFEST_FILE_NAME)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.rename(path + ".tmp", path)
+
+    def _addToManifest(self, category):
+        manifest = self.loadManifest() or {"complete": False, "categories": []}
+        if category not in manifest["categories"]:
+            manifest["categories"].append(category)
+            self._saveManifest(manifest)
+
+    def getSavedCategories(self):
+        """Returns the categories an incomplete dump already contains
+        completely, according to its manifest."""
+        manifest = self.loadManifest()
+        return list(manifest["categories"]) if manifest else []
+
+    def startPartialDump(self, resume=False):
+        """Marks the dump as incomplete before saving the first category of
+        a dump that is received category by category. Leftovers of an
+        interrupted earlier attempt are removed, unless ``resume`` is set.
+        Then the categories saved already (see getSavedCategories()) are
+        kept."""
+        if self.getPartialDumpOwner() is not None and not resume:
+            self.clearCache()
+
+        self._createDumpDirIfItDoesNotExist()
+        open(os.path.join(self.getDumpDir(), self.LOCK_FILE_NAME), 'a').close()
+        if not resume:
+            self._saveManifest({"complete": False, "categories": []})
+
+        self._writePartialMarker(os.getpid())
+
+    def _writePartialMarker(self, owner):
+        """Writes the marker of an incomplete dump. ``owner`` is the PID of
+        the receiving process or None if nobody receives the dump anymore.
+        The PID is followed by the process's start time (see
+        _getProcessStartTime()), since PIDs are reused."""
+        content = ''
+        if owner:
+            content = ' '.join([str(owner), self._getProcessStartTime(owner) or '']).strip()
+
+        with open(os.path.join(self.getDumpDir(), self.PARTIAL_FILE_NAME), 'w') as f:
+            f.write(content)
+
+    @staticmethod
+    def _getProcessStartTime(pid):
+        """Returns the boot id and the start time of the running process
+        ``pid``, which identify it together with its PID, or None if it
+        doesn't exist or /proc is unavailable."""
+        try:
+            with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+                boot_id = f.read().strip()
+            with open('/proc/{}/stat'.format(pid), 'r') as f:
+                stat = f.read()
+        except EnvironmentError:
+            return None
+
+        # the process name in parentheses can contain spaces, the start
+        # time is the 22nd field
+        return "{}/{}".format(boot_id, stat[stat.rindex(')') + 2:].split()[19])
+
+    def abandonPartialDump(self):
+        """Marks an incomplete dump started by this process via
+        startPartialDump() as no longer being received, e.g. after its scan
+        failed, so that it is collected again or resumed."""
+        if self.getPartialDumpOwner() == os.getpid():
+            self._writePartialMarker(None)
+
+    def finishPartialDump(self):
+        """Marks a dump started via startPartialDump() as complete."""
+        manifest = self.loadManifest() or {"categories": []}
+        manifest["complete"] = True
+        self._saveManifest(manifest)
+
+        partial = os.path.join(self.getDumpDir(), self.PARTIAL_FILE_NAME)
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    def _readPartialMarker(self):
+        """Returns the (PID, start time) of the process receiving this dump
+        as written by _writePartialMarker(), with a PID of 0 if nobody
+        receives it anymore, or None if the dump isn't incomplete."""
+        partial = os.path.join(self.getDumpDir(), self.PARTIAL_FILE_NAME)
+        try:
+            with open(partial, 'r') as f:
+                fields = f.read().split()
+        except EnvironmentError:
+            return None
+
+        # markers of older versions only contain the PID
+        return (int(fields[0]) if fields else 0, fields[1] if len(fields) > 1 else None)
+
+    def getPartialDumpOwner(self):
+        """Returns the PID of the process receiving this dump, if it is
+        incomplete, or None otherwise. The PID is 0 if nobody receives the
+        dump anymore."""
+        marker = self._readPartialMarker()
+        return marker[0] if marker else None
+
+    def isBeingReceived(self):
+        """Returns whether the dump is incomplete but still being received
+        by a running process."""
+        pid, start_time = self._readPartialMarker() or (0, None)
+        if not pid or pid == os.getpid():
+            # a marker of this process is left over from an earlier attempt
+            # that failed, e.g. a previous round of --watch
+            return False
+        elif start_time:
+            # the PID might have been reused by another process
+            return self._getProcessStartTime(pid) == start_time
+
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+
+        return True
+
+    def saveFingerprints(self, fingerprints):
+        """Saves the fingerprints of a dump received in delta mode, they
+        are sent to the probe for the next scan."""
+        self._createDumpDirIfItDoesNotExist()
+        helper.writePickle(fingerprints, os.path.join(self.getDumpDir(), self.FINGERPRINT_FILE_NAME))
+
+    def loadFingerprints(self):
+        """Returns the fingerprints saved via saveFingerprints() or None if
+        there are none."""
+        path = os.path.join(self.getDumpDir(), self.FINGERPRINT_FILE_NAME)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            return helper.readPickle(path)
+        except Exception as e:
+            logging.warning("Ignoring the broken fingerprints in {}: {}".format(path, e))
+            return None
+
+    def getPreviousDump(self):
+        """Returns a DumpIO for the dump set aside by keepAsPrevious()."""
+        return DumpIO(self.m_target_name + self.PREVIOUS_SUFFIX, path=self.m_path_prefix)
+
+    def keepAsPrevious(self):
+        """
+        Moves the dump aside, so that a new dump can be received as delta
+        against it, instead of clearing it via clearCache().
+        :return: The DumpIO of the previous dump.
+        """
+        self.cache.clear()
+        previous = self.getPreviousDump()
+        if os.path.isdir(previous.getDumpDir()):
+            # left over from an interrupted run
+            previous.clearCache()
+
+        os.rename(self.getDumpDir(), previous.getDumpDir())
+        return previous
+
+    def restorePrevious(self):
+        """Replaces the dump with the one set aside by keepAsPrevious(), if
+        any, e.g. after receiving the new one failed."""
+        previous = self.getPreviousDump()
+        if not os.path.isdir(previous.getDumpDir()):
+            return
+
+        self.cache.clear()
+        if os.path.isdir(self.getDumpDir()):
+            shutil.rmtree(self.getDumpDir())
+        os.rename(previous.getDumpDir(), self.getDumpDir())
 
     def writeOutFilesystem(self, data):
         """
@@ -85,6 +308,74 @@ class DumpIO(object):
         fsdb.insertRawData(data)
         fsdb.close()
 
+    def writeOutContainerFilesystems(self, data):
+        """
+        This helper adds the file systems of containers to the filesystem
+        database, tagged with their mount namespace.
+        :param data: A dict of mount namespace -> {"pid": pid, "tree": fs data}
+        """
+        logging.debug("Inserting container data into fs")
+        fsdb = FsDatabase(self.getDumpDir())
+        for mntns, info in data.items():
+            fsdb.insertContainerData(mntns, info['tree'])
+        fsdb.close()
+
+    def writeOutFilesystemDatabase(self, data):
+        """
+        This helper moves the filesystem database built by the probe into
+        place, see squinnie.probe.FsDatabaseBuilder.
+        :param data: A dict with the "codec" and the compressed "data" of the database file.
+        """
+        if data['codec'] != 'zlib':
+            raise ScannerError("Unsupported file system database codec {}".format(data['codec']))
+
+        logging.debug("Verifying the received fs database")
+        self._createDumpDirIfItDoesNotExist()
+        db_path = os.path.join(self.getDumpDir(), FsDatabase.DB_NAME)
+        tmp_path = db_path + ".tmp"
+
+        try:
+            decompressor = zlib.decompressobj()
+            blob = data['data']
+            with open(tmp_path, 'wb') as db_file:
+                for offset in range(0, len(blob), self.CHUNK_SIZE):
+                    db_file.write(decompressor.decompress(blob[offset:offset + self.CHUNK_SIZE]))
+                db_file.write(decompressor.flush())
+        except zlib.error as e:
+            problem = "failed to decompress it: {}".format(e)
+        else:
+            problem = FsDatabase.verifyDatabase(tmp_path)
+
+        if problem:
+            os.remove(tmp_path)
+            raise ScannerError("Received a broken file system database: {}".format(problem))
+
+        os.rename(tmp_path, db_path)
+
+    def writeOutFilesystemRows(self, rows):
+        """
+        This helper creates the filesystem database from the rows of a
+        snapshot, see squinnie.snapshots.SnapshotStore.
+        :param rows: The rows as returned by loadFilesystemRows().
+        """
+        logging.debug("Inserting rows into fs")
+        fsdb = FsDatabase(self.getDumpDir())
+        fsdb.insertRows(rows)
+        fsdb.close()
+
+    def loadFilesystemRows(self):
+        """Returns the rows of the filesystem database (see
+        FsDatabase.loadRows()) or None if the dump has no file system
+        data."""
+        if not os.path.isfile(os.path.join(self.getDumpDir(), FsDatabase.DB_NAME)):
+            return None
+
+        fsdb = FsDatabase(self.getDumpDir())
+        try:
+            return fsdb.loadRows()
+        finally:
+            fsdb.close()
+
     def writeCategory(self, category, data):
         """This method writes a dump category to a file."""
         file_basename = helper.makeValidDirname(category)
@@ -99,7 +390,10 @@ class DumpIO(object):
         # create the lockfile
         open(os.path.join(self.getDumpDir(), self.LOCK_FILE_NAME), 'a').close()
 
-        helper.writePickle(data, file)
+        # write a new file and rename it, so an interruption never leaves a
+        # truncated category behind
+        helper.writePickle(data, file + ".tmp")
+        os.rename(file + ".tmp", file)
         self.cache[category] = data
         # self._debugPrint(data[category])
 
@@ -152,6 +446,16 @@ class DumpIO(object):
                 for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)) and f.endswith(self.FILE_EXTENSION)]
 
     def hasCache(self):
+        if self.getPartialDumpOwner() is not None:
+            # an interrupted dump needs to be collected again, one that is
+            # still being received can already be viewed
+            if not self.isBeingReceived():
+                return False
+            logging.warning("The dump for {} is still being collected, data may be missing".format(
+                self.m_target_name
+            ))
+            return True
+
         return len(self.getAllCachedCategories()) > 0
 
     def clearCache(self):
@@ -24,20 +24,25 @@
 # Standard library modules.
 from __future__ import with_statement
 from collections import OrderedDict
+import threading
 import logging
+import time
 import sys
 import os
 
 # local modules
 import squinnie.helper
 import squinnie.probe
+import squinnie.gateway
+import squinnie.coordinator
 import squinnie.network_config
 from squinnie.dio import DumpIO
+from squinnie.history import ScanHistory
+from squinnie.delta import DeltaMerger
 from squinnie.errors import ScannerError
 
 # foreign modules
 try:
-    import execnet
     import termcolor
 except ImportError as e:
     squinnie.helper.missingModule(ex=e)
@@ -52,16 +57,88 @@ class Dumper(object):
     SshDumper and LocalDumper.
     """
 
+    # the default number of nodes to scan in parallel
+    DEFAULT_JOBS = 4
+
     def __init__(self):
 
         self.m_outdir = None
         self.m_use_cache = True
+        # keyword arguments for the probe's Scanner class
+        self.m_probe_options = {}
+        # a squinnie.progress.ProgressDisplay, if enabled
+        self.m_progress = None
+        self.m_jobs = self.DEFAULT_JOBS
+        self.m_resume = False
+        # the squinnie.history.ScanHistory of the output directory
+        self.m_history = None
+        self.m_use_timeouts = True
 
     def setUseCache(self, use):
         self.m_use_cache = use
 
+    def setUseTimeouts(self, use):
+        """Abort the scan of nodes that take a lot longer than their
+        earlier scans, see ScanHistory.getTimeout()."""
+        self.m_use_timeouts = use
+
+    def setResume(self, resume):
+        """Resume an interrupted scan: the categories an incomplete dump
+        already contains are not collected again, see
+        DumpIO.getSavedCategories(). This only takes effect for nodes whose
+        categories are received one by one, the others are scanned again
+        completely."""
+        self.m_resume = resume
+
+    def setJobs(self, jobs):
+        """Sets the maximum number of nodes to scan in parallel."""
+        self.m_jobs = max(1, jobs)
+
+    def setScanContainers(self, scan):
+        """Also collect the root file systems of containers i.e. of all
+        distinct mount namespaces found on the target.
+        """
+        self.m_probe_options['collect_containers'] = scan
+
+    def setInterestingFilesOnly(self, interesting):
+        """Only record file system objects that are interesting from a
+        security point of view, see squinnie.probe.Scanner.isInteresting().
+        """
+        self.m_probe_options['interesting_only'] = interesting
+
+    def setBuildFsDatabase(self, build):
+        """Let the probes convert the file system data into the database
+        format of squinnie.daw.fs.FsDatabase on the scanned nodes, instead
+        of doing it here for each node, see
+        squinnie.probe.FsDatabaseBuilder.
+        """
+        self.m_probe_options['build_fs_db'] = build
+
+    def setHostRoot(self, path):
+        """Scan the running systems whose root file system, including its
+        procfs and sysfs, is found in the directory ``path`` on the nodes,
+        see the host_root parameter of squinnie.probe.Scanner.
+        """
+        self.m_probe_options['host_root'] = path
+
+    def setProgressDisplay(self, display):
+        """Report the progress of the probes to the given
+        squinnie.progress.ProgressDisplay during collect().
+        """
+        self.m_progress = display
+        self.m_probe_options['progress'] = display is not None
+
     def setOutputDir(self, path):
         self.m_outdir = path
+        self.m_history = ScanHistory(path)
+
+    def getEstimateOptions(self):
+        """Returns the probe options for only estimating the costs of a full
+        scan with the current settings."""
+        options = dict(self.m_probe_options)
+        options['estimate'] = True
+        options['progress'] = False
+        return options
 
     def printCachedDumps(self):
         """Prints an informational line for each dump that was not freshly
@@ -84,18 +161,114 @@ class Dumper(object):
     def save(self):
         """Save collected node dumps in their respective dump files, if
         they're not cached.
+
+        The dumpers save each node as soon as it has been received, so
+        that the memory use doesn't grow with the number of nodes. This
+        only finishes any node that hasn't been saved yet.
         """
         for config in self.m_nodes:
-            if config['cached']:
+            if config['cached'] or config.get('failed', False) or config.get('saved', False):
                 continue
 
-            node_data_dict = {
-                config['node']: config['data']
-            }
-            dump_path = config['full_path']
-
-            dio = DumpIO(config["node"], path=self.m_outdir)
-            dio.saveFullDump(node_data_dict[config["node"]])
+            self._saveNode(config)
+
+    def _saveNode(self, config):
+        """Saves the collected dump of a single node and drops it from
+        memory."""
+        dio = DumpIO(config["node"], path=self.m_outdir)
+        if not config.get('streamed', False):
+            # an interrupted save must not look like a complete dump
+            dio.startPartialDump()
+        dio.saveFullDump(config['data'])
+        dio.finishPartialDump()
+
+        config['saved'] = True
+        config['data'] = None
+
+        if 'started' in config and not config.get('resume'):
+            # resumed scans skip the categories collected before, their
+            # duration would shorten the timeouts of full scans
+            self.m_history.record(
+                config['node'],
+                config.get('finished', time.time()) - config['started'],
+                ScanHistory.getDumpSize(dio.getDumpDir())
+            )
+
+    def _getTimeout(self, node):
+        """Returns the number of seconds after which the scan of ``node``
+        is aborted or None for no timeout."""
+        if not self.m_use_timeouts:
+            return None
+        return self.m_history.getTimeout(node)
+
+    def _failNode(self, config):
+        """Marks a node as failed. The incomplete dump saved so far is
+        left to be collected again or resumed later on."""
+        config['failed'] = True
+        DumpIO(config['node'], path=self.m_outdir).abandonPartialDump()
+
+    def _runParallel(self, configs, func):
+        """Calls ``func`` for each of the given node configs, using up to
+        self.m_jobs threads. Nodes for which ``func`` fails are marked as
+        failed, the others are still collected. The nodes with the longest
+        expected scan are started first."""
+        lock = threading.Lock()
+        pending = self.m_history.sortLongestFirst(configs, lambda config: config['node'])
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    config = pending.pop(0)
+
+                node = config['node']
+                if self.m_progress:
+                    self.m_progress.startNode(node)
+
+                config['started'] = time.time()
+                try:
+                    func(config)
+                except Exception as e:
+                    logging.error("Failed to scan {}: {}".format(node, e))
+                    self._failNode(config)
+
+                if self.m_progress:
+                    self.m_progress.finishNode(node, failed=config.get('failed', False))
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(min(self.m_jobs, len(pending)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if all([config.get('failed', False) for config in configs]) and configs:
+            raise ScannerError("Failed to scan any of the nodes")
+
+    @staticmethod
+    def _getProbeArgs(options):
+        """Returns the command line arguments for running probe.py
+        standalone with the given Scanner options."""
+        probe_args = []
+        if options.get('collect_containers', False):
+            probe_args.append("--container-fs")
+        if options.get('interesting_only', False):
+            probe_args.append("--interesting-files")
+        if options.get('build_fs_db', False):
+            probe_args.append("--build-fs-db")
+        if options.get('estimate', False):
+            probe_args.append("--estimate")
+        if options.get('progress', False):
+            probe_args.append("--progress")
+        if options.get('root', None):
+            probe_args.extend(["--root", options['root']])
+        if options.get('host_root', None):
+            probe_args.extend(["--host-root", options['host_root']])
+
+        return probe_args
 
     def _getFilename(self, node_str):
         # apparently .p is commonly used for pickled data
@@ -146,13 +319,19 @@ class Dumper(object):
         for node, parent in node_list:
             dump = self._getFilename(node)
 
-            self.m_nodes.append({
+            config = {
                 "node": node,
                 "path": dump,
                 "full_path": self._getFullDumpPath(dump),
                 "via": parent,
                 "cached": self._haveCachedDump(node)
-            })
+            }
+            if self.m_resume and not config['cached']:
+                dio = DumpIO(node, path=self.m_outdir)
+                if dio.getPartialDumpOwner() is not None:
+                    # the categories of an interrupted scan to keep
+                    config['resume'] = dio.getSavedCategories()
+            self.m_nodes.append(config)
 
 
 class SshDumper(Dumper):
@@ -161,6 +340,83 @@ class SshDumper(Dumper):
     def __init__(self, *args, **kwargs):
         super(SshDumper, self).__init__(*args, **kwargs)
         self.m_network = None
+        self.m_fan_out = False
+        # the squinnie.gateway.GatewayPool used for reaching the nodes
+        self.m_pool = None
+        # seconds a resident probe waits for further requests, None if
+        # the probe is sent for each scan
+        self.m_agent_idle_timeout = None
+        # gateway id -> channel of the resident probe
+        self.m_agents = {}
+        self.m_agents_lock = threading.Lock()
+        # probe options for packing the transferred data
+        self.m_transfer_options = {}
+        self.m_delta = False
+
+    def setCompression(self, codecs):
+        """Let the probes send the collected data compressed.
+
+        :param list codecs: (codec, level) tuples in order of preference.
+        The probe uses the first one it supports, codecs we don't support
+        ourselves are skipped. See squinnie.probe.FrameSender.
+        """
+        supported = squinnie.helper.getSupportedCodecs()
+        for codec, _ in codecs:
+            if codec not in supported:
+                logging.warning("Compression codec {} is not supported".format(codec))
+
+        self._setTransferOption('compression', [
+            (codec, level) for codec, level in codecs if codec in supported
+        ])
+
+    def setBandwidthLimit(self, rate):
+        """Limits the rate at which each probe sends its data to ``rate``
+        bytes per second. This also applies to the coordinators of
+        setFanOut(), for all their nodes together."""
+        self._setTransferOption('bandwidth', rate)
+
+    def setDeltaTransfer(self, delta):
+        """When rescanning nodes without using the cache, only transfer what
+        has changed since their previous dump and reconstruct the rest from
+        it, see squinnie.delta.DeltaMerger. Nodes scanned via setFanOut()
+        are always transferred in full.
+        """
+        self.m_delta = delta
+
+    def _setTransferOption(self, key, value):
+        if value:
+            self.m_transfer_options[key] = value
+            # packed data is unpickled by us, not by execnet
+            self.m_transfer_options['pickle_protocol'] = squinnie.helper.importPickle().HIGHEST_PROTOCOL
+        else:
+            self.m_transfer_options.pop(key, None)
+
+    def setGatewayPool(self, pool):
+        """Use the gateways of the given squinnie.gateway.GatewayPool,
+        which may already be connected to some of the nodes. The caller
+        is responsible for terminating it. Otherwise a pool is created and
+        terminated by each call of collect() and estimate().
+        """
+        self.m_pool = pool
+
+    def setFanOut(self, fan_out):
+        """Scan the nodes behind a jump host from the jump host itself: a
+        coordinator is deployed there that runs the probes on its nodes in
+        parallel and streams their compressed output over a single channel,
+        see squinnie.coordinator. Otherwise each node is reached through
+        its own ssh tunnel via the jump host.
+        """
+        self.m_fan_out = fan_out
+
+    def setAgentMode(self, idle_timeout):
+        """Keep the probe running on each node after a scan and send
+        further scans of the node to it, instead of sending the probe again
+        for each scan. The probe exits after ``idle_timeout`` seconds
+        without requests or when its gateway is closed. This only helps if
+        the same gateways are used for repeated scans, see
+        setGatewayPool(). Pass None to disable this.
+        """
+        self.m_agent_idle_timeout = idle_timeout
 
     def setNetworkConfig(self, nc):
         """Set an already existing network configuration dictionary for futher
@@ -197,10 +453,27 @@ class SshDumper(Dumper):
         if not self.m_use_cache:
             self._discardCachedDumps()
 
-        self._receiveData()
+        self._withGatewayPool(self._receiveData)
         if load_cached:
             self._loadCachedDumps()
 
+    def _withGatewayPool(self, call):
+        """Returns the result of ``call``, which uses self.m_pool. If no
+        pool has been set via setGatewayPool() then one is created for the
+        duration of the call."""
+        if self.m_pool:
+            return call()
+
+        self.m_pool = squinnie.gateway.GatewayPool()
+        try:
+            return call()
+        finally:
+            self.m_pool.terminate()
+            self.m_pool = None
+
+    def _isJumpHost(self, node):
+        return any([via == node for _, via in self._getNetworkNodes()])
+
     def _getNetworkNodes(self):
         """Flattens the nodes found in self.m_network and returns them as a
         list of (node, parent), where parent is an optional jump host to reach
@@ -213,40 +486,310 @@ class SshDumper(Dumper):
 
         return ret
 
-    def _getExecnetGateway(self, node, via):
-        """Returns a configuration string for execnet's makegatway() function
-        for dumping the given node.
+    def estimate(self):
+        """Runs only the cheap estimation part of the probe on the configured
+        nodes. Returns a list of (node, estimate) tuples, see
+        squinnie.probe.Scanner.estimate().
         """
-        data = {
-            "ssh": "root@{}".format(node) if "@" not in node else node,
-            "id": "{}".format(node),
-            "python": "python{}".format(2)
-        }
-
-        if via:
-            data["via"] = via
+        if not self.m_network:
+            raise ScannerError("Missing network configuration")
+
+        def estimateAll():
+            ret = []
+            for node, via in self._getNetworkNodes():
+                logging.info("Estimating scan costs for {}".format(node))
+                ret.append((node, self._runProbe(node, via, self.getEstimateOptions())))
+            return ret
+
+        return self._withGatewayPool(estimateAll)
+
+    def _runProbe(self, node, via, options, sink=None, timeout=None):
+        """Runs the probe on ``node`` with the given Scanner options and
+        returns its result. If ``sink`` is set then the probe streams each
+        category as soon as it is complete and ``sink`` is called with
+        (category, data) for it. The result then only contains categories
+        that have not been streamed. If the probe takes longer than
+        ``timeout`` seconds then a ScannerError is raised."""
+        options = dict(options, **self.m_transfer_options)
+        if sink:
+            options['stream'] = True
+
+        gateway = self.m_pool.get(node, via)
+
+        channel, reused = self._getProbeChannel(gateway)
+        sent = False
+        deadline = time.time() + timeout if timeout else None
+        # the chunks of the next packed frame
+        chunks = []
+
+        # progress and category frames may precede the result frame
+        while True:
+            try:
+                if not sent:
+                    channel.send(options)
+                    sent = True
+                frame = channel.receive(
+                    timeout=max(deadline - time.time(), 0) if deadline else None
+                )
+            except channel.TimeoutError:
+                self._discardAgent(gateway)
+                if not self._isJumpHost(node):
+                    # terminates the probe
+                    self.m_pool.discard(node, via)
+                raise ScannerError("Timed out after {} seconds".format(int(timeout)))
+            except (EOFError, IOError):
+                if not reused:
+                    raise
+                # the resident probe exited due to its idle timeout just
+                # before it got the request, start a new one
+                logging.info("The probe agent on {} exited, starting a new one".format(node))
+                self._discardAgent(gateway)
+                channel, _ = self._getProbeChannel(gateway)
+                reused = sent = False
+                continue
 
-        parts = ["{}={}".format(key, value) for key, value in data.items()]
+            # once the probe replied, a failure is no idle timeout anymore
+            reused = False
 
-        return "//".join(parts)
+            kind = frame[0]
+            if kind == "chunk":
+                chunks.append(frame[1])
+                continue
+            elif kind == "packed":
+                kind, name, codec = frame[1:]
+                data = squinnie.helper.unpackData(chunks, codec)
+                chunks = []
+                frame = (kind, data) if name is None else (kind, name, data)
+
+            if kind == "result":
+                return frame[1]
+            elif kind == "progress" and self.m_progress:
+                self.m_progress.update(node, frame[1])
+            elif kind == "category":
+                category, data = frame[1:]
+                sink(category, data)
+
+    def _getProbeChannel(self, gateway):
+        """Returns a channel to a probe running on the other side of
+        ``gateway`` that accepts a request and whether the channel is one
+        of a resident probe that already served earlier requests."""
+        if self.m_agent_idle_timeout is None:
+            return gateway.remote_exec(squinnie.probe), False
+
+        reused = True
+        with self.m_agents_lock:
+            channel = self.m_agents.get(gateway.id)
+            if channel is None or channel.isclosed():
+                channel = gateway.remote_exec(squinnie.probe)
+                channel.send({"agent": True, "idle_timeout": self.m_agent_idle_timeout})
+                self.m_agents[gateway.id] = channel
+                reused = False
+
+        return channel, reused
+
+    def _discardAgent(self, gateway):
+        """Forgets the resident probe of ``gateway``, which may be busy
+        with an aborted request."""
+        with self.m_agents_lock:
+            channel = self.m_agents.pop(gateway.id, None)
+
+        if channel:
+            channel.close()
 
     def _receiveData(self):
+        """Runs the probe on all nodes that aren't cached, up to self.m_jobs
+        nodes in parallel. Each node's dump is saved as soon as it is
+        complete. Nodes that fail are marked as such, the others are still
+        collected."""
+        pending = [config for config in self.m_nodes if not config['cached']]
+
+        # connect to the jump hosts first, to find out early which nodes
+        # can't be reached
+        hops = []
+        for config in pending:
+            if config['via'] and config['via'] not in hops:
+                hops.append(config['via'])
+
+        for hop in hops:
+            try:
+                self.m_pool.get(hop)
+            except ScannerError as e:
+                logging.error("Failed to connect to {}: {}".format(hop, e))
+                for config in pending:
+                    if hop in (config['node'], config['via']):
+                        config['failed'] = True
+
+        if pending and all([config.get('failed', False) for config in pending]):
+            raise ScannerError("Failed to connect to any of the jump hosts")
+        pending = [config for config in pending if not config.get('failed', False)]
+
+        coordinators = []
+        if self.m_fan_out:
+            for hop in hops:
+                behind = [config for config in pending if config['via'] == hop]
+                if not behind:
+                    continue
+                coordinators.append(threading.Thread(
+                    target=self._receiveViaCoordinator,
+                    args=(self.m_pool.get(hop), behind)
+                ))
+            pending = [config for config in pending if not config['via']]
+
+        for thread in coordinators:
+            thread.start()
+
+        try:
+            self._runParallel(pending, self._receiveNode)
+        finally:
+            for thread in coordinators:
+                thread.join()
 
-        group = execnet.Group()
-        data = {}
+    def _discardCachedDumps(self):
+        """In delta mode the cached dumps are kept aside as the previous
+        dumps the new ones are reconstructed from, see _receiveNode()."""
+        if not self.m_delta:
+            super(SshDumper, self)._discardCachedDumps()
+            return
 
         for config in self.m_nodes:
-            if config['cached']:
+            if not config['cached']:
                 continue
-            node = config['node']
-            logging.info("Receiving data from {}".format(node))
-            gateway = self._getExecnetGateway(node, config['via'])
-            try:
-                group.makegateway(gateway)
-            except execnet.HostNotFound as e:
-                raise ScannerError("Failed to connect to remote host: " + str(e))
 
-            config['data'] = group[node].remote_exec(squinnie.probe).receive()
+            dio = DumpIO(config["node"], path=self.m_outdir)
+            if self.m_fan_out and config['via']:
+                dio.clearCache()
+            else:
+                config['previous'] = dio.keepAsPrevious()
+            config['cached'] = False
+
+    def _receiveNode(self, config):
+        node = config['node']
+        logging.info("Receiving data from {}".format(node))
+
+        # persist categories as they arrive, so they can be viewed
+        # while the rest of the node is still being scanned
+        dio = DumpIO(node, path=self.m_outdir)
+        options = self.m_probe_options
+        sink = dio.saveCategory
+        merger = None
+        if self.m_delta:
+            merger = DeltaMerger(dio, config.get('previous'))
+            options = dict(options, delta=merger.getPreviousFingerprints())
+            sink = merger.saveCategory
+
+        skip = config.get('resume')
+        if skip:
+            logging.info("Resuming the dump of {}, keeping {}".format(node, ", ".join(skip)))
+            options = dict(options, skip_categories=skip)
+
+        dio.startPartialDump(resume=bool(skip))
+        config['streamed'] = True
+        try:
+            config['data'] = self._runProbe(
+                node, config['via'], options,
+                sink=sink, timeout=self._getTimeout(node)
+            )
+        except Exception:
+            if config.get('previous'):
+                # better keep the old dump than an incomplete new one
+                dio.restorePrevious()
+            raise
+        finally:
+            if merger:
+                merger.close()
+
+        self._saveNode(config)
+        if config.get('previous'):
+            config.pop('previous').clearCache()
+
+    def _receiveViaCoordinator(self, gateway, configs):
+        """Scans the nodes described by ``configs``, which are all reached
+        via the jump host connected to by ``gateway``, by running
+        squinnie.coordinator on the jump host."""
+        import inspect
+        import tempfile
+
+        configs = OrderedDict([
+            (config['node'], config)
+            for config in self.m_history.sortLongestFirst(configs, lambda config: config['node'])
+        ])
+        # node -> temporary file receiving its compressed dump
+        spools = {}
+
+        probe_args = self._getProbeArgs(self.m_probe_options)
+        # the probe may run a more recent python version than we do
+        probe_args.extend(["--pickle-protocol", str(squinnie.helper.importPickle().HIGHEST_PROTOCOL)])
+
+        try:
+            channel = gateway.remote_exec(squinnie.coordinator)
+            channel.send({
+                "nodes": [
+                    (node, squinnie.gateway.getSshTarget(node), self._getTimeout(node))
+                    for node in configs
+                ],
+                "probe": inspect.getsource(squinnie.probe),
+                "probe_args": probe_args,
+                "python": squinnie.gateway.getPythonSpec(),
+                "progress_prefix": squinnie.probe.PROGRESS_PREFIX,
+                "jobs": self.m_jobs,
+                "bandwidth": self.m_transfer_options.get('bandwidth')
+            })
+
+            while True:
+                frame = channel.receive()
+                kind = frame[0]
+                if kind == "finished":
+                    break
+
+                node = frame[1]
+                if kind == "start":
+                    logging.info("Receiving data from {} via {}".format(node, configs[node]['via']))
+                    spools[node] = tempfile.TemporaryFile()
+                    configs[node]['started'] = time.time()
+                    if self.m_progress:
+                        self.m_progress.startNode(node)
+                elif kind == "progress" and self.m_progress:
+                    self.m_progress.update(node, frame[2])
+                elif kind == "stderr":
+                    sys.stderr.write("{}: {}\n".format(node, frame[2]))
+                elif kind == "data":
+                    spools[node].write(frame[2])
+                elif kind == "done":
+                    self._finishSpooledNode(configs[node], spools.pop(node, None), frame[2])
+        except Exception as e:
+            logging.error("Failed to scan the nodes via {}: {}".format(gateway.id, e))
+            for node, config in configs.items():
+                if config.get('saved', False):
+                    continue
+                self._failNode(config)
+                if node in spools and self.m_progress:
+                    self.m_progress.finishNode(node, failed=True)
+        finally:
+            for spool in spools.values():
+                spool.close()
+
+    def _finishSpooledNode(self, config, spool, error):
+        """Loads and saves the dump of a node scanned by the coordinator
+        from the temporary file ``spool``. ``error`` is the error reported
+        by the coordinator, if any."""
+        node = config['node']
+
+        try:
+            if error:
+                raise ScannerError(error)
+            spool.seek(0)
+            data = squinnie.helper.readPickle(fileobj=spool)
+            config['data'] = squinnie.helper.toNativeStrings(data)
+            self._saveNode(config)
+        except Exception as e:
+            logging.error("Failed to scan {}: {}".format(node, e))
+            self._failNode(config)
+        finally:
+            if spool:
+                spool.close()
+
+        if spool and self.m_progress:
+            self.m_progress.finishNode(node, failed=config.get('failed', False))
 
 
 class LocalDumper(Dumper):
@@ -279,8 +822,28 @@ class LocalDumper(Dumper):
         # might be a future command line option to allow running as non-root. could be helpful for testing
         # print("You're scanning as non-root, only partial data will be collected")
         # print("Run as root to get a full result. This mode is not fully supported.")
-        node_data = self._subprocessCollect(use_sudo=not have_root_privs)
-        self.m_nodes[0]['data'] = node_data
+        config = self.m_nodes[0]
+        if self.m_progress:
+            self.m_progress.startNode(config['node'])
+        config['started'] = time.time()
+        if have_root_privs:
+            self._receiveForked(config, self.m_probe_options, timeout=self._getTimeout(config['node']))
+        else:
+            config['data'] = self._subprocessCollect(
+                use_sudo=True, timeout=self._getTimeout(config['node'])
+            )
+        config['finished'] = time.time()
+        self._saveNode(config)
+        if self.m_progress:
+            self.m_progress.finishNode(config['node'])
+
+    def estimate(self):
+        """See SshDumper.estimate()."""
+        node, _ = self._getLocalNode()[0]
+        have_root_privs = os.geteuid() == 0
+        return [(node, self._subprocessCollect(
+            use_sudo=not have_root_privs, options=self.getEstimateOptions()
+        ))]
 
     def _getLocalNode(self):
         """Returns a node list containing just the localhost for local
@@ -290,22 +853,155 @@ class LocalDumper(Dumper):
         node = socket.gethostname()
         return [(node, None)]
 
-    def _subprocessCollect(self, use_sudo=True):
+    def _receiveForked(self, config, options, timeout=None):
+        """Collects the node described by ``config`` via _forkCollect(),
+        saving each category as soon as it arrives."""
+        dio = DumpIO(config['node'], path=self.m_outdir)
+        dio.startPartialDump()
+        config['streamed'] = True
+        try:
+            self._forkCollect(dio, options=options, node=config['node'], timeout=timeout)
+        except Exception:
+            dio.abandonPartialDump()
+            raise
+        config['data'] = {}
+
+    def _forkCollect(self, dio, options=None, node=None, timeout=None):
+        """
+        Variant of _subprocessCollect() for when we're root already: the
+        probe runs in a forked child process, which passes each category
+        to us as a raw pickle over a pipe as soon as it's collected. This
+        saves starting another interpreter as well as compressing, writing
+        and reading back the whole dump.
+        :param DumpIO dio: receives the categories
+        """
+        import signal
+
+        if options is None:
+            options = self.m_probe_options
+        if node is None:
+            node = self.m_nodes[0]['node']
+
+        pickle = squinnie.helper.importPickle()
+        read_fd, write_fd = os.pipe()
+        child = os.fork()
+
+        if child == 0:
+            status = 1
+            try:
+                # the pipes of probes forked by other threads at the same
+                # time must not be kept open, or their readers wouldn't see
+                # the end of their data until we're done
+                self._closeInheritedFds(keep=write_fd)
+                self._runForkedProbe(os.fdopen(write_fd, 'wb'), options)
+                status = 0
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+
+        os.close(write_fd)
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            os.kill(child, signal.SIGTERM)
+
+        if timeout:
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+
+        try:
+            with os.fdopen(read_fd, 'rb') as pipe:
+                while True:
+                    try:
+                        frame = pickle.load(pipe)
+                    except EOFError:
+                        break
+
+                    if frame[0] == "progress":
+                        self.m_progress.update(node, frame[1])
+                    else:
+                        dio.saveCategory(frame[1], frame[2])
+        except:
+            # don't leave the child blocked on the pipe
+            os.kill(child, signal.SIGTERM)
+            raise
+        finally:
+            _, status = os.waitpid(child, 0)
+            if timeout:
+                timer.cancel()
+
+        if timed_out.is_set():
+            raise ScannerError("Timed out after {} seconds".format(int(timeout)))
+        elif status != 0:
+            raise ScannerError("The probe failed")
+
+    @staticmethod
+    def _closeInheritedFds(keep):
+        """Closes all file descriptors of the forked child process of
+        _forkCollect() except for the standard streams and ``keep``."""
+        try:
+            fds = [int(fd) for fd in os.listdir('/proc/self/fd')]
+        except EnvironmentError:
+            fds = range(3, os.sysconf('SC_OPEN_MAX'))
+
+        for fd in fds:
+            if fd <= 2 or fd == keep:
+                continue
+            try:
+                os.close(fd)
+            except OSError:
+                # e.g. the descriptor listdir() used
+                pass
+
+    @staticmethod
+    def _runForkedProbe(pipe, options):
+        """Runs the probe in the child process of _forkCollect()."""
+        # other threads of ours may have held the locks of the standard
+        # streams at the time of the fork
+        sys.stdout = os.fdopen(os.dup(1), 'w')
+        sys.stderr = os.fdopen(os.dup(2), 'w')
+
+        pickle = squinnie.helper.importPickle()
+
+        def send(frame):
+            pickle.dump(frame, pipe, pickle.HIGHEST_PROTOCOL)
+            pipe.flush()
+
+        options = dict(options)
+        if options.pop('progress', False):
+            options['progress'] = squinnie.probe.ProgressReporter(lambda info: send(("progress", info)))
+        scanner = squinnie.probe.Scanner(
+            sink=lambda category, data: send(("category", category, data)),
+            **options
+        )
+
+        for category, data in scanner.collect().items():
+            send(("category", category, data))
+        pipe.close()
+
+    def _subprocessCollect(self, use_sudo=True, options=None, node=None, timeout=None):
         """
         calls the standalone scanning script as subprocess
+        :param dict options: probe options to use instead of
+        self.m_probe_options
+        :param str node: the node to report progress for, the first node
+        in self.m_nodes by default
+        :param float timeout: terminate the probe after this many seconds,
+        if set
         :return: node-data from Pickle
         """
-        import subprocess
+        if options is None:
+            options = self.m_probe_options
+        if node is None:
+            node = self.m_nodes[0]['node']
 
-        # gzip has a bug in python2, it can't stream, because it tries
-        # to seek *sigh*
-        use_pipe = squinnie.helper.isPython3()
-
-        if not use_pipe:
-            import tempfile
-            tmpfile = tempfile.TemporaryFile(mode='wb+')
+        import subprocess
 
         prefix = ['sudo'] if use_sudo else []
+        probe_args = self._getProbeArgs(options)
 
         slave_proc = subprocess.Popen(
             prefix +
@@ -317,24 +1013,155 @@ class LocalDumper(Dumper):
                     os.path.dirname(__file__),
                     "probe.py"
                 )
-            ],
-            stdout=subprocess.PIPE if use_pipe else tmpfile,
+            ] + probe_args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if options.get('progress', False) else None,
             close_fds=True
         )
 
-        if use_pipe:
+        if slave_proc.stderr:
+            progress_thread = threading.Thread(
+                target=self._readProgress, args=(slave_proc.stderr, node)
+            )
+            progress_thread.start()
+
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            slave_proc.terminate()
+
+        if timeout:
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+
+        try:
+            # the dump is decompressed and unpickled while the probe is
+            # still writing it
             try:
                 node_data = squinnie.helper.readPickle(fileobj=slave_proc.stdout)
             finally:
+                # if we stopped reading early the probe fails instead of
+                # blocking on the pipe
+                slave_proc.stdout.close()
                 if slave_proc.wait() != 0:
                     raise Exception("Failed to run probe.py")
-        else:
-            try:
-                if slave_proc.wait() != 0:
-                    raise Exception("Failed to run probe.py")
-                tmpfile.seek(0)
-                node_data = squinnie.helper.readPickle(fileobj=tmpfile)
-            finally:
-                tmpfile.close()
+        except Exception:
+            if timed_out.is_set():
+                raise ScannerError("Timed out after {} seconds".format(int(timeout)))
+            raise
+        finally:
+            if timeout:
+                timer.cancel()
+            if slave_proc.stderr:
+                progress_thread.join()
 
         return node_data
+
+    def _readProgress(self, pipe, node):
+        """Passes the progress lines the probe writes to ``pipe`` on to the
+        progress display and everything else to our stderr."""
+        import json
+
+        prefix = squinnie.probe.PROGRESS_PREFIX
+
+        for line in iter(pipe.readline, b''):
+            if squinnie.helper.isPython3():
+                line = line.decode('utf8', 'replace')
+            if line.startswith(prefix):
+                self.m_progress.update(node, json.loads(line[len(prefix):]))
+            else:
+                sys.stderr.write(line)
+
+        pipe.close()
+
+
+class ImageDumper(LocalDumper):
+    """A specialized dumper that scans offline images, like mounted VM images
+    or unpacked container images, on the local host. Only the filesystem
+    and userdata categories are available for them. Multiple images are
+    scanned in parallel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ImageDumper, self).__init__(*args, **kwargs)
+        # node name -> image root directory
+        self.m_images = OrderedDict()
+
+    def setImages(self, paths):
+        """Sets the root directories of the images to scan. The dumps are
+        named after the base names of the directories."""
+        self.m_images = OrderedDict()
+
+        for path in paths:
+            path = os.path.abspath(path)
+            if not os.path.isdir(path):
+                raise ScannerError("{} is not a directory".format(path))
+            elif path in self.m_images.values():
+                continue
+
+            node = os.path.basename(path.rstrip(os.path.sep)) or "root"
+            if node in self.m_images:
+                # use the full path to disambiguate equally named images
+                node = path.strip(os.path.sep).replace(os.path.sep, "_")
+            self.m_images[node] = path
+
+    def collect(self, load_cached):
+        """See SshDumper.collect(), only this variant scans the configured
+        images.
+        """
+        if not self.m_outdir or not self.m_images:
+            raise ScannerError("Missing images and/or output directory")
+
+        self._setupDumpNodes([(node, None) for node in self.m_images])
+
+        if not self.m_use_cache:
+            self._discardCachedDumps()
+
+        pending = [config for config in self.m_nodes if not config['cached']]
+        if pending and os.geteuid() != 0:
+            self._authenticateSudo()
+        self._runParallel(pending, self._collectImage)
+
+        if load_cached:
+            self._loadCachedDumps()
+
+    def estimate(self):
+        """See SshDumper.estimate()."""
+        options = self.getEstimateOptions()
+        use_sudo = os.geteuid() != 0
+
+        return [
+            (node, self._subprocessCollect(
+                use_sudo=use_sudo, options=dict(options, root=path), node=node
+            ))
+            for node, path in self.m_images.items()
+        ]
+
+    def _authenticateSudo(self):
+        """Lets sudo ask for the password once, before the images are
+        scanned in parallel. The parallel sudo calls then use the cached
+        credentials, instead of all prompting on the terminal at the same
+        time."""
+        import subprocess
+
+        if subprocess.call(['sudo', '-v']) != 0:
+            raise ScannerError("Failed to gain root privileges via sudo")
+
+    def _collectImage(self, config):
+        node = config['node']
+        logging.info("Scanning image {} in {}".format(node, self.m_images[node]))
+
+        options = dict(self.m_probe_options, root=self.m_images[node])
+        if os.geteuid() == 0:
+            self._receiveForked(config, options, timeout=self._getTimeout(node))
+        else:
+            config['data'] = self._subprocessCollect(
+                use_sudo=True,
+                options=options,
+                node=node,
+                timeout=self._getTimeout(node)
+            )
+        config['finished'] = time.time()
+        # don't keep the dumps of all images in memory until save()
+        self._saveNode(config)
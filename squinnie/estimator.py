@@ -0,0 +1,246 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+from __future__ import print_function
+from __future__ import with_statement
+import logging
+import os
+
+# local modules
+import squinnie.helper
+from squinnie.dio import DumpIO
+from squinnie.daw.fs import FsDatabase
+
+# foreign modules
+try:
+    import terminaltables
+except ImportError as e:
+    squinnie.helper.missingModule(ex=e)
+
+
+class Estimator(object):
+    """Predicts the duration and dump size of full scans from the cheap
+    metrics returned by squinnie.probe.Scanner.estimate().
+
+    The prediction is a linear model per scan part. Its rates are
+    calibrated from the probe_stats of earlier dumps found in the dump
+    directory. The dumps of the same node are preferred, otherwise all
+    dumps are used. Built-in rates are used if no suitable dumps exist.
+    """
+
+    # scan part -> (metrics it scales with, default seconds per unit)
+    TIME_MODEL = {
+        "filesystem": (("inodes",), 0.00005),
+        "processes": (("pids", "fds"), 0.0004),
+        "networking": (("sockets",), 0.00001),
+    }
+
+    # dump part -> (metrics it scales with, default bytes per unit)
+    SIZE_MODEL = {
+        "filesystem": (("inodes",), 110.0),
+        "categories": (("pids", "fds", "sockets"), 180.0),
+    }
+
+    # seconds spent on the remaining, constant sized parts of a scan
+    DEFAULT_OVERHEAD = 2.0
+
+    def __init__(self, directory=None):
+        """
+        :param str directory: The dump directory to look for earlier dumps
+        for calibration, if any.
+        """
+        self.m_directory = directory
+        # node dump directory -> calibration sample
+        self.m_samples = {}
+
+    def loadCalibration(self):
+        """Collects the probe_stats and dump sizes of all earlier dumps in
+        the dump directory."""
+        self.m_samples = {}
+
+        if not self.m_directory or not os.path.isdir(self.m_directory):
+            return
+
+        for entry in os.listdir(self.m_directory):
+            sample = self._loadSample(os.path.join(self.m_directory, entry))
+            if sample:
+                self.m_samples[entry] = sample
+
+        logging.debug("Found {} dumps for calibrating estimates".format(len(self.m_samples)))
+
+    @staticmethod
+    def _loadSample(dump_dir):
+        """Returns a calibration sample for the node dump in ``dump_dir`` or
+        None if it lacks the necessary information."""
+        stats_file = os.path.join(dump_dir, "probe_stats" + DumpIO.FILE_EXTENSION)
+        if not os.path.isfile(stats_file):
+            return None
+
+        try:
+            stats = squinnie.helper.readPickle(stats_file)
+        except Exception as e:
+            logging.warning("Failed to read {}: {}".format(stats_file, e))
+            return None
+
+        if "counts" not in stats or "durations" not in stats:
+            # dump created by an older version
+            return None
+
+        sizes = {"filesystem": 0, "categories": 0}
+        for name in os.listdir(dump_dir):
+            path = os.path.join(dump_dir, name)
+            if name == FsDatabase.DB_NAME:
+                sizes["filesystem"] += os.path.getsize(path)
+            elif name.endswith(DumpIO.FILE_EXTENSION):
+                sizes["categories"] += os.path.getsize(path)
+
+        if stats.get("interesting_only"):
+            # not representative for full file system dumps
+            sizes["filesystem"] = None
+
+        return {
+            "counts": stats["counts"],
+            "durations": stats["durations"],
+            "duration": stats.get("duration", sum(stats["durations"].values())),
+            "sizes": sizes
+        }
+
+    def _getSamples(self, node):
+        """Returns the calibration samples to use for ``node``."""
+        own = self.m_samples.get(squinnie.helper.makeValidDirname(node))
+        return [own] if own else list(self.m_samples.values())
+
+    @staticmethod
+    def _getRate(samples, metrics, getter, default):
+        """Returns the average cost per unit of ``metrics`` over all
+        ``samples``, where ``getter`` returns a sample's costs."""
+        units = 0
+        costs = 0.0
+
+        for sample in samples:
+            sample_units = sum([sample["counts"].get(metric, 0) for metric in metrics])
+            cost = getter(sample)
+            if not sample_units or cost is None:
+                continue
+            units += sample_units
+            costs += cost
+
+        return costs / units if units else default
+
+    @staticmethod
+    def _getUnits(counts, metrics):
+        return sum([counts.get(metric, 0) for metric in metrics])
+
+    def predictDurations(self, node, counts):
+        """Returns a dictionary of scan part -> predicted seconds for the
+        given scan counts, see squinnie.probe.Scanner.getScanCounts()."""
+        samples = self._getSamples(node)
+        durations = {}
+
+        for part, (metrics, default) in self.TIME_MODEL.items():
+            rate = self._getRate(
+                samples, metrics,
+                lambda sample: sample["durations"].get(part), default
+            )
+            durations[part] = rate * self._getUnits(counts, metrics)
+
+        if samples:
+            durations["other"] = sum(
+                [sample["durations"].get("other", 0.0) for sample in samples]
+            ) / len(samples)
+        else:
+            durations["other"] = self.DEFAULT_OVERHEAD
+
+        return durations
+
+    def predict(self, node, estimate):
+        """Returns a dictionary with the predicted "duration" in seconds and
+        dump "size" in bytes of a full scan for the given probe estimate.
+        The "calibrated" key tells whether earlier dumps have been used.
+        """
+        samples = self._getSamples(node)
+        counts = estimate["counts"]
+
+        duration = sum(self.predictDurations(node, counts).values())
+
+        size = 0.0
+        for part, (metrics, default) in self.SIZE_MODEL.items():
+            rate = self._getRate(
+                samples, metrics,
+                lambda sample: sample["sizes"].get(part), default
+            )
+            size += rate * self._getUnits(counts, metrics)
+
+        return {
+            "duration": duration,
+            "size": int(size),
+            "calibrated": bool(samples)
+        }
+
+    def printEstimates(self, estimates):
+        """Prints the predictions for a list of (node, estimate) tuples as
+        returned by the dumpers' estimate() method."""
+        table = [[
+            "node", "inodes", "processes", "fds", "sockets",
+            "duration", "dump size", "calibrated"
+        ]]
+        total_duration = 0.0
+        total_size = 0
+
+        for node, estimate in estimates:
+            prediction = self.predict(node, estimate)
+            counts = estimate["counts"]
+            total_duration = max(total_duration, prediction["duration"])
+            total_size += prediction["size"]
+
+            table.append([
+                node,
+                str(counts["inodes"]), str(counts["pids"]),
+                str(counts["fds"]), str(counts["sockets"]),
+                squinnie.helper.changeTimeFormat(prediction["duration"]),
+                self.formatSize(prediction["size"]),
+                "yes" if prediction["calibrated"] else "no"
+            ])
+
+        table = terminaltables.AsciiTable(table)
+        table.outer_border = False
+        table.inner_column_border = False
+        for column in range(1, 7):
+            table.justify_columns[column] = 'right'
+
+        print(table.table)
+
+        if len(estimates) > 1:
+            print("\ntotal dump size: {}, duration of the longest scan: {}".format(
+                self.formatSize(total_size),
+                squinnie.helper.changeTimeFormat(total_duration)
+            ))
+
+    @staticmethod
+    def formatSize(size):
+        """Returns a human readable representation of ``size`` bytes."""
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024:
+                break
+            size /= 1024.0
+
+        return "{:.1f} {}".format(size, unit)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+from __future__ import with_statement
+import threading
+import logging
+
+# local modules
+import squinnie.helper
+from squinnie.errors import ScannerError
+
+# foreign modules
+try:
+    import execnet
+except ImportError as e:
+    squinnie.helper.missingModule(ex=e)
+
+# python interpreters to use on target nodes, in order of preference
+INTERPRETERS = ("python3", "python2")
+
+# seconds between ssh keep-alive messages on otherwise idle connections
+KEEPALIVE_INTERVAL = 30
+
+
+def getPythonSpec(interpreters=INTERPRETERS):
+    """Returns a value for the python= key of an execnet ssh gateway spec
+    that selects the first interpreter from ``interpreters`` available on
+    the target. The remote command is run by the remote shell, so the
+    selection costs no additional ssh round trip.
+    """
+    lookups = ["command -v {}".format(python) for python in interpreters]
+    # keep the traditional behaviour if none of them is found
+    lookups.append("echo python")
+    return "$({})".format(" || ".join(lookups))
+
+
+def getSshTarget(node):
+    """Returns the ssh destination for ``node``, logging in as root unless
+    a user is given."""
+    return "root@{}".format(node) if "@" not in node else node
+
+
+def getGatewaySpec(node, via=None, gw_id=None, interpreters=INTERPRETERS, keepalive=None):
+    """Returns a configuration string for execnet's makegateway() function
+    for reaching ``node``, optionally through the gateway ``via``. If
+    ``keepalive`` is set then ssh sends keep-alive messages in this interval
+    in seconds, so idle connections aren't dropped.
+    """
+    ssh = getSshTarget(node)
+    if keepalive:
+        # execnet passes the whitespace separated ssh value on to ssh
+        ssh = "-o ServerAliveInterval={} {}".format(keepalive, ssh)
+
+    data = {
+        "ssh": ssh,
+        "id": gw_id or node,
+        "python": getPythonSpec(interpreters)
+    }
+
+    if via:
+        data["via"] = via
+
+    parts = ["{}={}".format(key, value) for key, value in data.items()]
+
+    return "//".join(parts)
+
+
+def getInterpreter(gateway):
+    """Returns a tuple (executable, version_info) of the python interpreter
+    running on the other side of ``gateway``."""
+    info = gateway._rinfo()
+    return info.executable, tuple(info.version_info[:3])
+
+
+def makeGateway(group, node, via=None, gw_id=None, interpreters=INTERPRETERS, keepalive=None):
+    """Creates an execnet gateway to ``node`` in ``group``, using the most
+    preferred python interpreter available there.
+    """
+    spec = getGatewaySpec(node, via, gw_id, interpreters, keepalive)
+    return openGateway(group, spec, node)
+
+
+def openGateway(group, spec, node):
+    """Creates an execnet gateway to ``node`` in ``group`` from the given
+    execnet ``spec`` and adapts it to the python version running there."""
+    try:
+        gateway = group.makegateway(spec)
+    except execnet.HostNotFound as e:
+        raise ScannerError("Failed to connect to remote host: " + str(e))
+
+    executable, version = getInterpreter(gateway)
+    logging.debug("Using {} ({}) on {}".format(
+        executable, ".".join([str(part) for part in version]), node
+    ))
+
+    if version[0] >= 3 and squinnie.helper.isPython2():
+        # receive native str objects from python3 targets instead of unicode
+        gateway.reconfigure(py2str_as_py3str=True, py3str_as_py2str=True)
+
+    return gateway
+
+
+class GatewayPool(object):
+    """Keeps the execnet gateways of a run, keyed by node and the chain of
+    jump hosts used to reach it. All remote helpers share the pool, so the
+    ssh handshake and interpreter bootstrap happen only once per node.
+
+    The connections are kept alive by ssh keep-alive messages until
+    terminate() is called.
+    """
+
+    def __init__(self, interpreters=INTERPRETERS, keepalive=KEEPALIVE_INTERVAL):
+        self.m_group = execnet.Group()
+        self.m_interpreters = interpreters
+        self.m_keepalive = keepalive
+        # (jump hosts..., node) -> gateway
+        self.m_gateways = {}
+        # (jump hosts..., node) -> lock serializing the connection setup
+        self.m_locks = {}
+        self.m_lock = threading.Lock()
+
+    @staticmethod
+    def _getKey(node, via):
+        if not via:
+            via = ()
+        elif not isinstance(via, (list, tuple)):
+            via = (via,)
+        return tuple(via) + (node,)
+
+    def get(self, node, via=None):
+        """Returns a gateway to ``node``, connecting to it if necessary.
+
+        :param via: the jump host to reach ``node`` through or a list of
+        jump hosts, the first one reached directly.
+        """
+        key = self._getKey(node, via)
+
+        with self.m_lock:
+            if key in self.m_gateways:
+                return self.m_gateways[key]
+            lock = self.m_locks.setdefault(key, threading.Lock())
+
+        # different nodes are connected to in parallel
+        with lock:
+            with self.m_lock:
+                if key in self.m_gateways:
+                    return self.m_gateways[key]
+
+            via_gateway = self.get(key[-2], key[:-2]) if len(key) > 1 else None
+            gateway = self._connect(
+                node, via_gateway.id if via_gateway else None, "/".join(key)
+            )
+
+            with self.m_lock:
+                self.m_gateways[key] = gateway
+
+        return gateway
+
+    def _connect(self, node, via, gw_id):
+        """Creates the gateway with id ``gw_id`` to ``node``, reached via
+        the gateway with id ``via``, if set."""
+        return makeGateway(
+            self.m_group, node,
+            via=via,
+            gw_id=gw_id,
+            interpreters=self.m_interpreters,
+            keepalive=self.m_keepalive
+        )
+
+    def discard(self, node, via=None):
+        """Closes the gateway to ``node``, if any, e.g. to terminate a
+        remote process that hangs. Gateways reached through it are
+        discarded, too."""
+        key = self._getKey(node, via)
+
+        with self.m_lock:
+            # the gateways reached through others are closed first
+            keys = sorted(
+                [other for other in self.m_gateways if other[:len(key)] == key],
+                key=len, reverse=True
+            )
+            gateways = [self.m_gateways.pop(other) for other in keys]
+
+        for gateway in gateways:
+            try:
+                gateway.exit()
+            except Exception as e:
+                logging.debug("Failed to exit gateway {}: {}".format(gateway.id, e))
+
+    def terminate(self, timeout=10):
+        """Closes all gateways, killing the remote processes that don't
+        exit within ``timeout`` seconds."""
+        with self.m_lock:
+            self.m_gateways = {}
+            self.m_locks = {}
+
+        self.m_group.terminate(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.terminate()
@@ -25,6 +25,8 @@
 from __future__ import print_function
 import sys
 import re
+import os
+import errno
 import logging
 
 # a place for assorted code shared between functions
@@ -125,11 +127,9 @@ def readPickle(path=None, fileobj=None):
 
     :param str path: File system path from where to read the pickle from.
     :param file fileobj: A file like object that is already open where the
-    pickle data will be read from. Must be opened in 'rb' mode.
+    pickle data will be read from. Must be opened in 'rb' mode. It doesn't
+    need to support seeking, so this can also be a pipe.
     """
-    import gzip
-    pickle = importPickle()
-
     if path and fileobj:
         raise Exception("path and fileobj passed, don't know what to do")
     elif path:
@@ -139,12 +139,7 @@ def readPickle(path=None, fileobj=None):
         raise Exception("no file/path passed")
 
     try:
-        with gzip.GzipFile(fileobj=fileobj, mode='rb') as zifi:
-
-            import cStringIO
-            data = cStringIO.StringIO(zifi.read())
-
-            ret = pickle.load(data)
+        ret = unpickleStream(GzipStreamReader(fileobj).iterChunks())
     finally:
         if path:
             fileobj.close()
@@ -152,6 +147,141 @@ def readPickle(path=None, fileobj=None):
     return ret
 
 
+class GzipStreamReader(object):
+    """
+    Decompresses gzip data read from a file object that doesn't need to
+    support seeking, like a pipe. The gzip module of python2 always seeks.
+    """
+
+    # amount of compressed data to read at once
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, fileobj):
+        self.m_fileobj = fileobj
+
+    def iterChunks(self):
+        """Yields the decompressed data in chunks, as it is read."""
+        import zlib
+
+        # the offset makes zlib expect a gzip header and trailer
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        for data in iter(lambda: self.m_fileobj.read(self.CHUNK_SIZE), b''):
+            while data:
+                chunk = decompressor.decompress(data)
+                if chunk:
+                    yield chunk
+                data = decompressor.unused_data
+                if data:
+                    # the data continues with another gzip member
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        chunk = decompressor.flush()
+        if chunk:
+            yield chunk
+
+
+def unpickleStream(chunks):
+    """
+    Unpickles the data yielded by the iterable ``chunks`` while it is
+    still being produced. A thread writes the chunks into a pipe that the
+    unpickler reads from, which is a lot faster than calling back into
+    python for each read of the unpickler.
+    """
+    import threading
+    pickle = importPickle()
+
+    read_fd, write_fd = os.pipe()
+    # exceptions of the feeding thread
+    errors = []
+
+    def feed():
+        # the raw descriptor is written without a file object: the stdio
+        # locks of python2 file objects can deadlock against the unpickler
+        # blocking in fread() on the other end
+        try:
+            for chunk in chunks:
+                while chunk:
+                    chunk = chunk[os.write(write_fd, chunk):]
+        except EnvironmentError as e:
+            # EPIPE just means that the unpickler stopped reading
+            if e.errno != errno.EPIPE:
+                errors.append(e)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            os.close(write_fd)
+
+    thread = threading.Thread(target=feed)
+    thread.start()
+
+    try:
+        with os.fdopen(read_fd, 'rb') as pipe:
+            ret = pickle.load(pipe)
+    except Exception:
+        thread.join()
+        # a broken input is the more helpful explanation
+        if errors:
+            raise errors[0]
+        raise
+
+    thread.join()
+    if errors:
+        raise errors[0]
+
+    return ret
+
+
+def toNativeStrings(item):
+    """
+    Returns a copy of ``item`` with all unicode strings in it, also in
+    nested containers, converted to native strings.
+
+    This is only required on python2 for data pickled by python3, where
+    native strings are unicode.
+    """
+    if isPython3():
+        return item
+    elif isinstance(item, unicode):
+        return item.encode('utf8')
+    elif isinstance(item, dict):
+        return dict([(toNativeStrings(key), toNativeStrings(value)) for key, value in item.items()])
+    elif isinstance(item, (list, tuple, set)):
+        return type(item)([toNativeStrings(value) for value in item])
+
+    return item
+
+
+def getSupportedCodecs():
+    """Returns the names of the compression codecs supported for packed
+    probe data by this interpreter, see squinnie.probe.FrameSender."""
+    import importlib
+
+    ret = ["none"]
+    for codec in ("zlib", "bz2", "lzma"):
+        try:
+            importlib.import_module(codec)
+        except ImportError:
+            continue
+        ret.append(codec)
+
+    return ret
+
+
+def unpackData(chunks, codec):
+    """Returns the data sent as a list of packed ``chunks`` by
+    squinnie.probe.FrameSender, compressed with ``codec``."""
+    import importlib
+    import io
+    pickle = importPickle()
+
+    blob = b"".join(chunks)
+    if codec != "none":
+        blob = importlib.import_module(codec).decompress(blob)
+
+    return toNativeStrings(pickle.load(io.BytesIO(blob)))
+
+
 def executeMain(call):
     """Runs the given function call wrapped in try/except clauses that provide
     sensible error handling and output.
@@ -0,0 +1,151 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+from __future__ import with_statement
+import threading
+import logging
+import json
+import time
+import os
+
+
+class ScanHistory(object):
+    """Records the duration and dump size of the most recent scans of each
+    node in a manifest file in the dump directory.
+
+    The history is used for scheduling the nodes with the longest expected
+    scan first, so that the total scan time approaches the one of the
+    slowest node, and for deriving per node timeouts.
+    """
+
+    FILE_NAME = '.squinnie.history.json'
+
+    # number of scans remembered per node
+    MAX_ENTRIES = 5
+
+    # a scan times out after this factor of the longest recorded scan ...
+    TIMEOUT_FACTOR = 3.0
+    # ... but never in less seconds than this
+    MIN_TIMEOUT = 300.0
+
+    def __init__(self, directory):
+        """
+        :param str directory: The dump directory containing the manifest.
+        """
+        self.m_path = os.path.join(directory, self.FILE_NAME)
+        # node -> list of {"time", "duration", "size"} dictionaries, the
+        # most recent last
+        self.m_nodes = None
+        # scans of multiple nodes are recorded from parallel threads
+        self.m_lock = threading.Lock()
+
+    def _load(self):
+        if self.m_nodes is not None:
+            return
+
+        self.m_nodes = {}
+
+        if not os.path.isfile(self.m_path):
+            return
+
+        try:
+            with open(self.m_path, 'r') as f:
+                self.m_nodes = json.load(f)["nodes"]
+        except (EnvironmentError, ValueError, KeyError) as e:
+            logging.warning("Ignoring the broken scan history in {}: {}".format(self.m_path, e))
+
+    def _save(self):
+        # write a new file and rename it, so readers never see a partial
+        # manifest
+        tmp_path = self.m_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"nodes": self.m_nodes}, f, indent=1, sort_keys=True)
+        os.rename(tmp_path, self.m_path)
+
+    def getEntries(self, node):
+        """Returns the recorded scans of ``node``, the most recent last."""
+        with self.m_lock:
+            self._load()
+            return list(self.m_nodes.get(node, []))
+
+    def record(self, node, duration, size):
+        """Records a successful scan of ``node`` that took ``duration``
+        seconds and resulted in a dump of ``size`` bytes."""
+        with self.m_lock:
+            self._load()
+            entries = self.m_nodes.setdefault(node, [])
+            entries.append({
+                "time": int(time.time()),
+                "duration": round(duration, 1),
+                "size": size
+            })
+            del entries[:-self.MAX_ENTRIES]
+
+            try:
+                self._save()
+            except EnvironmentError as e:
+                logging.warning("Failed to save the scan history to {}: {}".format(self.m_path, e))
+
+    def getExpectedDuration(self, node):
+        """Returns the expected scan duration of ``node`` in seconds or None
+        if it has never been scanned."""
+        entries = self.getEntries(node)
+        if not entries:
+            return None
+
+        return sum([entry["duration"] for entry in entries]) / len(entries)
+
+    def getTimeout(self, node):
+        """Returns the number of seconds after which a scan of ``node``
+        should be aborted or None if it has never been scanned."""
+        entries = self.getEntries(node)
+        if not entries:
+            return None
+
+        longest = max([entry["duration"] for entry in entries])
+        return max(longest * self.TIMEOUT_FACTOR, self.MIN_TIMEOUT)
+
+    def sortLongestFirst(self, items, node_getter=lambda item: item):
+        """Returns the list of ``items`` sorted by the expected scan duration
+        of their node, the longest first. Nodes without history come first,
+        as their scan may well be the longest.
+
+        :param node_getter: returns the node name of an item.
+        """
+        def key(item):
+            duration = self.getExpectedDuration(node_getter(item))
+            return (duration is not None, -(duration or 0))
+
+        return sorted(items, key=key)
+
+    @staticmethod
+    def getDumpSize(dump_dir):
+        """Returns the total size of the files of the node dump in
+        ``dump_dir`` in bytes."""
+        size = 0
+
+        for name in os.listdir(dump_dir):
+            path = os.path.join(dump_dir, name)
+            if os.path.isfile(path):
+                size += os.path.getsize(path)
+
+        return size
@@ -46,8 +46,12 @@ import sys
 import pwd
 import grp
 import json
+import time
 import errno
+import stat
 import ctypes
+import hashlib
+import threading
 import subprocess
 
 
@@ -61,12 +65,594 @@ if isPython2():
         def __init__(self, *args, **kwargs):
             super(ChildProcessError, self).__init__(*args, **kwargs)
 
+    def openText(path):
+        return open(path, "r")
+
+    def encodePath(path):
+        return path
+
+    def walkTree(top, onerror):
+        """Wraps os.walk() to yield (path, dirs, files, dir_links, stats)
+        tuples like the scandir() based python3 implementation."""
+        for path, dirs, files in os.walk(top, topdown=True, onerror=onerror):
+            # walk will only list symlinks to directories in 'dirs'. Since it's
+            # configured to not follow symlinks they'd never appear anywhere
+            # else, so separate them
+            dir_links = [_dir for _dir in dirs if os.path.islink(os.path.join(path, _dir))]
+            if dir_links:
+                dirs[:] = [_dir for _dir in dirs if _dir not in dir_links]
+            yield path, dirs, files, dir_links, {}
+
+else:
+
+    def openText(path):
+        # /proc contents like command lines are arbitrary bytes
+        return open(path, "r", errors="surrogateescape")
+
+    encodePath = os.fsencode
+
+    def walkTree(top, onerror):
+        """Like os.walk(top, topdown=True) but yields (path, dirs, files,
+        dir_links, stats) tuples. Symlinks are detected from the directory
+        entry type and the lstat() results of files are returned in
+        ``stats``, which saves a couple of system calls per file system
+        object."""
+        pending = [top]
+
+        while pending:
+            path = pending.pop()
+            dirs, files, dir_links, stats = [], [], [], {}
+
+            try:
+                entries = list(os.scandir(path))
+            except OSError as e:
+                onerror(e)
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_symlink():
+                        # symlinks to directories are reported separately,
+                        # like os.walk() does with followlinks=False
+                        if entry.is_dir():
+                            dir_links.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    elif entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                        continue
+                    else:
+                        files.append(entry.name)
+                    stats[entry.name] = entry.stat(follow_symlinks=False)
+                except OSError:
+                    # getProperties() will report the error
+                    if entry.name not in files and entry.name not in dir_links:
+                        files.append(entry.name)
+
+            yield path, dirs, files, dir_links, stats
+
+            # dirs may have been altered by the caller, same as with os.walk()
+            pending.extend(os.path.join(path, _dir) for _dir in reversed(dirs))
+
+# prefix of progress lines written to stderr when running standalone
+PROGRESS_PREFIX = "squinnie-progress: "
+
+
+class ProgressReporter(object):
+    """Passes progress information of a scan to a ``send`` callable. To not
+    slow down the scan by lots of tiny messages the reports are sent at
+    most every ``interval`` seconds, except for the first report of each
+    phase.
+
+    The messages are dictionaries, either {"counts": counts} with the
+    result of Scanner.getScanCounts() at the start of a scan or {"phase":
+    name, "done": items, "total": items} during the scan.
+    """
+
+    def __init__(self, send, interval=1.0):
+        self.m_send = send
+        self.m_interval = interval
+        self.m_last = 0
+        self.m_phase = None
+        self.m_lock = threading.Lock()
+
+    def start(self, counts):
+        self.m_send({"counts": counts})
+
+    def report(self, phase, done, total, force=False):
+        now = time.time()
+
+        with self.m_lock:
+            if not force and phase == self.m_phase and now - self.m_last < self.m_interval:
+                return
+            self.m_last = now
+            self.m_phase = phase
+            self.m_send({"phase": phase, "done": done, "total": total})
+
+
+class TokenBucket(object):
+    """Limits the rate of sent data to ``rate`` bytes per second on average,
+    allowing bursts of up to ``burst`` bytes, one second worth of data by
+    default."""
+
+    def __init__(self, rate, burst=None):
+        self.m_rate = float(rate)
+        self.m_burst = burst if burst else self.m_rate
+        self.m_tokens = self.m_burst
+        self.m_last = time.time()
+        self.m_lock = threading.Lock()
+
+    def consume(self, amount):
+        """Blocks until ``amount`` bytes may be sent."""
+        with self.m_lock:
+            now = time.time()
+            self.m_tokens = min(self.m_burst, self.m_tokens + (now - self.m_last) * self.m_rate)
+            self.m_last = now
+            # going into debt lets later callers wait for us, too
+            self.m_tokens -= amount
+            wait = -self.m_tokens / self.m_rate if self.m_tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class FrameSender(object):
+    """Sends the frames of a scan over an execnet channel.
+
+    Without compression and bandwidth limit the category and result data
+    is passed to the channel as is, leaving the serialization to execnet.
+    Otherwise the data is pickled, compressed and sent as a sequence of
+    ("chunk", bytes) frames, terminated by a ("packed", kind, name, codec)
+    frame that stands for the frame (kind, name, data) or (kind, data) if
+    name is None.
+    """
+
+    # size of the chunks of packed data
+    CHUNK_SIZE = 64 * 1024
+
+    # codec name -> function returning a compressor object for a level
+    CODECS = {
+        "none": None,
+        "zlib": lambda level: __import__("zlib").compressobj(level),
+        "bz2": lambda level: __import__("bz2").BZ2Compressor(level),
+        "lzma": lambda level: __import__("lzma").LZMACompressor(preset=level)
+    }
+
+    # codec name -> level used if none is requested
+    DEFAULT_LEVELS = {
+        "none": None,
+        "zlib": 6,
+        "bz2": 9,
+        "lzma": 6
+    }
+
+    def __init__(self, channel, compression=None, bandwidth=None, pickle_protocol=2):
+        """
+        :param list compression: (codec, level) tuples in order of
+        preference, the first codec available here is used.
+        :param int bandwidth: the maximum bytes per second to send.
+        :param int pickle_protocol: the highest pickle protocol the
+        receiver supports.
+        """
+        self.m_channel = channel
+        self.m_bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.m_codec, self.m_level = self.selectCodec(compression) if compression else ("none", None)
+        self.m_packed = compression is not None or bandwidth is not None
+        self.m_pickle_protocol = pickle_protocol
+        self.m_lock = threading.Lock()
+
+    @classmethod
+    def selectCodec(cls, compression):
+        """Returns the first (codec, level) tuple from ``compression`` that
+        is supported by this interpreter."""
+        for codec, level in compression:
+            if codec not in cls.CODECS:
+                continue
+            if level is None:
+                level = cls.DEFAULT_LEVELS[codec]
+            try:
+                if cls.CODECS[codec]:
+                    cls.CODECS[codec](level)
+            except ImportError:
+                continue
+            return codec, level
+
+        return "none", None
+
+    def send(self, frame):
+        """Sends a small frame like a progress report."""
+        self.m_channel.send(frame)
+
+    def sendData(self, kind, name, data):
+        """Sends a frame carrying the result or a category ``data``."""
+        if not self.m_packed:
+            self.send((kind, data) if name is None else (kind, name, data))
+            return
+
+        if isPython2():
+            import cPickle as pickle
+        else:
+            import pickle
+
+        blob = pickle.dumps(data, protocol=self.m_pickle_protocol)
+        compressor = self.CODECS[self.m_codec](self.m_level) if self.m_codec != "none" else None
+
+        with self.m_lock:
+            for offset in range(0, len(blob), self.CHUNK_SIZE):
+                chunk = blob[offset:offset + self.CHUNK_SIZE]
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                self.sendChunk(chunk)
+            if compressor:
+                self.sendChunk(compressor.flush())
+
+            self.send(("packed", kind, name, self.m_codec))
+
+    def sendChunk(self, chunk):
+        if not chunk:
+            return
+        if self.m_bucket:
+            self.m_bucket.consume(len(chunk))
+        self.send(("chunk", chunk))
+
+
+class FsDatabaseBuilder(object):
+    """Builds the file system database of the scanning host (see
+    squinnie.daw.fs.FsDatabase) from the collected file system trees on the
+    scanned node itself. This spares the host the conversion of the trees
+    of each node. The schema needs to be kept in sync with FsDatabase.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE "inodes" (
+            "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "parent" INTEGER,
+            "uid" INTEGER,
+            "gid" INTEGER,
+            "caps" INTEGER,
+            "mode" INTEGER,
+            "type" TEXT,
+            "name" TEXT,
+            "path" TEXT,
+            "mntns" TEXT
+        )""",
+        """CREATE TABLE "links" (
+            "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "name" TEXT,
+            "target" TEXT,
+            "mntns" TEXT
+        )""",
+        """CREATE TABLE "omitted" (
+            "inode" INTEGER PRIMARY KEY,
+            "count" INTEGER
+        )"""
+    ]
+
+    # names and paths are passed as bytes on python3, as they may not be
+    # valid UTF-8. The casts store them as TEXT nevertheless.
+    INODE_SQL = "INSERT INTO inodes (parent, uid, gid, caps, mode, type, name, path, mntns) " \
+                "VALUES (?, ?, ?, ?, ?, ?, CAST(? AS TEXT), CAST(? AS TEXT), ?)"
+    LINK_SQL = "INSERT INTO links (name, target, mntns) VALUES (CAST(? AS TEXT), CAST(? AS TEXT), ?)"
+
+    # the database is built in a tmpfs, if available
+    TMP_DIRS = ["/dev/shm", "/run", None]
+
+    # size of the blocks the database file is compressed in
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self):
+        # raises ImportError if sqlite3 isn't installed on the node
+        import sqlite3
+        import tempfile
+
+        for tmp_dir in self.TMP_DIRS:
+            try:
+                fd, self.m_path = tempfile.mkstemp(prefix="squinnie", suffix=".db", dir=tmp_dir)
+            except EnvironmentError:
+                continue
+            os.close(fd)
+            break
+        else:
+            raise EnvironmentError("No temporary directory available for the file system database")
+
+        self.m_db = sqlite3.connect(self.m_path)
+        self.m_db.text_factory = str
+        for sql in self.SCHEMA:
+            self.m_db.execute(sql)
+
+    @staticmethod
+    def getTypeChar(mode):
+        """Returns the ls(1) type character for ``mode``, like
+        squinnie.file_mode.getTypeChar()."""
+        for check, char in (
+            (stat.S_ISDIR, "d"), (stat.S_ISREG, "-"), (stat.S_ISLNK, "l"), (stat.S_ISFIFO, "p"),
+            (stat.S_ISSOCK, "s"), (stat.S_ISCHR, "c"), (stat.S_ISBLK, "b")
+        ):
+            if check(mode):
+                return char
+
+        return "?"
+
+    def insertTree(self, tree, mntns=None):
+        """Inserts a file system tree as returned from
+        Scanner.walkFilesystem(). Trees of container roots are tagged with
+        their mount namespace ``mntns``."""
+        cursor = self.m_db.cursor()
+        # like FsDatabase, only the host's root refers to a parent
+        self.insertDirectory("/", "/", tree, 1 if mntns is None else None, cursor, mntns)
+
+    def insertDirectory(self, name, path, data, parent_id, cursor, mntns):
+        cursor.execute(self.INODE_SQL, self.getRow(data["properties"], name, path, parent_id, mntns))
+        dir_id = cursor.lastrowid
+        dir_path = os.path.join(path, name)
+
+        if data.get("omitted"):
+            cursor.execute("INSERT INTO omitted (inode, count) VALUES (?, ?)", (dir_id, data["omitted"]))
+
+        rows = []
+
+        for name, item in data["subitems"].items():
+            if item["properties"]["type"] == "d":
+                self.insertDirectory(name, dir_path, item, dir_id, cursor, mntns)
+                continue
+
+            rows.append(self.getRow(item["properties"], name, dir_path, dir_id, mntns))
+            if "target" in item:
+                cursor.execute(self.LINK_SQL, (
+                    encodePath(os.path.join(dir_path, name)), encodePath(item["target"]), mntns
+                ))
+
+        cursor.executemany(self.INODE_SQL, rows)
+
+    def getRow(self, props, name, path, parent_id, mntns):
+        mode = props["st_mode"]
+        return (parent_id, props["st_uid"], props["st_gid"], props["caps"], mode, self.getTypeChar(mode),
+                encodePath(name), encodePath(path), mntns)
+
+    def finish(self):
+        """Closes the database and returns its zlib compressed contents in
+        the "filesystem_db" category format. The database file is removed."""
+        import zlib
+
+        self.m_db.commit()
+        self.m_db.close()
+
+        compressor = zlib.compressobj(6)
+        parts = []
+
+        try:
+            with open(self.m_path, "rb") as db_file:
+                for block in iter(lambda: db_file.read(self.CHUNK_SIZE), b""):
+                    parts.append(compressor.compress(block))
+            parts.append(compressor.flush())
+        finally:
+            os.remove(self.m_path)
+
+        return {"codec": "zlib", "data": b"".join(parts)}
+
+
+class DeltaEncoder(object):
+    """Replaces the parts of the collected categories that are unchanged
+    since the previous scan of the node by markers, which saves their
+    transfer for routine rescans over slow links.
+
+    The host passes the fingerprints of its previous snapshot, as returned
+    from getFingerprints() by the previous scan. Each category is encoded
+    as a dictionary with a "delta" key:
+
+    - {"delta": "full", "data": data}: the category has changed.
+    - {"delta": "unchanged"}: the category is identical to the previous one.
+    - {"delta": "records", "changed": {key: record}, "unchanged": [key]}: for
+      the RECORD_CATEGORIES, only the changed records are included.
+    - {"delta": "tree", "tree": tree}: for the "filesystem" category, each
+      unchanged directory subtree is replaced by {"unchanged": True}.
+    - {"delta": "containers", "containers": {mntns: {"pid": pid, "tree":
+      tree}}}: the same for the trees in "container_filesystems".
+    """
+
+    # categories consisting of a dictionary of independent records, e.g.
+    # one for each PID
+    RECORD_CATEGORIES = ("proc_data",)
+
+    def __init__(self, fingerprints=None):
+        """
+        :param dict fingerprints: the fingerprints of the previous
+        snapshot or None if there is none.
+        """
+        self.m_old = fingerprints if fingerprints else {}
+        self.m_new = {"categories": {}, "records": {}, "trees": {}}
+
+    def getFingerprints(self):
+        """Returns the fingerprints of the categories encoded so far."""
+        return self.m_new
+
+    @staticmethod
+    def hashBytes(data):
+        if not isinstance(data, bytes):
+            data = data.encode("utf8", "backslashreplace")
+        return hashlib.sha1(data).hexdigest()[:16]
+
+    @classmethod
+    def fingerprint(cls, item):
+        """Returns a fingerprint of ``item`` that is independent of the
+        order of dictionaries and sets."""
+        digest = hashlib.sha1()
+        cls.feedDigest(digest, item)
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def feedDigest(cls, digest, item):
+        if isinstance(item, dict):
+            digest.update(b"{")
+            for key in sorted(item, key=repr):
+                cls.feedDigest(digest, key)
+                cls.feedDigest(digest, item[key])
+            digest.update(b"}")
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            digest.update(b"[")
+            values = item if isinstance(item, (list, tuple)) else sorted(item, key=repr)
+            for value in values:
+                cls.feedDigest(digest, value)
+            digest.update(b"]")
+        elif isinstance(item, bytes):
+            # the database file of the "filesystem_db" category can be large
+            digest.update(("b{}:".format(len(item))).encode("ascii"))
+            digest.update(item)
+        else:
+            text = repr(item)
+            if not isinstance(text, bytes):
+                text = text.encode("utf8", "backslashreplace")
+            digest.update(text + b",")
+
+    def hashTree(self, tree, path, hashes):
+        """Stores the fingerprint of each directory in the file system
+        ``tree`` (see Scanner.walkFilesystem()) found at relative ``path``
+        in ``hashes``. Returns the fingerprint of ``tree`` itself, which
+        covers everything below it."""
+        parts = [repr(sorted(tree["properties"].items())), repr(tree.get("omitted", 0))]
+
+        for name in sorted(tree["subitems"]):
+            item = tree["subitems"][name]
+            if "subitems" in item:
+                parts.append(repr(name) + self.hashTree(item, os.path.join(path, name), hashes))
+            else:
+                parts.append(repr((name, sorted(item["properties"].items()), item.get("target"))))
+
+        ret = self.hashBytes("\n".join(parts))
+        hashes[path] = ret
+        return ret
+
+    def pruneTree(self, tree, path, hashes, old):
+        """Returns a copy of ``tree`` with the unchanged subtrees replaced by
+        markers."""
+        if old.get(path) == hashes[path]:
+            return {"unchanged": True}
+
+        subitems = {}
+        for name, item in tree["subitems"].items():
+            if "subitems" in item:
+                item = self.pruneTree(item, os.path.join(path, name), hashes, old)
+            subitems[name] = item
+
+        return dict(tree, subitems=subitems)
+
+    def encodeTree(self, key, tree):
+        """Encodes a file system tree. ``key`` identifies the tree among the
+        trees of the node, the mount namespace for container roots."""
+        hashes = {}
+        self.hashTree(tree, "/", hashes)
+        self.m_new["trees"][key] = hashes
+        return self.pruneTree(tree, "/", hashes, self.m_old.get("trees", {}).get(key, {}))
+
+    def encode(self, category, data):
+        """Returns the delta encoding of the collected ``data`` of
+        ``category``."""
+        if category == "filesystem":
+            return {"delta": "tree", "tree": self.encodeTree("/", data)}
+        elif category == "container_filesystems":
+            return {"delta": "containers", "containers": dict([
+                (mntns, {"pid": info["pid"], "tree": self.encodeTree(mntns, info["tree"])})
+                for mntns, info in data.items()
+            ])}
+        elif category in self.RECORD_CATEGORIES:
+            old = self.m_old.get("records", {}).get(category, {})
+            hashes = dict([(key, self.fingerprint(record)) for key, record in data.items()])
+            self.m_new["records"][category] = hashes
+            return {
+                "delta": "records",
+                "changed": dict([(key, data[key]) for key in data if old.get(key) != hashes[key]]),
+                "unchanged": [key for key in data if old.get(key) == hashes[key]]
+            }
+
+        fingerprint = self.fingerprint(data)
+        self.m_new["categories"][category] = fingerprint
+        if self.m_old.get("categories", {}).get(category) == fingerprint:
+            return {"delta": "unchanged"}
+
+        return {"delta": "full", "data": data}
+
+
 class Scanner(object):
 
-    def __init__(self, collect_files = True):
+    # paths to exclude from file system collection, relative to the root of
+    # the walked file system
+    FS_EXCLUDE = ["/.snapshots", "/proc", "/mounts", "/suse"]
+
+    # maximum number of container root file systems walked in parallel
+    MAX_CONTAINER_WALKERS = 4
+
+    # process flag from /proc/<pid>/stat marking kernel threads, see
+    # include/linux/sched.h
+    PF_KTHREAD = 0x00200000
+
+    # the PID of kthreadd, the parent of all other kernel threads
+    KTHREADD_PID = 2
+
+    # controller settings that are recorded for each cgroup, if present
+    CGROUP_SETTINGS = [
+        # cgroup v2
+        "cgroup.type", "cpu.max", "cpu.weight", "io.max", "memory.max",
+        # cgroup v1
+        "cpu.shares", "cpuset.cpus", "devices.list", "memory.limit_in_bytes",
+        # both
+        "pids.max"
+    ]
+
+    def __init__(self, collect_files = True, collect_containers = False, progress = None, sink = None, root = None,
+            interesting_only = False, build_fs_db = False, delta = None, skip_categories = None, host_root = None):
+        """
+        :param ProgressReporter progress: receives progress information
+        during collect(), if set.
+        :param sink: a callable that receives (category, data) as soon as a
+        category has been collected, if set.
+        :param str root: if set then collect() scans the offline image
+        (e.g. a mounted VM image or an unpacked container image) found in
+        this directory instead of the running system.
+        :param bool interesting_only: if set then the file system walk only
+        records the file system objects that are interesting from a
+        security point of view, see isInteresting(). The others are only
+        counted per directory.
+        :param bool build_fs_db: if set then the file system trees are
+        converted into the host's file system database here and passed on
+        in the "filesystem_db" category, see FsDatabaseBuilder. If sqlite3
+        isn't available the trees are passed on as is.
+        :param dict delta: if set then the categories are passed on in the
+        delta encoding against this dictionary of fingerprints of the
+        previous snapshot, see DeltaEncoder. The fingerprints of this scan
+        are passed on in the "fingerprints" category as the last one.
+        :param list skip_categories: categories not to pass on, e.g. because
+        the host still has them from an interrupted scan. The file system
+        walks are skipped for them.
+        :param str host_root: if set then collect() scans the running
+        system whose root file system is found in this directory, with its
+        procfs and sysfs mounted below it. E.g. when running in a container
+        that has the host's root mounted at /host.
+        """
+        self.m_sink = sink
+        self.m_root = root
+        self.m_host_root = host_root if host_root else "/"
+        self.m_interesting_only = interesting_only
+        self.m_build_fs_db = build_fs_db
+        self.m_delta = DeltaEncoder(delta) if delta is not None else None
+        self.m_skip = set(skip_categories) if skip_categories else set()
+        # the FsDatabaseBuilder in use during collect(), if any
+        self.m_fs_db = None
+        # the userdata of the scanned system, set at the start of collect()
+        self.m_userdata = None
 
         self.m_collect_files = collect_files
+        self.m_collect_containers = collect_containers
+        self.m_progress = progress
+        # see getScanCounts(), determined at the start of collect()
+        self.m_scan_counts = {}
+        # number of file system objects walked so far, container file
+        # systems are walked by multiple threads
+        self.m_fs_done = 0
+        self.m_fs_done_lock = threading.Lock()
         self.m_protocols = {}
+        # (st_dev, st_ino) of all directories found during the host file
+        # system walk. Used to skip identical subtrees in container roots.
+        self.m_host_dir_ids = set()
 
         # for reading capabilities from the file system without relying on
         # existing external programs we need to directly hook into the libcap
@@ -76,13 +662,19 @@ class Scanner(object):
         self.m_our_pid = os.getpid()
         self.m_mqueue_fs = []  # list of mqueue mounts. This is required to determine mqueue file descriptors
 
-    @staticmethod
-    def getCmdline(pid, tid=None):
+    def getHostPath(self, path):
+        """Returns the path at which the absolute ``path`` of the scanned
+        running system is found, see the host_root parameter."""
+        if self.m_host_root == "/":
+            return path
+        return os.path.join(self.m_host_root, path.lstrip("/"))
+
+    def getCmdline(self, pid, tid=None):
         """Returns a tuple (cmdline, [parameters], full_cmdline) representing the command line belonging to the given
         process with PID pid. If tid is given, the command line of the thread with tid will be returned.
         """
-        path = "/proc/{pid}{task}/cmdline".format(pid=pid, task="/task/{id}".format(id=tid) if tid is not None else '')
-        with open(path, "r") as fi:
+        path = self.getHostPath("/proc/{pid}{task}/cmdline".format(pid=pid, task="/task/{id}".format(id=tid) if tid is not None else ''))
+        with openText(path) as fi:
             cmdline_str = fi.read().strip()
             cmdline_items = [str(item) for item in cmdline_str.split("\x00")]
             executable = cmdline_items[0]
@@ -93,8 +685,9 @@ class Scanner(object):
         """Returns a list of all process PIDs currently seen in /proc."""
         result = []
 
-        for entry in os.listdir("/proc"):
-            path = os.path.join("/proc", entry)
+        proc_dir = self.getHostPath("/proc")
+        for entry in os.listdir(proc_dir):
+            path = os.path.join(proc_dir, entry)
 
             if not entry.isdigit():
                 # not a PID dir
@@ -105,13 +698,19 @@ class Scanner(object):
             pid = int(entry)
             result.append(pid)
 
-        return result
+        # in ascending order like the kernel lists them, so that init is
+        # the first member of each of its namespaces
+        return sorted(result)
 
     def collectUserGroupMappings(self):
         """Collects dictionaries in uid_map and gid_map
         containing the name->id mappings of users and groups found in the
         system.
         """
+        if self.m_root:
+            return self.readUserGroupFiles(self.m_root)
+        elif self.m_host_root != "/":
+            return self.readUserGroupFiles(self.m_host_root)
 
         uid_map = {}
 
@@ -124,12 +723,37 @@ class Scanner(object):
 
         return {'uids': uid_map, 'gids': gid_map}
 
+    @staticmethod
+    def readUserGroupFiles(root):
+        """Like collectUserGroupMappings() but reads the mappings from the
+        etc/passwd and etc/group files below ``root``."""
+        ret = {}
+
+        for key, name in (('uids', 'passwd'), ('gids', 'group')):
+            ret[key] = {}
+            path = os.path.join(root, "etc", name)
+            try:
+                with open(path, "r") as f:
+                    for line in f:
+                        parts = line.strip().split(':')
+                        if len(parts) < 3 or parts[0].startswith('#'):
+                            continue
+                        try:
+                            ret[key][int(parts[2])] = parts[0]
+                        except ValueError:
+                            # e.g. NIS compat entries like '+::::::'
+                            continue
+            except EnvironmentError as e:
+                print("Failed to read {}: {}".format(path, e), file=sys.stderr)
+
+        return ret
+
     def collectProtocolInfo(self, protocol):
         """Collects protocol state information for ``protocol`` in
         self.m_protocols[``protocol``].
         """
         # /proc/net contains different network protocol status information
-        with open("/proc/net/{prot}".format(prot = protocol), "r") as f:
+        with open(self.getHostPath("/proc/net/{prot}".format(prot = protocol)), "r") as f:
             table = [line.strip() for line in f.readlines()]
         # discard the column header
         table.pop(0)
@@ -168,8 +792,8 @@ class Scanner(object):
         :return dict: ID-inside-ns  ID-outside-ns  length, for uid & gid
         """
         res = {'uid': [], 'gid': []}
-        path = {'uid': "/proc/{}/uid_map".format(str(pid)),
-                'gid': "/proc/{}/gid_map".format(str(pid)) }
+        path = {'uid': self.getHostPath("/proc/{}/uid_map".format(str(pid))),
+                'gid': self.getHostPath("/proc/{}/gid_map".format(str(pid))) }
         for kind, path in path.items():
             try:
                 with open(path, "r") as fi:
@@ -210,7 +834,7 @@ class Scanner(object):
         for nstype in types:
             # get the file descriptor
             filedescs.append([
-                    open("/proc/{}/ns/{}".format(pid, nstype)), 0
+                    open(self.getHostPath("/proc/{}/ns/{}".format(pid, nstype))), 0
             ])
         # create subprocess bevore altering with namespaces to avoid
         # unexpected behavior on parent
@@ -286,7 +910,9 @@ class Scanner(object):
                          ('domain', ctypes.c_char * 65) ]
         uts_data = uts_struct()
         libc.uname(ctypes.byref(uts_data))
-        return(uts_data.nodename, uts_data.domain)
+        if isPython2():
+            return(uts_data.nodename, uts_data.domain)
+        return(uts_data.nodename.decode(), uts_data.domain.decode())
 
 
     def checkSubProcessInNs(self, result, pid, ns_type):
@@ -384,11 +1010,17 @@ class Scanner(object):
                         val = res_val
                 value[1].update(val)
             elif ns_type == 'pid':
-                if pid in mnt_pids:
+                pid_map = self.getPidNsMapping(info['pids'])
+                if pid_map is not None:
+                    # the processes have already been collected from the
+                    # host view, only record which host pids they have
+                    value = [fd, {'pid_map': pid_map}]
+                elif pid in mnt_pids:
                     # currently lacking the abillity to scan pid trees
                     # if the process directory is not mounted to /proc.
                     val = None
                 else:
+                    # fallback for kernels without NSpid in status:
                     # since we are expecting the correct /proc filesystem
                     # to be mounted at the correct location inside the
                     # mnt-namespace, only joining the mnt-namespace suffices
@@ -396,11 +1028,12 @@ class Scanner(object):
                             pid, self.collectProcessInfo,
                             ['mnt']
                     )
-                value = [fd, {'pids_info': self.checkSubProcessInNs(
-                        val, pid, 'pid'
-                        )
-                    }
-                ]
+                if pid_map is None:
+                    value = [fd, {'pids_info': self.checkSubProcessInNs(
+                            val, pid, 'pid'
+                            )
+                        }
+                    ]
             else:
                 continue
             val_dict = res.setdefault(ns_type, {})
@@ -409,6 +1042,60 @@ class Scanner(object):
                 res[ns_type] = val_dict
         return res
 
+    def getPidNsMapping(self, pids):
+        """
+        Returns a dictionary mapping the pids of processes inside a pid
+        namespace to their pids in the host view. Like in the namespace's
+        own /proc this includes the processes of the pid namespaces nested
+        in it. The information is taken from the NSpid field of
+        /proc/<pid>/status collected during collectProcessInfo().
+        :list pids: the host pids of the processes whose innermost pid
+        namespace is this one
+        :return dict: ns pid -> host pid or None if NSpid is not available
+        (kernels < 4.1)
+        """
+        status = self.m_proc_info["status"]
+        # processes might have vanished during the scan
+        members = set([pid for pid in pids if pid in status])
+        if not members:
+            return {}
+        elif not all([status[pid].get("NSpid", None) for pid in members]):
+            return None
+
+        # the nesting level of the namespace, the host's is 0
+        level = len(status[next(iter(members))]["NSpid"]) - 1
+        result = {}
+
+        for pid, info in status.items():
+            nspids = info.get("NSpid", None)
+            if not nspids or len(nspids) <= level:
+                continue
+            elif pid in members or self.isInPidNs(pid, level, members):
+                result[nspids[level]] = pid
+
+        return result
+
+    def isInPidNs(self, pid, level, members):
+        """
+        Returns whether the pid namespace at the nesting ``level`` of the
+        process ``pid`` is the one of the processes ``members``. The pid
+        namespace of a process is always the same as or nested in the one
+        of its parent, so it is the one of the closest ancestor at that
+        level.
+        """
+        status = self.m_proc_info["status"]
+        parents = self.m_proc_info["parents"]
+        seen = set()
+
+        while pid in status and pid not in seen:
+            seen.add(pid)
+            depth = len(status[pid].get("NSpid", None) or [None]) - 1
+            if depth <= level:
+                return depth == level and pid in members
+            pid = parents.get(pid, None)
+
+        return False
+
     def getNamespaces(self, pid):
         """
         Goes through all referenced namespaces and returns their inode
@@ -419,7 +1106,7 @@ class Scanner(object):
         # process was spawned is not yet covered.
         ignore_list = ['pid_for_children']
         result = {}
-        pid_ns_dir = "/proc/{}/ns".format(pid)
+        pid_ns_dir = self.getHostPath("/proc/{}/ns".format(pid))
         for symlink in os.listdir(pid_ns_dir):
             if symlink in ignore_list:
                 continue
@@ -449,6 +1136,9 @@ class Scanner(object):
             "CapAmb": cap_lambda,
             "Gid": gid_uid_lambda,
             "Groups": groups_lambda,
+            # the pid in each nested pid namespace, the last one is the pid
+            # inside the innermost namespace the process belongs to
+            "NSpid": groups_lambda,
             "Seccomp": seccomp_lambda,
             "Uid": gid_uid_lambda,
         }
@@ -457,12 +1147,19 @@ class Scanner(object):
         status = {}
         # PID -> parent mapping which defines the process hierarchy
         parents = {}
+        # raw maps content -> (template id, parsed maps). Pre-forked servers
+        # have lots of processes with identical mappings, each distinct
+        # list of mappings is only stored once.
+        maps_templates = {}
 
         pids_to_remove = set()
         # expected format: $inode: {$informations}, like
         # '4026531961': {'nbr': 1, 'pids': [1], 'type': 'net', 'uid': 0}
         namespaces = {}
-        for p in self.getAllPids():
+        all_pids = self.getAllPids()
+        for nr, p in enumerate(all_pids):
+            self.reportProgress("processes", nr, len(all_pids))
+
             if p == self.m_our_pid:
                 # exclude ourselves, we're not so interesting ;)
                 continue
@@ -470,19 +1167,34 @@ class Scanner(object):
             try:
                 fields, status_pid = self.getProcessedProcessInfo(field_transforms, p)
 
-                exe, pars, cmdline = self.getCmdline(p)
-                status_pid["executable"] = exe if exe else '[{n}]'.format(n=fields['Name'])
-                status_pid["parameters"] = pars
-                status_pid["cmdline"] = cmdline  # this value is needed to compare it with the threads
-                status_pid["root"] = os.path.realpath("/proc/{pid}/root".format(pid = p))
-                status_pid["open_files"] = self.getFdData(p)
-                status_pid["maps"] = self.getMapsForProcess(p)
-
-                status_pid['threads'] = self.getProcessedThreadInfosForProcess(p, field_transforms)
-
                 stat_data = self.getStatData(p)
+                flags = int(stat_data.pop("flags"))
                 status_pid.update(stat_data)  # merge all data we need from stat to status_pid
 
+                status_pid["kthread"] = self.isKernelThread(p, flags, int(fields["PPid"]))
+
+                if status_pid["kthread"]:
+                    # kernel threads have no command line, root, file
+                    # descriptors, mappings or additional threads, so
+                    # don't waste time on looking at them
+                    status_pid["executable"] = '[{n}]'.format(n=fields['Name'])
+                    status_pid["parameters"] = ""
+                    status_pid["cmdline"] = ""
+                    status_pid["root"] = "/"
+                    status_pid["open_files"] = {}
+                    status_pid["maps_template"] = None
+                    status_pid['threads'] = {}
+                else:
+                    exe, pars, cmdline = self.getCmdline(p)
+                    status_pid["executable"] = exe if exe else '[{n}]'.format(n=fields['Name'])
+                    status_pid["parameters"] = pars
+                    status_pid["cmdline"] = cmdline  # this value is needed to compare it with the threads
+                    status_pid["root"] = os.path.realpath(self.getHostPath("/proc/{pid}/root".format(pid = p)))
+                    status_pid["open_files"] = self.getFdData(p)
+                    status_pid["maps_template"] = self.getMapsTemplate(p, maps_templates)
+
+                    status_pid['threads'] = self.getProcessedThreadInfosForProcess(p, field_transforms)
+
                 status_pid["parent"] = int(fields["PPid"])
                 if 'Umask' in fields:
                     status_pid['Umask'] = int(fields['Umask'], 8)
@@ -529,11 +1241,17 @@ class Scanner(object):
         self.m_proc_info["status"] = status
         self.m_proc_info["parents"] = parents
         self.m_proc_info["namespaces"] = namespaces
+        self.m_proc_info["maps_templates"] = dict(maps_templates.values())
 
         return self.m_proc_info
 
-    @staticmethod
-    def getProcessInfo(pid, tid=None):
+    @classmethod
+    def isKernelThread(cls, pid, flags, ppid):
+        """Returns whether the process is a kernel thread, judged by its
+        stat flags and its parent."""
+        return bool(flags & cls.PF_KTHREAD) or pid == cls.KTHREADD_PID or ppid == cls.KTHREADD_PID
+
+    def getProcessInfo(self, pid, tid=None):
         """
         Reads the process/thread info from proc. It uses /proc/pid/status for processes and /proc/pid/task/kid for
         threads.
@@ -542,7 +1260,7 @@ class Scanner(object):
         :return: The list of fields in stat
         """
         is_thread = tid is not None
-        path = "/proc/{pid}".format(pid=pid)
+        path = self.getHostPath("/proc/{pid}".format(pid=pid))
         if is_thread:
             path = "{path}/task/{tid}".format(path=path, tid=tid)
         path += "/status"
@@ -555,8 +1273,7 @@ class Scanner(object):
 
         return fields
 
-    @staticmethod
-    def getProcessedProcessInfo(transforms, pid, tid=None):
+    def getProcessedProcessInfo(self, transforms, pid, tid=None):
         """
         Reads the process/thread info from proc. It uses /proc/pid/status for processes and /proc/pid/task/kid for
         threads. After retrieving the data, it will be processed with the functions given in the transform parameter.
@@ -565,7 +1282,7 @@ class Scanner(object):
         :param tid: The thread id if thread data should be read.
         :return: A tuple of (data, processed_data)
         """
-        fields = Scanner.getProcessInfo(pid, tid)
+        fields = self.getProcessInfo(pid, tid)
         processed_data = {}
 
         for key in transforms.keys():
@@ -578,37 +1295,35 @@ class Scanner(object):
 
         return fields, processed_data
 
-    @staticmethod
-    def getProcessedThreadInfosForProcess(pid, transforms):
+    def getProcessedThreadInfosForProcess(self, pid, transforms):
         """
         Collects thread information of a process.
         :param transforms: The transform functions to refine the data for each thread.
         :param pid: The pid of the target.
         :return: A dict of tid -> processed_data
         """
-        threadlist = os.listdir("/proc/{pid}/task".format(pid=pid))
+        threadlist = os.listdir(self.getHostPath("/proc/{pid}/task".format(pid=pid)))
 
         data = {}
         for tid in threadlist:
-            fields, threadinfo = Scanner.getProcessedProcessInfo(transforms, pid, tid)
+            fields, threadinfo = self.getProcessedProcessInfo(transforms, pid, tid)
 
-            exe, pars, cmdline = Scanner.getCmdline(pid, tid)
+            exe, pars, cmdline = self.getCmdline(pid, tid)
             threadinfo["executable"] = exe if exe else '[{n}]'.format(n=fields['Name'])
             threadinfo["parameters"] = pars
             threadinfo["cmdline"] = cmdline  # this value is needed to compare it with the threads
             data[tid] = threadinfo
         return data
 
-    @staticmethod
-    def getCmdlineForThread(pid, tid):
+    def getCmdlineForThread(self, pid, tid):
         """
         Returns the cmdline for a thread.
         :param pid: The pid of the parent process.
         :param tid: The tid of the thread.
         :return:
         """
-        path = "/proc/{pid}/task/{tid}/cmdline".format(pid=pid, tid=tid)
-        with open(path, "r") as fi:
+        path = self.getHostPath("/proc/{pid}/task/{tid}/cmdline".format(pid=pid, tid=tid))
+        with openText(path) as fi:
             return fi.readline()
 
     def getFdData(self, pid):
@@ -619,8 +1334,8 @@ class Scanner(object):
         value contains the details of the file descriptor.
         """
         result = {}
-        fd_dir = "/proc/{pid}/fd/".format(pid = pid)
-        fdinfo_dir = "/proc/{pid}/fdinfo".format(pid = pid)
+        fd_dir = self.getHostPath("/proc/{pid}/fd/".format(pid = pid))
+        fdinfo_dir = self.getHostPath("/proc/{pid}/fdinfo".format(pid = pid))
 
         for fd_str in os.listdir(fd_dir):
             file_path_name = os.path.join(fd_dir, fd_str)
@@ -692,7 +1407,7 @@ class Scanner(object):
 
         try:
             # returns an integer, like 36683988, which should be parsed as a binary bitmask
-            properties["caps"] = self.m_libcap.cap_get_file(filename)
+            properties["caps"] = self.m_libcap.cap_get_file(encodePath(filename))
 
             if not os_stat:
                 os_stat = os.lstat(filename)
@@ -730,7 +1445,7 @@ class Scanner(object):
         ]
         ret = []
 
-        with open("/proc/self/mountinfo", "r") as f:
+        with open(self.getHostPath("/proc/self/mountinfo"), "r") as f:
             for line in f.readlines():
                 data = line.strip().split()
 
@@ -754,14 +1469,30 @@ class Scanner(object):
         """Collects information about all file system objects and stores them
         in the self.m_filesystem dictionary.
         """
-        # paths to exclude from the collection
-        exclude = ["/.snapshots", "/proc", "/mounts", "/suse"]
-
-        self.m_filesystem = {
+        self.m_filesystem = self.walkFilesystem(self.m_host_root, seen_ids=self.m_host_dir_ids)
+
+    def walkFilesystem(self, root, skip_ids=None, seen_ids=None):
+        """Walks the file system tree found at ``root`` and returns a nested
+        dictionary describing all file system objects below it. Paths in the
+        returned structure are relative to ``root``.
+
+        :param str root: the directory to start walking from.
+        :param set skip_ids: (st_dev, st_ino) tuples of directories that
+        should not be descended into, because they have already been
+        collected.
+        :param set seen_ids: if given then the (st_dev, st_ino) tuples of all
+        walked directories are added to it.
+        """
+        # use stat() here to resolve magic /proc/<pid>/root links
+        root_stat = os.stat(root)
+        tree = {
             "subitems": {},
-            "properties": self.getProperties("/", type='d')
+            "properties": self.getProperties(root, type='d', os_stat=root_stat)
         }
 
+        if seen_ids is not None:
+            seen_ids.add((root_stat.st_dev, root_stat.st_ino))
+
         def walkErr(ex):
             """Is called from os.walk() when errors occur."""
             if not self.m_have_root_priv and ex.errno == errno.EACCES:
@@ -770,11 +1501,17 @@ class Scanner(object):
                 return
             print(ex.filename, ": ", ex, sep = '', file = sys.stderr)
 
+        def getRelPath(path):
+            """Returns ``path`` as an absolute path relative to ``root``."""
+            if root == "/":
+                return path
+            return "/" + os.path.relpath(path, root)
+
         def getParentDict(path):
-            """Find the correct dictionary in self.m_filesystem for inserting
-            the directory info for ``path``.
+            """Find the correct dictionary in ``tree`` for inserting
+            the directory info for relative ``path``.
             """
-            ret = self.m_filesystem
+            ret = tree
 
             for node in os.path.dirname(path[1:]).split(os.path.sep):
 
@@ -785,13 +1522,15 @@ class Scanner(object):
 
             return ret
 
-        for path, dirs, files in os.walk("/", topdown=True, onerror=walkErr):
-            if path == '/':
+        for path, dirs, files, dir_links, stats in walkTree(root, walkErr):
+            if path == root:
                 continue
 
+            rel_path = getRelPath(path)
+
             cont = True
-            for excluded in exclude:
-                if path.startswith(excluded):
+            for excluded in self.FS_EXCLUDE:
+                if rel_path.startswith(excluded):
                     # don't descend further into excluded directories
                     dirs[:] = []
                     cont = False
@@ -799,33 +1538,273 @@ class Scanner(object):
             if not cont:
                 continue
 
+            try:
+                dir_stat = os.lstat(path)
+            except EnvironmentError as e:
+                walkErr(e)
+                dirs[:] = []
+                continue
+
+            dir_id = (dir_stat.st_dev, dir_stat.st_ino)
+            if skip_ids and dir_id in skip_ids:
+                # this subtree has already been collected elsewhere
+                dirs[:] = []
+                continue
+            if seen_ids is not None:
+                seen_ids.add(dir_id)
+
             this_dir = os.path.basename(path)
-            parent = getParentDict(path)
+            parent = getParentDict(rel_path)
+
+            with self.m_fs_done_lock:
+                self.m_fs_done += 1 + len(files) + len(dir_links)
+                self.reportProgress("filesystem", self.m_fs_done, self.m_scan_counts.get("inodes", 0))
 
             path_dict = {
-                "subitems": dict.fromkeys(files),
-                "properties": self.getProperties(path, type='d')
+                "subitems": {} if self.m_interesting_only else dict.fromkeys(files),
+                "properties": self.getProperties(path, type='d', os_stat=dir_stat)
             }
+            if self.m_interesting_only:
+                path_dict["omitted"] = 0
             parent["subitems"][this_dir] = path_dict
 
             for name in files:
                 file_path = os.path.join(path, name)
+                properties = self.getProperties(
+                    file_path, type='f', os_stat=stats.get(name)
+                )
+
+                if self.m_interesting_only and not self.isInteresting(properties):
+                    path_dict["omitted"] += 1
+                    continue
 
                 path_dict["subitems"][name] = {
-                    "properties": self.getProperties(file_path, type='f')
+                    "properties": properties
                 }
 
-            for link in [link for link in
-                         [os.path.join(os.path.realpath(path), _dir) for _dir in dirs]
-                         if os.path.islink(link)]:
-                # walk will only list symlinks to directorys in the 'dirs' variable. Since it's configured to not follow
-                # symlinks it will never appear anywhere else and therefore be ignored. So it get's some special
-                # treatment here ;)
-                path_dict["subitems"][link] = {
+            # for the host we can resolve symlinks directly, within container
+            # roots realpath() would escape into the host's view of things
+            base = os.path.realpath(path) if root == "/" else path
+            for link in [os.path.join(base, _dir) for _dir in dir_links]:
+                # symlinks to directories are never descended into and
+                # therefore get some special treatment here ;)
+                if root == "/":
+                    key, target = link, os.path.realpath(link)
+                else:
+                    key = getRelPath(link)
+                    target = os.path.normpath(os.path.join(
+                        os.path.dirname(key), os.readlink(link)
+                    ))
+                path_dict["subitems"][key] = {
                     "properties": self.getProperties(link, type='l'),
-                    "target": os.path.realpath(link)
+                    "target": target
+                }
+
+        if self.m_interesting_only:
+            self.pruneTree(tree)
+
+        return tree
+
+    def isInteresting(self, properties):
+        """Returns whether the file system object described by
+        ``properties`` (see getProperties()) is interesting from a security
+        point of view:
+
+        - setuid, setgid or sticky bits are set.
+        - it has file capabilities.
+        - it is world-writable (except for symlinks).
+        - it is owned by a uid or gid unknown to the system, or it could
+          not be stat'ed at all.
+        - it is a device, a socket or of an unknown type.
+
+        Sockets are always recorded, as the viewer looks up the permissions
+        of the sockets used by processes.
+        """
+        mode = properties["st_mode"]
+
+        if mode & (stat.S_ISUID | stat.S_ISGID | stat.S_ISVTX):
+            return True
+        elif properties["caps"]:
+            return True
+        elif not (stat.S_ISDIR(mode) or stat.S_ISREG(mode) or stat.S_ISLNK(mode) or stat.S_ISFIFO(mode)):
+            return True
+        elif mode & stat.S_IWOTH and not stat.S_ISLNK(mode):
+            return True
+
+        userdata = self.m_userdata
+        if userdata is None:
+            # nothing to compare against, only failed lstat()s are unknown
+            return properties["st_uid"] == -1 or properties["st_gid"] == -1
+
+        return properties["st_uid"] not in userdata["uids"] or properties["st_gid"] not in userdata["gids"]
+
+    def pruneTree(self, tree):
+        """Removes the directories below ``tree`` that are not interesting
+        and contain nothing interesting, see isInteresting(). The entries
+        removed are added to the "omitted" count of the remaining parent
+        directory. Files have already been filtered during the walk.
+
+        :return bool: whether ``tree`` still contains any entries.
+        """
+        for name, item in list(tree["subitems"].items()):
+            if "subitems" not in item:
+                continue
+            elif self.pruneTree(item) or self.isInteresting(item["properties"]):
+                continue
+
+            tree["omitted"] = tree.get("omitted", 0) + 1 + item["omitted"]
+            del tree["subitems"][name]
+
+        return len(tree["subitems"]) != 0
+
+    def collectContainerFilesystems(self, namespaces):
+        """Walks the root file system of each distinct mount namespace found
+        in ``namespaces`` via /proc/<pid>/root. Directories that are
+        identical to already collected host directories are skipped. The
+        walks of independent namespaces are performed in parallel.
+
+        :dict namespaces: the namespace data as returned from
+        collectProcessInfo()
+        :return dict: mount namespace inode -> {"pid": pid, "tree": tree}
+        """
+        roots = {}
+
+        for inode, info in namespaces.items():
+            if info['type'] != 'mnt' or 1 in info['pids']:
+                # the host mount namespace has already been collected
+                continue
+
+            for pid in info['pids']:
+                root = self.getHostPath("/proc/{}/root".format(pid))
+                try:
+                    root_stat = os.stat(root)
+                except EnvironmentError:
+                    # process vanished, try the next one
+                    continue
+
+                root_id = (root_stat.st_dev, root_stat.st_ino)
+                if root_id in self.m_host_dir_ids or root_id in roots:
+                    # shares its root with the host or another namespace
+                    # (common for systemd services with private mounts)
+                    break
+
+                roots[root_id] = (inode, pid, root)
+                break
+
+        result = {}
+        lock = threading.Lock()
+        pending = list(roots.values())
+
+        def walker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    inode, pid, root = pending.pop()
+
+                try:
+                    tree = self.walkFilesystem(root, skip_ids=self.m_host_dir_ids)
+                except EnvironmentError as e:
+                    print("Failed to walk {}: {}".format(root, e), file=sys.stderr)
+                    continue
+
+                with lock:
+                    result[inode] = {"pid": pid, "tree": tree}
+
+        threads = [
+            threading.Thread(target=walker)
+            for _ in range(min(self.MAX_CONTAINER_WALKERS, len(pending)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return result
+
+    def collectCgroups(self):
+        """
+        Collects the cgroup membership of all processes by walking each
+        mounted cgroup hierarchy once and reading the cgroup.procs files,
+        instead of reading /proc/<pid>/cgroup for every process.
+        :return dict: hierarchy name -> {
+            "version": 1 or 2,
+            "mountpoint": path,
+            "controllers": [names],
+            "cgroups": {cgroup path: {"pids": [pids], "settings": {file: value}}}
+        }
+        """
+        hierarchies = {}
+
+        with open(self.getHostPath("/proc/self/mountinfo"), "r") as f:
+            for line in f:
+                data = line.split()
+                separator_index = data.index('-')
+                fstype = data[separator_index + 1]
+
+                if fstype == "cgroup2":
+                    controllers = []
+                    version = 2
+                elif fstype == "cgroup":
+                    # the super options contain the attached controllers
+                    # like "rw,cpu,cpuacct" or "rw,xattr,name=systemd"
+                    ignore = ("rw", "ro", "xattr", "noprefix", "clone_children")
+                    controllers = [
+                        opt for opt in data[separator_index + 3].split(',')
+                        if opt not in ignore and not opt.startswith("release_agent=")
+                    ]
+                    version = 1
+                else:
+                    continue
+
+                mountpoint = data[4]
+                name = os.path.basename(mountpoint) if version == 1 else "unified"
+
+                if name in hierarchies:
+                    # the same hierarchy mounted multiple times
+                    continue
+
+                hierarchies[name] = {
+                    "version": version,
+                    "mountpoint": mountpoint,
+                    "controllers": controllers,
+                    "cgroups": self.walkCgroupHierarchy(self.getHostPath(mountpoint))
                 }
 
+        return hierarchies
+
+    def walkCgroupHierarchy(self, mountpoint):
+        """
+        Walks a single cgroup hierarchy mounted at ``mountpoint``.
+        :return dict: cgroup path -> {"pids": [pids], "settings": {file: value}}
+        """
+        cgroups = {}
+
+        for path, dirs, files in os.walk(mountpoint):
+            cgroup = "/" + os.path.relpath(path, mountpoint) if path != mountpoint else "/"
+
+            try:
+                with open(os.path.join(path, "cgroup.procs"), "r") as f:
+                    pids = [int(pid) for pid in f.read().split()]
+            except EnvironmentError:
+                # the cgroup vanished in the meantime
+                continue
+
+            settings = {}
+            for setting in self.CGROUP_SETTINGS:
+                if setting not in files:
+                    continue
+                try:
+                    with open(os.path.join(path, setting), "r") as f:
+                        settings[setting] = f.read().strip()
+                except EnvironmentError:
+                    # some settings are not readable in every cgroup
+                    pass
+
+            cgroups[cgroup] = {"pids": pids, "settings": settings}
+
+        return cgroups
+
     def collectIPv4(self):
         """
         This helper collects all IPv4 addresses by parsing the
@@ -837,7 +1816,8 @@ class Scanner(object):
         result = {}
         try:
             value = subprocess.check_output(
-                    ['ip', '-4', '-o', 'addr'], shell=False, close_fds=True
+                    ['ip', '-4', '-o', 'addr'], shell=False, close_fds=True,
+                    universal_newlines=True
                     ).split("\n")
         except OSError as e:
             print("Failed to run ip -4 addr shell-command: {}".format(e),
@@ -859,7 +1839,7 @@ class Scanner(object):
         interfaces by parsing /proc/net/if_inet6.
         """
         result = {}
-        path = "/proc/net/if_inet6"
+        path = self.getHostPath("/proc/net/if_inet6")
         try:
             with open(path, "r") as fi:
                 for line in fi:
@@ -874,12 +1854,16 @@ class Scanner(object):
             print("Failed to open {} : {}".format(path, e), file=sys.stderr)
             return result
 
-    def collectNwInterface(self, nw_dir='/sys/class/net'):
+    def collectNwInterface(self, nw_dir=None):
         """
         This helper goes through all available general network devices and
         receives information about them.
+        :str nw_dir: the sysfs directory listing the devices, by default
+        /sys/class/net of the scanned system.
         :dictionary return: the interface-name values pairs.
         """
+        if nw_dir is None:
+            nw_dir = self.getHostPath("/sys/class/net")
         result = {}
         files = [
             'ifindex', 'address', 'type', 'operstate', 'carrier', 'dormant',
@@ -926,41 +1910,292 @@ class Scanner(object):
                     e, file=sys.stderr))
         return result
 
+    def reportProgress(self, phase, done, total, force=False):
+        """Passes progress information to the ProgressReporter, if any."""
+        if self.m_progress:
+            self.m_progress.report(phase, done, total, force)
+
+    def emit(self, result, category, data):
+        """Passes a completely collected category to the sink, if any, or
+        stores it in ``result`` otherwise."""
+        if category in self.m_skip:
+            return
+        elif self.m_delta and category != "fingerprints":
+            data = self.m_delta.encode(category, data)
+
+        if self.m_sink:
+            self.m_sink(category, data)
+        else:
+            result[category] = data
+
+    def startFsDatabase(self):
+        """Sets up the FsDatabaseBuilder if requested and possible."""
+        self.m_fs_db = None
+        if not self.m_build_fs_db or not self.m_collect_files:
+            return
+        elif self.m_skip & set(["filesystem", "container_filesystems", "filesystem_db"]):
+            # the database would replace the part the host already has
+            return
+
+        try:
+            self.m_fs_db = FsDatabaseBuilder()
+        except (ImportError, EnvironmentError) as e:
+            print("Can't build the file system database, sending the raw data: {}".format(e), file=sys.stderr)
+
+    def emitFilesystem(self, result, category, data):
+        """Like emit() for the "filesystem" and "container_filesystems"
+        categories. If an FsDatabaseBuilder is in use then the trees are
+        inserted into the database instead, see finishFsDatabase()."""
+        if not self.m_fs_db:
+            self.emit(result, category, data)
+        elif category == "filesystem":
+            self.m_fs_db.insertTree(data)
+        else:
+            for mntns, info in data.items():
+                self.m_fs_db.insertTree(info["tree"], mntns)
+
+    def finishFsDatabase(self, result):
+        """Emits the "filesystem_db" category, if the database was built."""
+        if self.m_fs_db:
+            fs_db, self.m_fs_db = self.m_fs_db, None
+            self.emit(result, "filesystem_db", fs_db.finish())
+
     def collect(self):
-        result = {}
-        # we need to collect the systemdata first in order to have the
-        # data for detecting mqueue sockets
-        result['systemdata'] = self.collectSystemData()
+        """Collects all categories. The cheap ones that are most valuable
+        for an analysis are collected first, so that they can be used while
+        the expensive file system walk is still running, if a sink is
+        configured.
 
-        self.collectProcessInfo()
-        result["proc_data"] = self.m_proc_info["status"]
-        result["parents"] = self.m_proc_info["parents"]
-        result["namespaces"] = self.m_proc_info["namespaces"]
-        result["namespaces_deep"] = self.getAdditionalNsInfo(result["namespaces"])
-        result['userdata'] = self.collectUserGroupMappings()
+        :return dict: category -> data for all categories that have not
+        been passed to the sink.
+        """
+        if self.m_root:
+            return self.collectImage()
 
-        result["networking"] = {}
-        for prot in ("tcp", "tcp6", "udp", "udp6", "unix", "netlink", "packet"):
+        result = {}
+        # seconds spent on each part of the collection, this is recorded in
+        # probe_stats to calibrate future scan estimates
+        durations = {}
+        start = time.time()
+
+        # the same cheap metrics as in estimate() to relate them to the
+        # actual costs of this scan. They also serve as the expected totals
+        # for progress reports.
+        self.m_scan_counts = self.getScanCounts()
+        if self.m_progress:
+            self.m_progress.start(self.m_scan_counts)
+
+        def lap(part):
+            now = time.time()
+            durations[part] = durations.get(part, 0.0) + now - lap.last
+            lap.last = now
+        lap.last = start
+
+        self.m_userdata = self.collectUserGroupMappings()
+        self.emit(result, 'userdata', self.m_userdata)
+        self.startFsDatabase()
+        lap("processes")
+
+        networking = {}
+        protocols = ("tcp", "tcp6", "udp", "udp6", "unix", "netlink", "packet")
+        for nr, prot in enumerate(protocols):
+            self.reportProgress("networking", nr, len(protocols))
             self.collectProtocolInfo(prot)
-            result["networking"][prot] = self.m_protocols[prot]
+            networking[prot] = self.m_protocols[prot]
+        self.emit(result, "networking", networking)
+        lap("networking")
 
-        if self.m_collect_files:
+        # we need to collect the systemdata before the process data in
+        # order to have the data for detecting mqueue sockets
+        self.emit(result, 'systemdata', self.collectSystemData())
+        lap("other")
+
+        self.collectProcessInfo()
+        self.emit(result, "proc_data", self.m_proc_info["status"])
+        self.emit(result, "maps_templates", self.m_proc_info["maps_templates"])
+        self.emit(result, "parents", self.m_proc_info["parents"])
+        namespaces = self.m_proc_info["namespaces"]
+        self.emit(result, "namespaces", namespaces)
+        self.emit(result, "namespaces_deep", self.getAdditionalNsInfo(namespaces))
+        lap("processes")
+
+        # the container walks need the directories of the host walk
+        containers = self.m_collect_containers and "container_filesystems" not in self.m_skip
+        if self.m_collect_files and (containers or not self.m_skip & set(["filesystem", "filesystem_db"])):
             self.collectFilesystem()
-            result["filesystem"] = self.m_filesystem
+            self.emitFilesystem(result, "filesystem", self.m_filesystem)
+            # don't keep the potentially huge tree around
+            self.m_filesystem = None
+            lap("filesystem")
 
+        if containers:
+            self.emitFilesystem(result, "container_filesystems", self.collectContainerFilesystems(namespaces))
+            lap("filesystem")
+
+        if self.m_fs_db:
+            self.finishFsDatabase(result)
+            lap("filesystem")
+
+        self.reportProgress("other", 0, 1)
         self.collectSysVIpcInfo()
-        result["sysvipc"] = self.m_sysvipc
+        self.emit(result, "sysvipc", self.m_sysvipc)
+
+        self.emit(result, "nwifaces", self.collectNwInterface())
+        self.emit(result, "cgroups", self.collectCgroups())
+        lap("other")
+
+        probe_stats = self.getProbeStats()
+        probe_stats["durations"] = durations
+        probe_stats["duration"] = time.time() - start
+        probe_stats["counts"] = self.m_scan_counts
+        probe_stats["interesting_only"] = self.m_interesting_only
+        self.emit(result, "probe_stats", probe_stats)
+        if self.m_delta:
+            self.emit(result, "fingerprints", self.m_delta.getFingerprints())
+
+        return result
+
+    def collectImage(self):
+        """Variant of collect() for offline images: only the userdata and
+        filesystem categories are available there."""
+        result = {}
+        start = time.time()
+
+        self.m_scan_counts = self.getScanCounts()
+        if self.m_progress:
+            self.m_progress.start(self.m_scan_counts)
+
+        self.m_userdata = self.collectUserGroupMappings()
+        self.emit(result, 'userdata', self.m_userdata)
+        other = time.time() - start
+
+        self.startFsDatabase()
+        if self.m_collect_files and not self.m_skip & set(["filesystem", "filesystem_db"]):
+            self.emitFilesystem(result, "filesystem", self.walkFilesystem(self.m_root))
+            self.finishFsDatabase(result)
+
+        probe_stats = self.getProbeStats()
+        probe_stats["duration"] = time.time() - start
+        probe_stats["durations"] = {
+            "other": other,
+            "filesystem": probe_stats["duration"] - other
+        }
+        probe_stats["counts"] = self.m_scan_counts
+        probe_stats["root"] = self.m_root
+        probe_stats["interesting_only"] = self.m_interesting_only
+        self.emit(result, "probe_stats", probe_stats)
+        if self.m_delta:
+            self.emit(result, "fingerprints", self.m_delta.getFingerprints())
 
-        result["nwifaces"] = self.collectNwInterface()
-        # we're currently returning a single large dictionary containing all
-        # collected information
         return result
 
+    def estimate(self):
+        """Only gathers the cheap metrics that determine the costs of a full
+        collect() run, see getScanCounts()."""
+        result = self.getProbeStats()
+        result["counts"] = self.getScanCounts()
+        return result
+
+    @staticmethod
+    def getProbeStats():
+        """Returns information about the probe run itself."""
+        return {
+            "interpreter": {
+                "executable": sys.executable,
+                "version": list(sys.version_info[:3])
+            }
+        }
+
+    def getScanCounts(self):
+        """Returns a dictionary with metrics that can be determined quickly
+        and which scale with the costs of a full scan:
+
+        - inodes: used inodes of all file systems within the scan scope.
+        - pids: number of processes.
+        - fds: number of open file descriptors of all processes.
+        - sockets: number of sockets in all protocol tables.
+        """
+        counts = {"inodes": 0, "pids": 0, "fds": 0, "sockets": 0}
+
+        if self.m_root:
+            # only the file system of an offline image is scanned
+            if self.m_collect_files:
+                counts["inodes"] = self.countUsedInodes([])
+            return counts
+
+        pids = self.getAllPids()
+        counts["pids"] = len(pids)
+
+        for pid in pids:
+            fd_dir = self.getHostPath("/proc/{}/fd".format(pid))
+            try:
+                # recent kernels report the number of fds as directory size
+                fds = os.stat(fd_dir).st_size or len(os.listdir(fd_dir))
+            except EnvironmentError:
+                continue
+            counts["fds"] += fds
+
+        for prot in ("tcp", "tcp6", "udp", "udp6", "unix", "netlink", "packet"):
+            try:
+                with open(self.getHostPath("/proc/net/{}".format(prot)), "r") as f:
+                    # skip the header line
+                    counts["sockets"] += max(len(f.readlines()) - 1, 0)
+            except EnvironmentError:
+                continue
+
+        if self.m_collect_files:
+            counts["inodes"] = self.countUsedInodes(pids)
+
+        return counts
+
+    def countUsedInodes(self, pids):
+        """Sums up the used inodes of all file systems that would be walked
+        by collectFilesystem() and, if enabled,
+        collectContainerFilesystems(). For offline images this is only an
+        upper bound, as the image may share its file system with others."""
+        roots = []
+        seen_devs = set()
+        used = 0
+
+        if self.m_root:
+            roots.append(self.m_root)
+        else:
+            with open(self.getHostPath("/proc/self/mountinfo"), "r") as f:
+                for line in f:
+                    mountpoint = line.split()[4]
+                    if any(mountpoint.startswith(excluded) for excluded in self.FS_EXCLUDE):
+                        continue
+                    roots.append(self.getHostPath(mountpoint))
+
+        if self.m_collect_containers and not self.m_root:
+            mnt_namespaces = set()
+            for pid in pids:
+                try:
+                    mntns = os.readlink(self.getHostPath("/proc/{}/ns/mnt".format(pid)))
+                except EnvironmentError:
+                    continue
+                if mntns not in mnt_namespaces:
+                    mnt_namespaces.add(mntns)
+                    roots.append(self.getHostPath("/proc/{}/root".format(pid)))
+
+        for root in roots:
+            try:
+                dev = os.stat(root).st_dev
+                if dev in seen_devs:
+                    continue
+                seen_devs.add(dev)
+                info = os.statvfs(root)
+            except EnvironmentError:
+                continue
+            used += info.f_files - info.f_ffree
+
+        return used
+
     def collectSysVIpcInfo(self):
         self.m_sysvipc = {}
 
         for ipctype in ['msg', 'sem', 'shm']:
-            with open("/proc/sysvipc/{f}".format(f=ipctype), "r") as f:
+            with open(self.getHostPath("/proc/sysvipc/{f}".format(f=ipctype)), "r") as f:
                 table = [line.strip() for line in f.readlines()]
 
             header = table.pop(0).split()
@@ -975,8 +2210,7 @@ class Scanner(object):
 
                 self.m_sysvipc[ipctype].append(linedata)
 
-    @staticmethod
-    def getStatData(pid):
+    def getStatData(self, pid):
         """
         Collect the data from /proc/<pid>/stat
         :param pid: The pid to get stats about.
@@ -987,12 +2221,18 @@ class Scanner(object):
         name_mapping = {
             4: 'pgroup',
             5: 'session',
+            8: 'flags',
             21: 'starttime'
         }
 
-        path = "/proc/{pid}/stat".format(pid=pid)
+        path = self.getHostPath("/proc/{pid}/stat".format(pid=pid))
         with open(path, "r") as fi:
-            raw_data = fi.read().strip().split()
+            raw_data = fi.read().strip()
+            # the command name in the second field may contain spaces, so
+            # split only the part after it and pad the list to keep the
+            # indices
+            comm_end = raw_data.rfind(')')
+            raw_data = raw_data[:comm_end].split(None, 1) + raw_data[comm_end + 2:].split()
             data = {}
 
             for index, name in name_mapping.items():
@@ -1003,7 +2243,7 @@ class Scanner(object):
     def collectSystemData(self):
         result = {}
 
-        with open("/proc/uptime", "r") as fi:
+        with open(self.getHostPath("/proc/uptime"), "r") as fi:
             raw_data = fi.read().strip().split()
             result['uptime'] = raw_data[0]
 
@@ -1026,20 +2266,38 @@ class Scanner(object):
         :return:
         """
         ret = []
-        for shm in os.listdir('/dev/shm'):
-            if not os.path.isdir('/dev/shm/' + shm):
+        shm_dir = self.getHostPath("/dev/shm")
+        for shm in os.listdir(shm_dir):
+            path = os.path.join(shm_dir, shm)
+            if not os.path.isdir(path):
                 ret.append({
                     "name": shm,
-                    "inode": os.stat('/dev/shm/' + shm).st_ino
+                    "inode": os.stat(path).st_ino
                 })
 
         return ret
 
-    def getMapsForProcess(self, pid):
+    def getMapsTemplate(self, pid, templates):
         """
-        This helper reads and parses /proc/$PID/maps
+        Returns the id of the template in ``templates`` that matches the
+        memory mappings of the given process. A new template is added to
+        ``templates`` if none matches.
         :param pid: The PID of the process to check.
-        :return:
+        :param dict templates: raw maps content -> (template id, parsed maps)
+        """
+        with open(self.getHostPath("/proc/{pid}/maps".format(pid=pid)), "r") as f:
+            content = f.read()
+
+        if content not in templates:
+            templates[content] = (len(templates), self.parseMaps(content))
+
+        return templates[content][0]
+
+    @staticmethod
+    def parseMaps(content):
+        """
+        Parses the content of a /proc/$PID/maps file.
+        :return: A list of dicts, one for each mapping.
         """
         # see man 5 proc for info about those fields
         # super options are missing
@@ -1048,16 +2306,15 @@ class Scanner(object):
         ]
         ret = []
 
-        with open("/proc/{pid}/maps".format(pid=pid), "r") as f:
-            for line in f.readlines():
-                data = line.strip().split()
+        for line in content.splitlines():
+            data = line.strip().split()
 
-                # in case you wonder what this does: This takes the key array and the data array and makes an array of
-                # tuples from the values at the same index, i.e. [(key[0], data[0]), (key[1], data[1]) ... ]. This array
-                # can then be directly given to the dict constructor, which takes the first value of a tuple as key and
-                # the second as value. Therefore we're lazily generating a dict from the data with simply a key array :)
-                dc = dict(zip(keys, data))
-                ret.append(dc)
+            # in case you wonder what this does: This takes the key array and the data array and makes an array of
+            # tuples from the values at the same index, i.e. [(key[0], data[0]), (key[1], data[1]) ... ]. This array
+            # can then be directly given to the dict constructor, which takes the first value of a tuple as key and
+            # the second as value. Therefore we're lazily generating a dict from the data with simply a key array :)
+            dc = dict(zip(keys, data))
+            ret.append(dc)
 
         return ret
 
@@ -1086,6 +2343,53 @@ def main():
         help="Don't collect file system information. This will save a lot of time and space."
     )
 
+    parser.add_argument(
+        "--container-fs", action='store_true',
+        default=False,
+        help="Also walk the root file systems of all mount namespaces (i.e. containers) via /proc/<pid>/root."
+    )
+
+    parser.add_argument(
+        "--interesting-files", action='store_true',
+        default=False,
+        help="Only record file system objects that are interesting from a security point of view, the others are only counted per directory."
+    )
+
+    parser.add_argument(
+        "--build-fs-db", action='store_true',
+        default=False,
+        help="Convert the file system data into the database format of the scanning host here, if sqlite3 is available."
+    )
+
+    parser.add_argument(
+        "--estimate", action='store_true',
+        default=False,
+        help="Only collect the metrics required for estimating the costs of a full scan."
+    )
+
+    parser.add_argument(
+        "--root", default=None,
+        help="Scan the offline image (e.g. a mounted VM image or an unpacked container image) in this directory instead of the running system."
+    )
+
+    parser.add_argument(
+        "--host-root", default=None,
+        help="Scan the running system whose root file system, including its procfs and sysfs, is mounted in this directory."
+    )
+
+    parser.add_argument(
+        "--pickle-protocol", type=int, default=None,
+        help="The maximum pickle protocol to use for the output. Pass 2 if the output is read by python2."
+    )
+
+    parser.add_argument(
+        "--progress", action='store_true',
+        default=False,
+        help="Write progress information as JSON lines prefixed with '{}' to stderr.".format(
+            PROGRESS_PREFIX.strip()
+        )
+    )
+
     args = parser.parse_args()
 
     # on python3 we need to use the buffer sub-object to write binary data to
@@ -1103,8 +2407,20 @@ def main():
     if os.isatty(out_file.fileno()):
         exit("Refusing to output binary data to stdout connected to a terminal")
 
-    scanner = Scanner(collect_files=not args.no_files)
-    result = scanner.collect()
+    def sendProgress(info):
+        print(PROGRESS_PREFIX + json.dumps(info), file=sys.stderr)
+        sys.stderr.flush()
+
+    scanner = Scanner(
+        collect_files=not args.no_files,
+        collect_containers=args.container_fs,
+        progress=ProgressReporter(sendProgress) if args.progress else None,
+        root=args.root,
+        host_root=args.host_root,
+        interesting_only=args.interesting_files,
+        build_fs_db=args.build_fs_db
+    )
+    result = scanner.estimate() if args.estimate else scanner.collect()
 
     if isPython2():
         # for running locally via sudo: simply output the raw data structure
@@ -1115,21 +2431,73 @@ def main():
         import _pickle as pickle
         # constant missing in py3 on _pickle
         protocol = 4
+    if args.pickle_protocol is not None:
+        protocol = min(protocol, args.pickle_protocol)
     import gzip
-    zip_out_file = gzip.GzipFile(fileobj=out_file, compresslevel=5)
+    zip_out_file = gzip.GzipFile(fileobj=out_file, mode='wb', compresslevel=5)
 
-    import cStringIO
+    if isPython2():
+        # the py2 GzipFile is slow with the many small writes of the pickler
+        import cStringIO
 
-    stream = cStringIO.StringIO()
-    pickle.dump(result, stream, protocol=protocol)
+        stream = cStringIO.StringIO()
+        pickle.dump(result, stream, protocol=protocol)
 
-    zip_out_file.write(stream.getvalue())
+        zip_out_file.write(stream.getvalue())
+    else:
+        # stream the pickled data without keeping a copy in memory
+        pickle.dump(result, zip_out_file, protocol=protocol)
+
+    zip_out_file.close()
+
+
+def serveRequest(channel, options):
+    """Runs a scan as requested by the dictionary of Scanner keyword
+    arguments ``options`` received on the execnet ``channel`` and sends the
+    resulting frames back."""
+    estimate = options.pop("estimate", False)
+    sender = FrameSender(
+        channel,
+        compression=options.pop("compression", None),
+        bandwidth=options.pop("bandwidth", None),
+        pickle_protocol=options.pop("pickle_protocol", 2)
+    )
+    if options.pop("progress", False):
+        # progress frames are interleaved with the result frame
+        options["progress"] = ProgressReporter(
+            lambda info: sender.send(("progress", info))
+        )
+    if options.pop("stream", False):
+        # send each category in its own frame as soon as it's complete
+        options["sink"] = lambda category, data: sender.sendData("category", category, data)
+    scanner = Scanner(**options)
+    result = scanner.estimate() if estimate else scanner.collect()
+    sender.sendData("result", None, result)
+
+
+def serveAgent(channel, idle_timeout):
+    """Keeps serving scan requests received on ``channel`` until None is
+    received or no request arrived for ``idle_timeout`` seconds. This
+    saves the setup of the probe for repeated scans of the same node."""
+    while True:
+        try:
+            options = channel.receive(timeout=idle_timeout)
+        except channel.TimeoutError:
+            break
+
+        if options is None:
+            break
+        serveRequest(channel, options)
 
 
 if __name__ == '__channelexec__':
-    scanner = Scanner()
-    result = scanner.collect()
-    channel.send(result)
+    # the host sends a dictionary of Scanner keyword arguments first
+    options = channel.receive()
+    if options.pop("agent", False):
+        # further requests follow on the same channel
+        serveAgent(channel, options.pop("idle_timeout", None))
+    else:
+        serveRequest(channel, options)
 elif __name__ == "__main__":
     main()
 
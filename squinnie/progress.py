@@ -0,0 +1,191 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+from __future__ import print_function
+from __future__ import with_statement
+import threading
+import time
+import sys
+
+# local modules
+import squinnie.helper
+from squinnie.estimator import Estimator
+
+
+class ProgressDisplay(object):
+    """Renders the progress reports of the probes running on one or more
+    nodes, see squinnie.probe.ProgressReporter.
+
+    The completion of each node is weighted by the predicted duration of
+    the individual scan parts (see Estimator.predictDurations()), the ETA
+    is extrapolated from the time elapsed so far.
+    """
+
+    def __init__(self, estimator=None, stream=sys.stderr):
+        """
+        :param Estimator estimator: used for weighting the scan phases.
+        :param stream: the file object to render to.
+        """
+        self.m_estimator = estimator if estimator else Estimator()
+        self.m_stream = stream
+        self.m_interactive = stream.isatty()
+        # minimum seconds between two renderings
+        self.m_interval = 0.5 if self.m_interactive else 30
+        self.m_last_render = 0
+        # number of lines printed by the last interactive rendering
+        self.m_lines = 0
+        # node name -> state dictionary
+        self.m_nodes = {}
+        self.m_order = []
+        # reports may arrive from multiple receiving threads
+        self.m_lock = threading.Lock()
+
+    def startNode(self, node):
+        with self.m_lock:
+            if node not in self.m_nodes:
+                self.m_order.append(node)
+            self.m_nodes[node] = {
+                "start": time.time(),
+                "predicted": None,
+                "phase": None,
+                "done": 0,
+                "total": 0,
+                "finished_phases": set(),
+                "finished": None
+            }
+
+    def update(self, node, info):
+        """Processes a progress message received from the probe on
+        ``node``."""
+        with self.m_lock:
+            state = self.m_nodes[node]
+
+            if "counts" in info:
+                state["predicted"] = self.m_estimator.predictDurations(node, info["counts"])
+            else:
+                if state["phase"] and state["phase"] != info["phase"]:
+                    state["finished_phases"].add(state["phase"])
+                state["phase"] = info["phase"]
+                state["done"] = info["done"]
+                state["total"] = info["total"]
+
+        self.render()
+
+    def finishNode(self, node, failed=False):
+        with self.m_lock:
+            self.m_nodes[node]["finished"] = "failed" if failed else "done"
+
+        self.render(force=True)
+
+    def getCompletion(self, state):
+        """Returns the fraction of the scan of a node that is complete."""
+        if state["finished"]:
+            return 1.0
+        predicted = state["predicted"]
+        if not predicted or not state["phase"]:
+            return 0.0
+
+        total = sum(predicted.values())
+        if not total:
+            return 0.0
+
+        complete = sum([predicted.get(phase, 0) for phase in state["finished_phases"]])
+        if state["total"]:
+            fraction = min(float(state["done"]) / state["total"], 1.0)
+            complete += predicted.get(state["phase"], 0) * fraction
+
+        return min(complete / total, 1.0)
+
+    def getETA(self, state):
+        """Returns the estimated remaining seconds for a node or None if
+        no estimate is possible yet."""
+        completion = self.getCompletion(state)
+        if state["finished"]:
+            return 0
+        elif not completion:
+            return None
+
+        elapsed = time.time() - state["start"]
+        return elapsed * (1 - completion) / completion
+
+    @staticmethod
+    def formatETA(eta):
+        if eta is None:
+            return "ETA unknown"
+        return "ETA " + squinnie.helper.changeTimeFormat(eta)
+
+    def getLines(self):
+        """Returns the lines of text that make up the current display."""
+        lines = []
+        etas = []
+
+        for node in self.m_order:
+            state = self.m_nodes[node]
+            eta = self.getETA(state)
+            etas.append(eta)
+
+            if state["finished"]:
+                status = state["finished"]
+            elif state["phase"]:
+                status = "{:<10} {:>9}/{:<9} {:5.1f}% {}".format(
+                    state["phase"], state["done"], state["total"],
+                    self.getCompletion(state) * 100, self.formatETA(eta)
+                )
+            else:
+                status = "starting"
+
+            lines.append("{}: {}".format(node, status))
+
+        if len(self.m_order) > 1:
+            finished = len([node for node in self.m_order if self.m_nodes[node]["finished"]])
+            known = [eta for eta in etas if eta is not None]
+            eta = max(known) if known and len(known) == len(etas) else None
+            lines.append("{}/{} nodes complete, {}".format(
+                finished, len(self.m_order), self.formatETA(eta)
+            ))
+
+        return lines
+
+    def render(self, force=False):
+        """Renders the display, at most every self.m_interval seconds unless
+        ``force`` is set."""
+        with self.m_lock:
+            now = time.time()
+            if not force and now - self.m_last_render < self.m_interval:
+                return
+            self.m_last_render = now
+
+            lines = self.getLines()
+
+            if self.m_interactive:
+                # move up to the start of the previous rendering and
+                # overwrite it
+                if self.m_lines:
+                    self.m_stream.write("\033[{}F".format(self.m_lines))
+                for line in lines:
+                    self.m_stream.write(line + "\033[K\n")
+                self.m_lines = len(lines)
+            else:
+                for line in lines:
+                    self.m_stream.write(line + "\n")
+
+            self.m_stream.flush()
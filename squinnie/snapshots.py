@@ -0,0 +1,345 @@
+#!/usr/bin/env python2
+# vim: ts=4 et sw=4 sts=4 :
+
+# Squinnie - scan a system's security related information
+
+# Copyright (C) 2018 SUSE LINUX GmbH
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# version 2 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+# Standard library modules.
+from __future__ import with_statement
+import calendar
+import logging
+import shutil
+import time
+import os
+
+# local modules
+from squinnie import helper
+from squinnie.dio import DumpIO
+from squinnie.errors import ScannerError
+
+
+class SnapshotStore(object):
+    """Records a history of snapshots of a node's dump, e.g. one per scan of
+    the watch mode, below the dump directory.
+
+    Each category of a snapshot is kept as a dictionary of records, e.g.
+    the processes by PID, the sockets by protocol and inode and the file
+    system objects by path (see FsDatabase.loadRows()). A snapshot only
+    stores the records that were added, removed or changed since the
+    previous one. Every KEYFRAME_INTERVAL-th snapshot is stored in full, so
+    that any snapshot is reconstructed from at most KEYFRAME_INTERVAL - 1
+    deltas.
+    """
+
+    DIR_NAME = '.squinnie.snapshots'
+
+    # the subdirectory of reconstructed dumps, see getDump()
+    VIEW_DIR_NAME = 'views'
+
+    FILE_EXTENSION = '.p.gz'
+
+    # snapshot file names start with the UTC time of the snapshot
+    TIME_FORMAT = '%Y%m%dT%H%M%SZ'
+
+    # a full snapshot is stored after this number of snapshots
+    KEYFRAME_INTERVAL = 24
+
+    # categories whose records are the values of a dictionary of
+    # dictionaries, e.g. networking: protocol -> inode -> socket. The outer
+    # keys are records of their own, so that empty inner dictionaries are
+    # kept.
+    NESTED_CATEGORIES = ("networking",)
+
+    # the categories summarized by formatChanges() with their labels
+    SUMMARY_CATEGORIES = [
+        ("proc_data", "processes"),
+        ("networking", "sockets"),
+        ("filesystem_rows", "file system objects")
+    ]
+
+    def __init__(self, directory, node):
+        """
+        :param str directory: The dump directory.
+        :param str node: The node the snapshots belong to.
+        """
+        self.m_node = node
+        self.m_path = os.path.join(directory, self.DIR_NAME, helper.makeValidDirname(node))
+
+    @classmethod
+    def getNodes(cls, directory):
+        """Returns the names of the nodes that have snapshots in the dump
+        directory ``directory``, as far as they are valid directory
+        names."""
+        path = os.path.join(directory, cls.DIR_NAME)
+        if not os.path.isdir(path):
+            return []
+
+        return sorted([entry for entry in os.listdir(path) if os.path.isdir(os.path.join(path, entry))])
+
+    def getSnapshots(self):
+        """Returns a list of (time, keyframe, path) tuples describing the
+        recorded snapshots, the oldest first."""
+        if not os.path.isdir(self.m_path):
+            return []
+
+        ret = []
+        for name in sorted(os.listdir(self.m_path)):
+            parts = name.split('.', 2)
+            if len(parts) != 3 or '.' + parts[2] != self.FILE_EXTENSION or parts[1] not in ("full", "delta"):
+                continue
+            try:
+                when = calendar.timegm(time.strptime(parts[0], self.TIME_FORMAT))
+            except ValueError:
+                continue
+            ret.append((when, parts[1] == "full", os.path.join(self.m_path, name)))
+
+        return ret
+
+    def findSnapshot(self, when):
+        """Returns the index of the most recent snapshot taken at or before
+        the time ``when`` in getSnapshots() or None if there is none."""
+        ret = None
+        for index, snapshot in enumerate(self.getSnapshots()):
+            if snapshot[0] > when:
+                break
+            ret = index
+
+        return ret
+
+    @classmethod
+    def toRecords(cls, category, data):
+        """Returns the dictionary of records of a dump category."""
+        if category in cls.NESTED_CATEGORIES:
+            ret = {}
+            for outer, records in data.items():
+                ret[(outer,)] = None
+                for key, value in records.items():
+                    ret[(outer, key)] = value
+            return ret
+        elif isinstance(data, dict):
+            return data
+
+        return {None: data}
+
+    @classmethod
+    def _isOuterKey(cls, category, key):
+        """Returns whether ``key`` is the record of an outer key of a
+        nested category, see toRecords()."""
+        return category in cls.NESTED_CATEGORIES and len(key) == 1
+
+    @classmethod
+    def fromRecords(cls, category, records):
+        """Inverse of toRecords()."""
+        if category in cls.NESTED_CATEGORIES:
+            ret = {}
+            for key, value in records.items():
+                inner = ret.setdefault(key[0], {})
+                if not cls._isOuterKey(category, key):
+                    inner[key[1]] = value
+            return ret
+        elif list(records) == [None]:
+            return records[None]
+
+        return records
+
+    @classmethod
+    def getState(cls, dio):
+        """Returns the records of all categories of the dump ``dio``."""
+        state = {}
+
+        for category in dio.getAllCachedCategories():
+            state[category] = cls.toRecords(category, dio.loadCategory(category))
+
+        rows = dio.loadFilesystemRows()
+        if rows is not None:
+            state["filesystem_rows"] = rows
+
+        return state
+
+    @staticmethod
+    def diff(old, new):
+        """Returns the changes from the records ``old`` to ``new``."""
+        ret = {"added": {}, "removed": [], "changed": {}}
+
+        for key, value in new.items():
+            if key not in old:
+                ret["added"][key] = value
+            elif old[key] != value:
+                ret["changed"][key] = value
+
+        ret["removed"] = [key for key in old if key not in new]
+        return ret
+
+    @staticmethod
+    def applyChanges(records, changes):
+        """Applies the changes returned by diff() to ``records``."""
+        for key in changes["removed"]:
+            records.pop(key, None)
+        records.update(changes["added"])
+        records.update(changes["changed"])
+
+    def loadState(self, index):
+        """Reconstructs the records of all categories of the snapshot with
+        the given index in getSnapshots()."""
+        snapshots = self.getSnapshots()[:index + 1]
+        start = max([nr for nr, snapshot in enumerate(snapshots) if snapshot[1]] or [None])
+        if start is None:
+            raise ScannerError("The snapshots of {} lack a full snapshot".format(self.m_node))
+
+        state = helper.readPickle(snapshots[start][2])["categories"]
+
+        for _, _, path in snapshots[start + 1:]:
+            snapshot = helper.readPickle(path)
+            state = dict([
+                (category, state.get(category, {})) for category in snapshot["categories"]
+            ])
+            for category, changes in snapshot["changes"].items():
+                self.applyChanges(state[category], changes)
+
+        return state
+
+    def record(self, dio, when=None):
+        """
+        Records the dump ``dio`` as the most recent snapshot.
+        :param float when: The time of the snapshot, the current time by default.
+        :return: The changes since the previous snapshot as a dictionary of category -> changes (see diff()) or None
+        for the first snapshot.
+        """
+        when = time.time() if when is None else when
+        state = self.getState(dio)
+        snapshots = self.getSnapshots()
+        changes = None
+
+        if snapshots:
+            previous = self.loadState(len(snapshots) - 1)
+            changes = dict([
+                (category, self.diff(previous.get(category, {}), records))
+                for category, records in state.items()
+            ])
+            keyframes = [nr for nr, snapshot in enumerate(snapshots) if snapshot[1]]
+            keyframe = len(snapshots) - max(keyframes) >= self.KEYFRAME_INTERVAL
+        else:
+            keyframe = True
+
+        if keyframe:
+            self._write(when, True, {"categories": state})
+        else:
+            self._write(when, False, {"categories": sorted(state), "changes": changes})
+
+        return changes
+
+    def _write(self, when, keyframe, data):
+        if not os.path.isdir(self.m_path):
+            os.makedirs(self.m_path)
+
+        data["node"] = self.m_node
+        data["time"] = when
+        name = "{}.{}{}".format(
+            time.strftime(self.TIME_FORMAT, time.gmtime(when)), "full" if keyframe else "delta", self.FILE_EXTENSION
+        )
+        path = os.path.join(self.m_path, name)
+
+        # write a new file and rename it, so an interruption never leaves a
+        # truncated snapshot behind
+        helper.writePickle(data, path + ".tmp")
+        os.rename(path + ".tmp", path)
+        return path
+
+    def prune(self, keep=None, max_age=None):
+        """
+        Removes the oldest snapshots according to the retention policy. The
+        most recent snapshot is always kept.
+        :param int keep: The maximum number of snapshots to keep.
+        :param float max_age: Snapshots older than this number of seconds are removed.
+        """
+        snapshots = self.getSnapshots()
+        remove = 0
+        if keep is not None:
+            remove = len(snapshots) - keep
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            remove = max(remove, len([snapshot for snapshot in snapshots if snapshot[0] < cutoff]))
+        remove = min(remove, len(snapshots) - 1)
+
+        if remove <= 0:
+            return
+
+        when, keyframe, path = snapshots[remove]
+        if not keyframe:
+            # the snapshots it is based on are removed
+            self._write(when, True, {"categories": self.loadState(remove)})
+            os.remove(path)
+
+        for _, _, path in snapshots[:remove]:
+            os.remove(path)
+
+        logging.info("Removed {} old snapshots of {}".format(remove, self.m_node))
+
+        # reconstructed dumps of the removed snapshots
+        view_dir = os.path.join(self.m_path, self.VIEW_DIR_NAME)
+        kept = set([self._getViewName(snapshot[0]) for snapshot in snapshots[remove:]])
+        if os.path.isdir(view_dir):
+            for entry in os.listdir(view_dir):
+                if entry not in kept:
+                    shutil.rmtree(os.path.join(view_dir, entry))
+
+    def _getViewName(self, when):
+        return time.strftime(self.TIME_FORMAT, time.gmtime(when))
+
+    def getDump(self, index):
+        """Returns a DumpIO of the snapshot with the given index in
+        getSnapshots(), which can be viewed like a regular dump. It is
+        reconstructed on first use."""
+        when = self.getSnapshots()[index][0]
+        dio = DumpIO(self._getViewName(when), path=os.path.join(self.m_path, self.VIEW_DIR_NAME))
+
+        manifest = dio.loadManifest()
+        if manifest and manifest["complete"]:
+            return dio
+
+        logging.info("Reconstructing the snapshot of {} from {}".format(
+            self.m_node, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when))
+        ))
+        if os.path.isdir(dio.getDumpDir()):
+            # left over from an interrupted reconstruction
+            shutil.rmtree(dio.getDumpDir())
+        dio.startPartialDump()
+        for category, records in self.loadState(index).items():
+            dio.saveCategory(category, self.fromRecords(category, records))
+        dio.finishPartialDump()
+
+        return dio
+
+    @classmethod
+    def formatChanges(cls, changes):
+        """Returns a one line summary of the changes returned by
+        record()."""
+        parts = []
+
+        for category, label in cls.SUMMARY_CATEGORIES:
+            if category not in changes:
+                continue
+            counts = dict([
+                (kind, [key for key in changes[category][kind] if not cls._isOuterKey(category, key)])
+                for kind in ("added", "removed", "changed")
+            ])
+            parts.append("{}: {} added, {} removed, {} changed".format(
+                label, len(counts["added"]), len(counts["removed"]), len(counts["changed"])
+            ))
+
+        return "; ".join(parts)
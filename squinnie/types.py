@@ -12,7 +12,7 @@ class Modes(object):
     """enum-like class for holding the different Squinnie modes we
     support"""
 
-    all_modes = ["local", "ssh", "susecloud", "auto"]
+    all_modes = ["local", "ssh", "susecloud", "image", "auto"]
 
     @classmethod
     def fillModes(cls):
@@ -40,7 +40,7 @@ class ProcColumns(object):
     # order of these matter, it defines the order of the columns in outputs
     all_columns = [
         "pid", "executable", "parameters", "user", "groups", "open_fds", "umask", "features", "cap_inherit", "cap_perm",
-        "cap_eff", "cap_bnd", "cap_ambient", "threads", "rtime", "namespace"
+        "cap_eff", "cap_bnd", "cap_ambient", "threads", "rtime", "cgroup", "namespace"
     ]
 
     @classmethod
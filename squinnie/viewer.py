@@ -63,6 +63,8 @@ class Viewer(object):
         self.m_have_tty = os.isatty(sys.stdout.fileno())
         self.m_show_fds = False
         self.m_show_params = False
+        self.m_show_cgroups = False
+        self.m_cgroup_filter = None
         self.m_pid_filter = []
         self.m_show_filter_parents = False
         self.m_show_filter_children = False
@@ -105,6 +107,8 @@ class Viewer(object):
         self.setVerbose(args.verbose)
         self.setShowFds(args.fd)
         self.setShowParams(args.params)
+        self.setShowCgroups(args.cgroups)
+        self.setCgroupFilter(args.cgroup)
         self.setShowKthreads(args.kthreads)
         self.setShowThreads(args.threads)
         self.setShowFilterChildren(args.children)
@@ -166,6 +170,12 @@ class Viewer(object):
         description = "Show parameters from the process's cmdline entry."
         parser.add_argument("--params", action="store_true", help=description)
 
+        description = "Show the cgroup (i.e. the systemd unit) of each process in an extra column."
+        parser.add_argument("--cgroups", action="store_true", help=description)
+
+        description = "Only show processes whose cgroup path contains the given string, e.g. 'sshd.service'."
+        parser.add_argument("--cgroup", type=str, default=None, help=description)
+
         description = "Include threads. Kernel threads are excluded by default."
         parser.add_argument("--threads", action="store_true", help=description)
 
@@ -219,6 +229,10 @@ class Viewer(object):
                       "bit (S_ISGID) and the sticky bit (S_ISVTX). This is to allow easier combination with grep."
         parser.add_argument("--verbose-special-bits", action="store_true", help=description)
 
+        description = "Show files from the container root file system of the given mount namespace instead of the " \
+                      "host. Pass 'all' to show files from the host and all containers."
+        parser.add_argument("--mnt-namespace", type=str, default=None, help=description)
+
         description = "Show only files of a specific type."
         parser.add_argument("--type", "-t", type=str, default=None, help=description,
                             choices=file_mode.getPossibleFileChars())
@@ -246,6 +260,14 @@ class Viewer(object):
         """Also show process parameters in an extra column."""
         self.m_show_params = show
 
+    def setShowCgroups(self, show):
+        """Also show the cgroup of processes in an extra column."""
+        self.m_show_cgroups = show
+
+    def setCgroupFilter(self, cgroup):
+        """Only show processes whose cgroup path contains ``cgroup``."""
+        self.m_cgroup_filter = cgroup
+
     def setShowFilterParents(self, show):
         """If a PID filter is in effect, also show the parents of selected
         PIDs."""
@@ -345,6 +367,10 @@ class Viewer(object):
             caps = self.m_cap_translator.getCapStrings(iterator.caps)
             cap_str = "|".join(caps)
 
+            path = iterator.getFullPath()
+            if iterator.mntns is not None:
+                path = "[mnt:{}] {}".format(iterator.mntns, path)
+
             ret.append(
                 [
                     iterator.getPermissionString(),
@@ -352,7 +378,7 @@ class Viewer(object):
                     user,
                     group,
                     cap_str,
-                    iterator.getFullPath()
+                    path
                 ]
             )
 
@@ -488,6 +514,11 @@ class Viewer(object):
                 # in case we print the full fds we add a newline after each process to make it a bit more readable
                 proc_wrapper = self.m_proc_wrapper
                 result = str(proc_wrapper.getFileDescriptorsForPid(pid)) + "\n"
+        elif column == ProcColumns.cgroup:
+            real_pid = self.m_ns_pid[pid] if self.m_ns_pid else pid
+            cgroups = self.m_daw_factory.getCgroupWrapper()
+            result = cgroups.getPrimaryCgroupForPid(real_pid) or ''
+
         elif column == ProcColumns.umask:
             result = "{0:o}".format(pid_data['Umask']).rjust(4, '0') if 'Umask' in pid_data else ''
 
@@ -652,6 +683,9 @@ class Viewer(object):
         if not self.m_show_params:
             to_remove.add(ProcColumns.parameters)
 
+        if not self.m_show_cgroups:
+            to_remove.add(ProcColumns.cgroup)
+
         # Remove empty columns since they only take up unnecessary space
         for empty_column in to_remove:
             column_headers.remove(empty_column)
@@ -662,6 +696,12 @@ class Viewer(object):
         # proc_tree
         # [ [1,0], [400,1], [945,1], [976,2], [1437, 3], ... ]
         proc_tree = []
+
+        # the processes to consider for the flat, filtered views
+        if self.m_show_kthreads:
+            listed_pids = all_pids
+        else:
+            listed_pids = [pid for pid in all_pids if not proc_wrapper.isKernelThread(pid)]
         if self.m_pid_filter:
             recursive = self.m_show_filter_children
             for pid in self.m_pid_filter:
@@ -681,9 +721,18 @@ class Viewer(object):
                     level,
                     recursive
                 )
+        elif self.m_cgroup_filter:
+            cgroups = self.m_daw_factory.getCgroupWrapper()
+            proc_tree = [
+                (pid, 0) for pid in sorted(listed_pids)
+                if self.m_cgroup_filter in (
+                    cgroups.getPrimaryCgroupForPid(self.m_ns_pid[pid] if self.m_ns_pid else pid) or ''
+                )
+            ]
+            prefix = ''
         elif self.m_uid_filter >= 0 or self.m_gid_filter >= 0:
             proc_tree = [
-                (pid, 0) for pid in all_pids
+                (pid, 0) for pid in listed_pids
                 if ((not self.m_uid_filter) or proc_wrapper.processHasUid(pid, self.m_uid_filter)) and
                    ((not self.m_gid_filter) or proc_wrapper.processHasGid(pid, self.m_gid_filter))
             ]
@@ -699,8 +748,7 @@ class Viewer(object):
             else:
                 root_pids = [1]
             if self.m_show_kthreads:
-                # for kernel threads PID2 is the root
-                root_pids.append(2)
+                root_pids.extend(proc_wrapper.getKernelThreadRoots())
 
             for pid in root_pids:
                 proc_tree += self.recursiveProcTree(
@@ -745,6 +793,11 @@ class Viewer(object):
 
         formatter.writeOut()
 
+        if self.m_verbose:
+            omitted = self.m_daw_factory.getFsWrapper().getOmittedCount()
+            if omitted:
+                print("\n{} uninteresting file system objects were not recorded during the scan.".format(omitted))
+
     def _getTermSize(self):
         """Returns the size of the terminal as a pair of (cols, rows)."""
         # starting with py3.3 there's also shutil.get_terminal_size()
@@ -763,6 +816,9 @@ class Viewer(object):
         if args.capabilities:
             self.m_fsquery.filterForCapabilities()
 
+        if args.mnt_namespace != "all":
+            self.m_fsquery.filterForMountNamespace(args.mnt_namespace)
+
         if self.m_uid_filter >= 0:
             self.m_fsquery.filterForUid(self.m_uid_filter)
 
@@ -1025,18 +1081,22 @@ class Viewer(object):
                         print("{} mapping for {}".format(curr_type, printstr))
                         self.printFilteredColumns(curr_output, col_names)
                 elif entry[0] == 'pid' and pid_filter:
-                    if not inode[1]['pids_info']:
+                    if 'pid_map' in inode[1]:
+                        data_dict, ns_pid = self.getPidNsProcData(
+                                inode[1]['pid_map']
+                        )
+                    elif inode[1].get('pids_info'):
+                        # dumps created by older versions contain a full
+                        # process scan from inside the namespace
+                        data_dict, ns_pid = self.getLegacyPidNsProcData(
+                                inode[0], element[1][1]['pids'],
+                                inode[1]['pids_info']
+                        )
+                    else:
                         # no internal process tree available
                         continue
                     # pid filter interfers if set globally
                     self.m_pid_filter = None
-                    ext_pids = element[1][1]['pids']
-                    overwrite = [("status", "proc_data"),
-                            ("parents", "parents")
-                    ]
-                    data_dict = self.dictKeyIntify(overwrite,
-                            inode[1]['pids_info']
-                    )
                     # since our standart ProcWrapper uses the collected
                     # process data from standart perspective, we need
                     # to customize this to fit our needs for an inside
@@ -1044,21 +1104,63 @@ class Viewer(object):
                     pid_handler = LocalFactory(data_dict).getProcWrapper()
                     print("PID mappings for {}".format(printstr))
                     # set variables for pid-ns mode
-                    if len(ext_pids) != len(data_dict["proc_data"]):
-                        raise ValueError(
-                                "Pid mapping of pid namespace {} is invalid!"
-                                .format(inode[0])
-                    )
-                    # create pid-ns mapping dict
-                    self.m_ns_pid = {0 : 0}
-                    pids_sorted = sorted(data_dict["proc_data"])
-                    for pid_index in range(0, len(pids_sorted)):
-                        self.m_ns_pid[
-                                pids_sorted[pid_index]
-                        ] = ext_pids[pid_index]
+                    self.m_ns_pid = ns_pid
                     self.m_proc_wrapper = pid_handler
                     self.printProcessTree()
 
+    def getPidNsProcData(self, pid_map):
+        """
+        Builds the process data for the inside view of a pid namespace from
+        the process records of the host view.
+        :dict pid_map: ns pid -> host pid
+        :return tuple: (data dict for LocalFactory, ns pid -> host pid
+        mapping including the 0 parent)
+        """
+        host_data = self.m_daw_factory.getProcWrapper().getProcData()
+        host_to_ns = dict((host, ns) for ns, host in pid_map.items())
+        proc_data = {}
+        parents = {}
+
+        for ns_pid, host_pid in pid_map.items():
+            if host_pid not in host_data:
+                continue
+            # parents outside of the namespace become 0, like for init
+            parent = host_to_ns.get(host_data[host_pid]["parent"], 0)
+            # shallow copy, the bulk of the record is shared with the host
+            # view
+            record = dict(host_data[host_pid])
+            record["parent"] = parent
+            proc_data[ns_pid] = record
+            parents[ns_pid] = parent
+
+        ns_pid = {0: 0}
+        ns_pid.update(pid_map)
+
+        return {"proc_data": proc_data, "parents": parents}, ns_pid
+
+    def getLegacyPidNsProcData(self, ns_inode, ext_pids, pids_info):
+        """
+        Builds the process data for the inside view of a pid namespace from
+        a full process scan done inside the namespace (older dumps).
+        :return tuple: see getPidNsProcData()
+        """
+        overwrite = [("status", "proc_data"),
+                ("parents", "parents")
+        ]
+        data_dict = self.dictKeyIntify(overwrite, pids_info)
+        if len(ext_pids) != len(data_dict["proc_data"]):
+            raise ValueError(
+                    "Pid mapping of pid namespace {} is invalid!"
+                    .format(ns_inode)
+        )
+        # create pid-ns mapping dict
+        ns_pid = {0 : 0}
+        pids_sorted = sorted(data_dict["proc_data"])
+        for pid_index in range(0, len(pids_sorted)):
+            ns_pid[pids_sorted[pid_index]] = ext_pids[pid_index]
+
+        return data_dict, ns_pid
+
 class TablePrinter(object):
     """This class prints a table to the terminal"""
 